@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Memory benchmark of ZigBee model classes.
+
+Measure the memory used by each ZigBeeNode and by each ZigBeeLink of a
+generated mesh network:
+
+    $ python -m benchmarks.zigbee_memory
+    $ python -m benchmarks.zigbee_memory -n 10000 100000 -l 4
+"""
+
+import argparse
+import gc
+import os
+import resource
+import time
+
+from lib.zigbee import ZigBeeNode
+from lib.zigbee import create_sregister_profile
+
+
+def get_rss():
+    """Get resident memory of current process.
+
+    Returns:
+        Resident memory in bytes.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError):
+        # Peak memory in KB (Linux) is used when statm is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def create_nodes(total, profile):
+    nodes = []
+    for i in range(0, total):
+        eui = "ED0001{:010X}".format(i)
+        node_id = "{:05X}".format(i)
+
+        node = ZigBeeNode(eui)
+        node.set_node_id(node_id)
+        node.set_sregister_profile(profile)
+        node.add_sregister("04", eui)
+        node.add_sregister("05", node_id)
+        nodes.append(node)
+
+    return nodes
+
+
+def create_links(nodes, links_per_node):
+    total = len(nodes)
+    for i in range(0, total):
+        node = nodes[i]
+        node_id = node.get_node_id()
+        for j in range(1, links_per_node + 1):
+            node.add_neighbour(
+                node_id, nodes[(i + j) % total].get_node_id(), "FF")
+
+    return total * links_per_node
+
+
+def run(total, links_per_node, profile):
+    gc.collect()
+    rss = get_rss()
+    start = time.time()
+    nodes = create_nodes(total, profile)
+    node_time = time.time() - start
+    node_rss = get_rss() - rss
+
+    start = time.time()
+    total_links = create_links(nodes, links_per_node)
+    link_time = time.time() - start
+    link_rss = get_rss() - rss - node_rss
+
+    print("{:>8} nodes: {:7.1f} bytes/node ({:.2f}s), "
+          "{:>8} links: {:7.1f} bytes/link ({:.2f}s)".format(
+              total, float(node_rss) / total, node_time,
+              total_links, float(link_rss) / total_links, link_time))
+
+    del nodes
+    gc.collect()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="ZigBee model classes memory benchmark")
+    parser.add_argument(
+        "-n", "--nodes", type=int, nargs="+", default=[10000, 100000],
+        help="amount of nodes of each run (default: 10000 100000)")
+    parser.add_argument(
+        "-l", "--links", type=int, default=4,
+        help="amount of neighbour links per node (default: 4)")
+    args = parser.parse_args()
+
+    profile = create_sregister_profile(
+        dict(("{:02X}".format(i), "0000") for i in range(0, 0x50)))
+
+    for total in args.nodes:
+        run(total, args.links, profile)
+
+
+if __name__ == "__main__":
+    main()
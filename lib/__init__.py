@@ -1,4 +1,14 @@
 import etrx3x_sim
 import etrx3x_at_cmds
+import etrx3x_scheduler
+import etrx3x_event_loop
+import etrx3x_forkserver
+import etrx3x_output
+import etrx3x_snapshot
+import etrx3x_traffic
+import etrx3x_transport
 import zigbee
+import zigbee_radio
+import zigbee_routing
+import zigbee_topology
 import sgcon_validators
@@ -4088,6 +4088,26 @@ class ETRX3xATCommand:
 
         return notify
 
+    def sink_notification(self, eui, node_id):
+        # SINK:<eui>,<node_id> (see parse_sink)
+        return "\r\nSINK:{},{}\r\n".format(eui, node_id)
+
+    def rx_notification(
+            self, node_id, profile_id, dst_ep, src_ep, cluster_id, payload,
+            eui=None):
+        # RX:[<eui>,]<node_id>,<profile_id>,<dst_ep>,<src_ep>,<cluster_id>,
+        # <length>:<payload> (see parse_rx)
+        if(eui is not None):
+            notify = "\r\nRX:{},{},{},{},{},{},{:02X}:{}\r\n".format(
+                eui, node_id, profile_id, dst_ep, src_ep, cluster_id,
+                len(payload), payload)
+        else:
+            notify = "\r\nRX:{},{},{},{},{},{:02X}:{}\r\n".format(
+                node_id, profile_id, dst_ep, src_ep, cluster_id,
+                len(payload), payload)
+
+        return notify
+
     def sread_notification(
             self, node_id, node_eui, reg, error_code, value=None):
 
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import errno
+import select
+
+from lib.etrx3x_scheduler import ETRX3xScheduler
+
+
+class ETRX3xEventLoop(object):
+    """Single thread event loop of ETRX3x simulator.
+
+    The loop multiplexes file descriptors (serial ports) with epoll (or
+    select where epoll is not available) and runs the delayed events of an
+    ETRX3xScheduler, so the serial input, the serial output and the delayed
+    responses of one or more simulators are handled by the same thread.
+
+    With a virtual clock, the loop moves the clock to the next delayed
+    event as soon as there is no pending output and no ready file
+    descriptor, so idle periods take no real time. After reading input, it
+    waits at most idle_time seconds for the rest of it (such as the next
+    host command) before moving the clock.
+    """
+    def __init__(self, use_epoll=None, clock=None, idle_time=0.01):
+        """Constructor for ETRX3xEventLoop class.
+
+        Args:
+            use_epoll: True to use epoll, False to use select or None to use
+                epoll if it is available.
+            clock: ETRX3xVirtualClock object or None to use real clock.
+            idle_time: maximum time in seconds waiting for more input
+                before virtual clock jumps to the next delayed event.
+        """
+        self.clock = clock
+        self.idle_time = idle_time
+
+        # Scheduler is driven by the loop (scheduler thread is not started)
+        if(clock is None):
+            self.scheduler = ETRX3xScheduler()
+        else:
+            self.scheduler = ETRX3xScheduler(clock=clock.time)
+
+        # item = fd: [callback, args]
+        self.readers = {}
+        self.writers = {}
+
+        if(use_epoll is None):
+            use_epoll = hasattr(select, "epoll")
+
+        self.epoll = None
+        if(use_epoll is True):
+            self.epoll = select.epoll()
+
+        # item = fd: registered epoll events
+        self.epoll_events = {}
+
+        # Input was read in last iteration (more input can arrive)
+        self.reading = False
+
+        self.running = False
+
+    def _update_epoll(self, fd):
+        if(self.epoll is None):
+            return
+
+        events = 0
+        if(fd in self.readers):
+            events |= select.EPOLLIN
+        if(fd in self.writers):
+            events |= select.EPOLLOUT
+
+        registered = self.epoll_events.get(fd)
+        if(events == 0):
+            if(registered is not None):
+                del self.epoll_events[fd]
+                self.epoll.unregister(fd)
+        elif(registered is None):
+            self.epoll_events[fd] = events
+            self.epoll.register(fd, events)
+        elif(registered != events):
+            self.epoll_events[fd] = events
+            self.epoll.modify(fd, events)
+
+    def add_reader(self, fd, callback, *args):
+        """Start watching file descriptor for read availability.
+
+        Args:
+            fd: file descriptor.
+            callback: callable executed when fd is readable.
+            args: callback arguments.
+        """
+        self.readers[fd] = [callback, args]
+        self._update_epoll(fd)
+
+    def remove_reader(self, fd):
+        """Stop watching file descriptor for read availability.
+
+        Args:
+            fd: file descriptor.
+        """
+        self.readers.pop(fd, None)
+        self._update_epoll(fd)
+
+    def add_writer(self, fd, callback, *args):
+        """Start watching file descriptor for write availability.
+
+        Args:
+            fd: file descriptor.
+            callback: callable executed when fd is writable.
+            args: callback arguments.
+        """
+        self.writers[fd] = [callback, args]
+        self._update_epoll(fd)
+
+    def remove_writer(self, fd):
+        """Stop watching file descriptor for write availability.
+
+        Args:
+            fd: file descriptor.
+        """
+        self.writers.pop(fd, None)
+        self._update_epoll(fd)
+
+    def call_later(self, delay, function, *args):
+        """Schedule function to be called after delay seconds.
+
+        Args:
+            delay: delay in seconds.
+            function: callable to be executed.
+            args: function arguments.
+
+        Returns:
+            Scheduled event that can be cancelled with cancel method.
+        """
+        return self.scheduler.call_later(delay, function, *args)
+
+    def call_soon(self, function, *args):
+        """Schedule function to be called in next loop iteration.
+
+        Args:
+            function: callable to be executed.
+            args: function arguments.
+
+        Returns:
+            Scheduled event that can be cancelled with cancel method.
+        """
+        return self.scheduler.call_later(0, function, *args)
+
+    def cancel(self, event):
+        """Cancel a scheduled event.
+
+        Args:
+            event: event returned by call_later or call_soon.
+        """
+        self.scheduler.cancel(event)
+
+    def time(self):
+        """Get event loop clock time.
+
+        Returns:
+            Timestamp in seconds (virtual clock time if it is used).
+        """
+        return self.scheduler.clock()
+
+    def _get_timeout(self):
+        deadline = self.scheduler.get_next_deadline()
+        if(deadline is None):
+            return None
+
+        return max(0, deadline - self.time())
+
+    def _poll(self, timeout):
+        if(self.epoll is None):
+            readable, writable, _ = select.select(
+                list(self.readers), list(self.writers), [], timeout)
+            return [readable, writable]
+
+        if(timeout is None):
+            timeout = -1
+
+        readable = []
+        writable = []
+        for fd, events in self.epoll.poll(timeout):
+            # Errors and hang ups are reported to readers (next read fails)
+            if(events & (select.EPOLLIN | select.EPOLLERR | select.EPOLLHUP)):
+                readable.append(fd)
+            if(events & select.EPOLLOUT):
+                writable.append(fd)
+
+        return [readable, writable]
+
+    def _run_once(self):
+        timeout = self._get_timeout()
+
+        # Virtual clock is not moved while output is pending
+        virtual = (self.clock is not None and timeout is not None and
+                   len(self.writers) == 0)
+        if(virtual is True):
+            if(self.reading is True):
+                timeout = min(timeout, self.idle_time)
+            else:
+                timeout = 0
+
+        try:
+            readable, writable = self._poll(timeout)
+        except (select.error, IOError) as err:
+            if(err.args[0] == errno.EINTR):
+                return
+            raise
+
+        self.reading = len(readable) > 0
+
+        if(virtual is True and len(readable) == 0 and len(writable) == 0):
+            # Host is idle: jump to the next delayed event
+            self.clock.advance(self._get_timeout())
+
+        for fd in readable:
+            # Callbacks can remove other file descriptors
+            handler = self.readers.get(fd)
+            if(handler is not None):
+                handler[0](*handler[1])
+
+        for fd in writable:
+            handler = self.writers.get(fd)
+            if(handler is not None):
+                handler[0](*handler[1])
+
+        self.scheduler.run_pending()
+
+    def run_forever(self):
+        """Run event loop until stop method is called.
+        """
+        self.running = True
+
+        while(self.running is True):
+            self._run_once()
+
+    def stop(self):
+        """Stop event loop after current iteration.
+        """
+        self.running = False
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import errno
+import gc
+import os
+import signal
+import socket
+import sys
+import traceback
+
+# Maximum size of a fork server request line
+MAX_REQUEST_SIZE = 256
+
+
+class ETRX3xForkServerException(Exception, object):
+    """docstring for ETRX3xForkServerException."""
+    def __init__(self, msg):
+        super(ETRX3xForkServerException, self).__init__()
+        self.msg = msg
+
+    def __str__(self):
+        return "ETRX3xForkServerException: {}".format(self.msg)
+
+
+def _read_line(conn):
+    data = ""
+    while("\n" not in data and len(data) < MAX_REQUEST_SIZE):
+        chunk = conn.recv(MAX_REQUEST_SIZE)
+        if(len(chunk) == 0):
+            break
+        data += chunk
+
+    return data.split("\n", 1)[0].strip()
+
+
+def _request(socket_path, request):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+        conn.sendall(request + "\n")
+        response = _read_line(conn)
+    finally:
+        conn.close()
+
+    if(response.startswith("OK") is False):
+        raise ETRX3xForkServerException(
+            "{} request failed: {!r}".format(request, response))
+
+    return response.split()[1:]
+
+
+def request_simulator(socket_path):
+    """Request a new simulator instance from fork server.
+
+    Args:
+        socket_path: fork server Unix socket path.
+
+    Returns:
+        List with simulator process identifier and name of the slave serial
+        port used by the host.
+
+    Raises:
+        socket.error for fork server connection errors.
+        ETRX3xForkServerException if simulator was not started.
+    """
+    pid, slave_name = _request(socket_path, "START")
+    return [int(pid), slave_name]
+
+
+def stop_simulator(socket_path, pid):
+    """Stop a simulator instance started by fork server.
+
+    Args:
+        socket_path: fork server Unix socket path.
+        pid: simulator process identifier returned by request_simulator.
+
+    Raises:
+        socket.error for fork server connection errors.
+        ETRX3xForkServerException if pid is not a fork server simulator.
+    """
+    _request(socket_path, "STOP {}".format(pid))
+
+
+class ETRX3xForkServer(object):
+    """Fork server of pre-loaded ETRX3x simulator instances.
+
+    The server process loads the simulator networks once and listens a Unix
+    socket. Each START request forks a child process that opens its own
+    serial port (pty) and runs the simulator, so the loaded networks are
+    shared with the server by copy-on-write and a new simulator session
+    costs a fork instead of a full network load.
+
+    Protocol (one request line per connection):
+        START: start a simulator, response is "OK <pid> <slave>".
+        STOP <pid>: terminate a simulator, response is "OK".
+        Failed requests are answered with "ERROR <message>".
+    """
+    def __init__(self, simulator, socket_path, event_loop=False,
+                 virtual_clock=False):
+        """Constructor for ETRX3xForkServer class.
+
+        Args:
+            simulator: ETRX3xSimulator object with loaded networks (not
+                started).
+            socket_path: Unix socket path of fork server.
+            event_loop: True to run simulators in a single thread event loop
+                or False to use serial reader, serial writer and scheduler
+                threads.
+            virtual_clock: True to run event loop of simulators with a
+                virtual clock (it requires event_loop).
+
+        Raises:
+            ValueError if virtual clock is used without event loop.
+        """
+        if(virtual_clock is True and event_loop is False):
+            raise ValueError("virtual clock requires event loop")
+
+        self.simulator = simulator
+        self.socket_path = socket_path
+        self.event_loop = event_loop
+        self.virtual_clock = virtual_clock
+
+        self.server = None
+        self.running = False
+
+        # Running simulators process identifiers
+        self.children = set()
+
+    def _reap_children(self, signum=None, frame=None):
+        while(len(self.children) > 0):
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as err:
+                if(err.errno != errno.ECHILD):
+                    raise
+                self.children.clear()
+                return
+
+            if(pid == 0):
+                return
+
+            self.children.discard(pid)
+            if(os.WIFEXITED(status) and os.WEXITSTATUS(status) != 0):
+                print("Fork server: simulator {} failed (exit status "
+                      "{})".format(pid, os.WEXITSTATUS(status)))
+
+    def _prepare(self):
+        # Paths of local network are computed once, before fork
+        local_node_id = self.simulator.local_node.get_node_id()
+        self.simulator.routing_engine.is_reachable(local_node_id)
+
+        # Objects created during load are collected before fork, so the
+        # children garbage collector does not copy the shared pages to
+        # release them
+        gc.collect()
+
+    def _run_child(self, conn):
+        status = 1
+        try:
+            self.server.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+            # Models without seed must not repeat the server random sequence
+            for model in (self.simulator.latency_model,
+                          self.simulator.loss_model):
+                if(model.seed is None):
+                    model.random.seed()
+
+            slave_name = self.simulator.open_serial()
+            conn.sendall("OK {} {}\n".format(os.getpid(), slave_name))
+            conn.close()
+
+            self.simulator.start(
+                event_loop=self.event_loop, virtual_clock=self.virtual_clock)
+            status = 0
+        except Exception:
+            traceback.print_exc()
+            sys.stderr.flush()
+        finally:
+            # Child never returns to fork server code
+            os._exit(status)
+
+    def _start_simulator(self, conn):
+        # SIGCHLD is held until the child is registered, otherwise a child
+        # that exits at once is reaped before it is known. Python 2 can not
+        # block signals, so the handler is replaced (pending handler calls
+        # are discarded and exited children stay zombies until reaped).
+        reaper = signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        try:
+            pid = os.fork()
+            if(pid == 0):
+                self._run_child(conn)
+
+            self.children.add(pid)
+        finally:
+            signal.signal(signal.SIGCHLD, reaper)
+
+        if(reaper == self._reap_children):
+            # Children exited while SIGCHLD was held
+            self._reap_children()
+
+    def _stop_simulator(self, conn, pid):
+        try:
+            pid = int(pid)
+        except ValueError:
+            pid = None
+
+        if(pid not in self.children):
+            conn.sendall("ERROR unknown simulator {!r}\n".format(pid))
+            return
+
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError as err:
+            if(err.errno != errno.ESRCH):
+                raise
+        conn.sendall("OK\n")
+
+    def _handle_request(self, conn):
+        request = _read_line(conn).split()
+
+        if(request == ["START"]):
+            self._start_simulator(conn)
+        elif(len(request) == 2 and request[0] == "STOP"):
+            self._stop_simulator(conn, request[1])
+        else:
+            conn.sendall("ERROR invalid request\n")
+
+    def _accept(self):
+        try:
+            conn, _ = self.server.accept()
+        except socket.error as err:
+            # SIGCHLD interrupts accept
+            if(err.args[0] == errno.EINTR):
+                return None
+            raise
+
+        return conn
+
+    def serve_forever(self):
+        """Serve simulator requests until stop method is called.
+        """
+        if(os.path.exists(self.socket_path)):
+            os.unlink(self.socket_path)
+
+        self._prepare()
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen(128)
+
+        signal.signal(signal.SIGCHLD, self._reap_children)
+
+        print("Fork server: {}".format(self.socket_path))
+
+        self.running = True
+        try:
+            while(self.running is True):
+                conn = self._accept()
+                if(conn is None):
+                    continue
+
+                try:
+                    self._handle_request(conn)
+                except (socket.error, OSError) as err:
+                    print("Fork server request failed: {}".format(err))
+                finally:
+                    conn.close()
+        finally:
+            self.server.close()
+            os.unlink(self.socket_path)
+
+    def stop(self):
+        """Stop fork server and terminate running simulators.
+        """
+        self.running = False
+
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError as err:
+                if(err.errno != errno.ESRCH):
+                    raise
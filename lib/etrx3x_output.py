@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import threading
+import time
+
+# Overflow policies of a full output queue
+OUTPUT_POLICIES = ("block", "drop_oldest", "error")
+
+# Minimum amount of dropped entries before the queue is compacted
+MIN_COMPACT_SIZE = 64
+
+
+class ETRX3xOutputQueue(object):
+    """Bounded queue of ETRX3x simulator serial output messages.
+
+    Messages are host command responses (OK, SEQ, ACK, NACK, ERROR, ...) or
+    unsolicited notifications (such as remote node traffic). Responses are
+    never discarded. When the queue holds max_size messages (the host does
+    not read the serial port fast enough), a new message is handled by the
+    overflow policy:
+        block: producer waits for free space.
+        drop_oldest: oldest queued notification is discarded. If no
+            notification is queued, a new notification is discarded and a
+            new response waits as with "block" policy.
+        error: new notification is discarded and overflow_message (such as
+            an ETRX3x ERROR response) is queued once until the queue is
+            empty again. A slot is reserved for overflow_message, so it does
+            not exceed max_size. A new response waits as with "block"
+            policy.
+
+    Producers that can not wait (put with block=False, such as the event
+    loop) queue the message over the limit and must hold new messages while
+    is_blocked returns True.
+
+    The queue keeps its depth, high-water mark and amount of dropped
+    messages.
+    """
+    def __init__(self, max_size=0, policy="block", overflow_message=None):
+        """Constructor for ETRX3xOutputQueue class.
+
+        Args:
+            max_size: maximum amount of queued messages (0 for unbounded
+                queue).
+            policy: overflow policy ("block", "drop_oldest" or "error").
+            overflow_message: response queued on overflow by "error" policy.
+
+        Raises:
+            ValueError for invalid max size or policy.
+        """
+        if(max_size < 0):
+            raise ValueError("invalid max size {!r}".format(max_size))
+
+        if(policy not in OUTPUT_POLICIES):
+            raise ValueError("invalid policy {!r}".format(policy))
+
+        self.max_size = max_size
+        self.policy = policy
+        self.overflow_message = overflow_message
+
+        # item = [message, notification]. Discarded notifications stay in
+        # queue with None message until the queue is compacted.
+        self.messages = collections.deque()
+
+        # Queued notification items (oldest first)
+        self.notifications = collections.deque()
+
+        # Amount of queued messages and of discarded items still in queue
+        self.size = 0
+        self.dropped_items = 0
+
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+
+        # Overflow message was queued (error policy)
+        self.overflow = False
+
+        # Queue was closed (see close method)
+        self.closed = False
+
+        self.high_water = 0
+        self.total_drops = 0
+
+    def _is_full(self, reserved=0):
+        return self.max_size > 0 and self.size + reserved >= self.max_size
+
+    def _is_blocked(self, notification):
+        if(self.policy == "block"):
+            return self._is_full()
+
+        if(notification is True):
+            # Notifications are discarded instead
+            return False
+
+        if(self.policy == "drop_oldest" and len(self.notifications) > 0):
+            # Oldest notification is discarded instead
+            return False
+
+        return self._is_full()
+
+    def _append(self, message, notification):
+        item = [message, notification]
+        self.messages.append(item)
+        if(notification is True):
+            self.notifications.append(item)
+
+        self.size += 1
+        if(self.size > self.high_water):
+            self.high_water = self.size
+        self.not_empty.notify()
+
+    def _drop_oldest_notification(self):
+        item = self.notifications.popleft()
+        item[0] = None
+        self.size -= 1
+        self.total_drops += 1
+
+        self.dropped_items += 1
+        if(self.dropped_items >= max(MIN_COMPACT_SIZE, self.size)):
+            self.messages = collections.deque(
+                [item for item in self.messages if item[0] is not None])
+            self.dropped_items = 0
+
+    def put(self, message, block=True, notification=False):
+        """Queue a message.
+
+        Args:
+            message: message string.
+            block: True to wait for free space or False to queue the message
+                over the limit (see is_blocked).
+            notification: True for unsolicited notification that can be
+                discarded or False for host command response.
+
+        Returns:
+            True if message was queued or False if it was dropped (or queue
+            was closed).
+        """
+        self.lock.acquire()
+        try:
+            if(self.closed is True):
+                return False
+
+            if(notification is True and self.policy == "error"):
+                # Slot of overflow message is reserved until it is queued
+                if(self._is_full(0 if self.overflow is True else 1)):
+                    self.total_drops += 1
+                    if(self.overflow is False and
+                            self.overflow_message is not None):
+                        self.overflow = True
+                        self._append(self.overflow_message, False)
+                    return False
+
+            elif(notification is True and self.policy == "drop_oldest"):
+                if(self._is_full() is True):
+                    if(len(self.notifications) == 0):
+                        # Only responses are queued: new notification is
+                        # the oldest one
+                        self.total_drops += 1
+                        return False
+
+                    self._drop_oldest_notification()
+
+            elif(self.policy == "drop_oldest" and self._is_full() is True and
+                    len(self.notifications) > 0):
+                self._drop_oldest_notification()
+
+            while(block is True and
+                    self._is_blocked(notification) is True):
+                # Wait with timeout to allow KeyboardInterrupt
+                self.not_full.wait(1)
+                if(self.closed is True):
+                    return False
+
+            self._append(message, notification)
+            return True
+        finally:
+            self.lock.release()
+
+    def _pop(self):
+        while(True):
+            item = self.messages.popleft()
+            if(item[0] is not None):
+                break
+            self.dropped_items -= 1
+
+        if(item[1] is True):
+            # Oldest queued notification is the oldest queued message
+            self.notifications.popleft()
+
+        self.size -= 1
+        if(self.size == 0):
+            self.overflow = False
+        self.not_full.notify()
+
+        return item[0]
+
+    def get(self, timeout=None):
+        """Remove oldest message, waiting for a message if queue is empty.
+
+        Args:
+            timeout: maximum wait in seconds (None waits forever).
+
+        Returns:
+            Message string or None if there is no message after timeout (or
+            queue was closed).
+        """
+        self.lock.acquire()
+        try:
+            if(timeout is not None):
+                deadline = time.time() + timeout
+
+            while(self.size == 0):
+                if(self.closed is True):
+                    return None
+
+                if(timeout is None):
+                    self.not_empty.wait(1)
+                    continue
+
+                remaining = deadline - time.time()
+                if(remaining <= 0):
+                    return None
+                self.not_empty.wait(remaining)
+
+            return self._pop()
+        finally:
+            self.lock.release()
+
+    def get_nowait(self):
+        """Remove oldest message without waiting.
+
+        Returns:
+            Message string or None if queue is empty.
+        """
+        self.lock.acquire()
+        try:
+            if(self.size == 0):
+                return None
+
+            return self._pop()
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        """Discard all queued messages.
+        """
+        self.lock.acquire()
+        try:
+            self.messages.clear()
+            self.notifications.clear()
+            self.size = 0
+            self.dropped_items = 0
+            self.overflow = False
+            self.not_full.notify_all()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        """Close queue and release waiting producers and consumers.
+
+        New messages are dropped, queued messages can still be removed.
+        """
+        self.lock.acquire()
+        try:
+            self.closed = True
+            self.not_full.notify_all()
+            self.not_empty.notify_all()
+        finally:
+            self.lock.release()
+
+    def is_blocked(self, notification=False):
+        """Test if producers must hold new messages.
+
+        Args:
+            notification: True to test notifications producers or False to
+                test responses producers.
+
+        Returns:
+            True if a new message would wait for free space (see policies),
+            otherwise False.
+        """
+        return self._is_blocked(notification)
+
+    def get_depth(self):
+        """Get amount of queued messages.
+
+        Returns:
+            Amount of messages.
+        """
+        return self.size
+
+    def get_high_water(self):
+        """Get maximum amount of queued messages.
+
+        Returns:
+            Amount of messages.
+        """
+        return self.high_water
+
+    def get_total_drops(self):
+        """Get amount of dropped messages.
+
+        Returns:
+            Amount of messages.
+        """
+        return self.total_drops
+
+    def get_stats(self):
+        """Get queue counters.
+
+        Returns:
+            Dictionary with "depth", "high_water" and "drops" counters.
+        """
+        return {
+            "depth": self.size,
+            "high_water": self.high_water,
+            "drops": self.total_drops
+        }
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class ETRX3xVirtualClock(object):
+    """Virtual clock of ETRX3x simulator.
+
+    The clock runs as the real clock plus an offset, and the offset is
+    increased to jump over idle periods, so delayed events are executed
+    without waiting their real deadline.
+    """
+    def __init__(self):
+        """Constructor for ETRX3xVirtualClock class.
+        """
+        self.offset = 0.0
+
+    def time(self):
+        """Get virtual clock time.
+
+        Returns:
+            Timestamp in seconds.
+        """
+        return time.time() + self.offset
+
+    def advance(self, seconds):
+        """Move virtual clock forward.
+
+        Args:
+            seconds: amount of seconds (negative values are ignored).
+        """
+        if(seconds > 0):
+            self.offset += seconds
+
+
+class ETRX3xScheduler(object):
+    """Timer scheduler of ETRX3x simulator delayed events.
+
+    All delayed events are stored in a heap ordered by deadline and they are
+    executed by a single thread, so the number of threads does not depend on
+    the amount of scheduled events.
+    """
+    def __init__(self, clock=None):
+        """Constructor for ETRX3xScheduler class.
+
+        Args:
+            clock: function that returns current timestamp in seconds (None
+                uses time.time). A virtual clock must be used only by an
+                event loop.
+        """
+        if(clock is None):
+            clock = time.time
+        self.clock = clock
+
+        # item = [deadline, sequence, function, args]
+        self.events = []
+
+        # Sequence keeps FIFO order for events with same deadline
+        self.sequence = itertools.count()
+
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def call_later(self, delay, function, *args):
+        """Schedule function to be called after delay seconds.
+
+        Args:
+            delay: delay in seconds.
+            function: callable to be executed.
+            args: function arguments.
+
+        Returns:
+            Scheduled event that can be used to cancel it.
+        """
+        return self.call_at(self.clock() + delay, function, *args)
+
+    def call_at(self, deadline, function, *args):
+        """Schedule function to be called at deadline timestamp.
+
+        Args:
+            deadline: timestamp in seconds.
+            function: callable to be executed.
+            args: function arguments.
+
+        Returns:
+            Scheduled event that can be used to cancel it.
+        """
+        event = [deadline, next(self.sequence), function, args]
+
+        self.condition.acquire()
+        heapq.heappush(self.events, event)
+
+        # Wake up scheduler thread for a new earliest deadline
+        if(self.events[0] is event):
+            self.condition.notify()
+        self.condition.release()
+
+        return event
+
+    def cancel(self, event):
+        """Cancel a scheduled event.
+
+        Args:
+            event: event returned by call_later or call_at.
+        """
+        # Cancelled events are discarded when they reach the heap top
+        event[2] = None
+
+    def get_next_deadline(self):
+        """Get deadline of the earliest scheduled event.
+
+        Returns:
+            Deadline timestamp in seconds or None if there is no scheduled
+            event.
+        """
+        deadline = None
+
+        self.condition.acquire()
+        # Discard cancelled events from heap top
+        while(len(self.events) > 0 and self.events[0][2] is None):
+            heapq.heappop(self.events)
+
+        if(len(self.events) > 0):
+            deadline = self.events[0][0]
+        self.condition.release()
+
+        return deadline
+
+    def run_pending(self):
+        """Run all events with expired deadline.
+
+        This method is used when the scheduler is driven by an event loop
+        instead of the scheduler thread.
+
+        Returns:
+            Amount of executed events.
+        """
+        total = 0
+        now = self.clock()
+
+        self.condition.acquire()
+        try:
+            while(len(self.events) > 0 and self.events[0][0] <= now):
+                event = heapq.heappop(self.events)
+
+                if(event[2] is not None):
+                    self.condition.release()
+                    try:
+                        event[2](*event[3])
+                    finally:
+                        self.condition.acquire()
+                    total += 1
+        finally:
+            self.condition.release()
+
+        return total
+
+    def transfer(self, scheduler):
+        """Move all scheduled events to other scheduler.
+
+        Events keep its deadline and can still be cancelled with cancel
+        method.
+
+        Args:
+            scheduler: ETRX3xScheduler object that receives the events.
+        """
+        self.condition.acquire()
+        events = self.events
+        self.events = []
+        self.condition.release()
+
+        events.sort()
+        for event in events:
+            if(event[2] is None):
+                continue
+
+            event[1] = next(scheduler.sequence)
+            scheduler.condition.acquire()
+            heapq.heappush(scheduler.events, event)
+            scheduler.condition.notify()
+            scheduler.condition.release()
+
+    def get_total_events(self):
+        """Get amount of scheduled events.
+
+        Returns:
+            Amount of events waiting for its deadline.
+        """
+        return len(self.events)
+
+    def _thread_function(self):
+        self.condition.acquire()
+        try:
+            while(self.running is True):
+                timeout = None
+                if(len(self.events) > 0):
+                    timeout = self.events[0][0] - self.clock()
+
+                    if(timeout <= 0):
+                        event = heapq.heappop(self.events)
+
+                        # Run event without lock to allow new events
+                        self.condition.release()
+                        try:
+                            if(event[2] is not None):
+                                event[2](*event[3])
+                        finally:
+                            self.condition.acquire()
+                        continue
+
+                self.condition.wait(timeout)
+        finally:
+            self.condition.release()
+
+    def start(self):
+        """Start scheduler thread.
+        """
+        self.running = True
+
+        self.thread = threading.Thread(target=self._thread_function, args=())
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop scheduler thread and wait for the running event.
+        """
+        self.condition.acquire()
+        self.running = False
+        self.condition.notify()
+        self.condition.release()
+
+        # An event can stop its own scheduler
+        if(self.thread is not None and
+                self.thread is not threading.current_thread()):
+            self.thread.join()
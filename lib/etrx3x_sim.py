@@ -4,13 +4,48 @@
 import os
 import pty
 import re
-import time
-import Queue
+import errno
+import fcntl
+import argparse
 import threading
+import time
 
 from lib.etrx3x_at_cmds import ETRX3xATCommand
+from lib.etrx3x_event_loop import ETRX3xEventLoop
+from lib.etrx3x_scheduler import ETRX3xVirtualClock
+from lib.etrx3x_forkserver import ETRX3xForkServer
+from lib.etrx3x_output import ETRX3xOutputQueue
+from lib.etrx3x_output import OUTPUT_POLICIES
+from lib.etrx3x_scheduler import ETRX3xScheduler
+from lib.etrx3x_snapshot import load_snapshot
+from lib.etrx3x_snapshot import save_snapshot
+from lib.etrx3x_traffic import ETRX3xTrafficGenerator
+from lib.etrx3x_traffic import TRAFFIC_DISTRIBUTIONS
+from lib.etrx3x_traffic import TRAFFIC_MESSAGES
+from lib.etrx3x_transport import ETRX3xPtyTransport
+from lib.etrx3x_transport import ETRX3xTCPTransport
+from lib.etrx3x_transport import ETRX3xUnixTransport
 from lib.sgcon_validators import validate_node_identifier
 from lib.zigbee import ZigBeeNetwork
+from lib.zigbee import create_sregister_profile
+from lib.zigbee import set_clock
+from lib.zigbee_radio import ZigBeeLatencyModel
+from lib.zigbee_radio import ZigBeeLossModel
+from lib.zigbee_routing import ZigBeeRoutingEngine
+from lib.zigbee_topology import TOPOLOGIES
+from lib.zigbee_topology import create_networks
+from lib.zigbee_topology import read_topology_file
+from lib.zigbee_topology import write_topology_file
+
+# First character of an AT command
+AT_START_PATTERN = re.compile("[aA]")
+
+# Valid characters after "AT" prefix
+AT_COMMAND_CHARS = "+iInNsSrRzZ"
+
+# AT command name used to select the command handlers, such as "ati",
+# "ats", "atrems" or "at+ucast"
+AT_COMMAND_NAME_PATTERN = re.compile("at(\+[a-z]+|rems|[a-z])?")
 
 
 class ETRX3xSimulatorException(Exception, object):
@@ -34,11 +69,26 @@ class ETRX3xSimulator(object):
             router_etrx3x_sregs=None,
             sed_etrx3x_sregs=None,
             med_etrx3x_sregs=None,
-            zed_etrx3x_sregs=None):
+            zed_etrx3x_sregs=None,
+            latency_model=None,
+            loss_model=None,
+            topology_file=None,
+            snapshot_file=None,
+            zb_networks=None,
+            routing_engine=None,
+            output_queue_size=0,
+            output_policy="block"):
         super(ETRX3xSimulator, self).__init__()
         # AT commands protocol class
         self.etrx3x_at = ETRX3xATCommand()
 
+        # AT command handlers by command name
+        self.at_handlers = {}
+
+        # Registered command names, longest first
+        self.at_command_names = []
+        self._register_at_commands()
+
         self.zbnet_list = zbnet_list
         self.local_node_eui = local_node_eui
         self.local_pan_eid = local_pan_eid
@@ -84,17 +134,64 @@ class ETRX3xSimulator(object):
                 return
 
         self.zb_networks = {}
+        routing_state = None
         try:
-            self._load_zb_networks(
-                zbnet_list, self.local_node_eui, self.local_pan_eid)
+            if(zb_networks is not None):
+                # Networks shared with other simulators (local modules)
+                self.zb_networks = zb_networks
+                if(self.local_pan_eid is None):
+                    self.local_pan_eid = self._find_local_pan_eid(
+                        self.local_node_eui)
+            elif(snapshot_file is not None):
+                # Networks are restored without configuration validation
+                (self.zb_networks, self.local_node_eui, self.local_pan_eid,
+                 routing_state) = self._load_snapshot(snapshot_file)
+            elif(topology_file is not None):
+                # Local node and local PAN can be defined by topology file
+                self.local_node_eui, self.local_pan_eid = \
+                    self._load_topology_file(
+                        topology_file, self.local_node_eui,
+                        self.local_pan_eid)
+            else:
+                self._load_zb_networks(
+                    zbnet_list, self.local_node_eui, self.local_pan_eid)
         except ETRX3xSimulatorException as err:
             print(err)
             return
 
         self.local_zb_network = self.zb_networks[self.local_pan_eid]
-        self.local_node = self.local_zb_network.get_local_node()
         self.local_pan = self.local_zb_network.get_local_pan()
 
+        # Several simulators can share a network, each one with its own
+        # local node
+        self.local_node = self.local_zb_network.get_local_node()
+        if(self.local_node_eui is not None):
+            self.local_node = self.local_zb_network.get_node_eui(
+                self.local_node_eui)
+
+        # Least cost paths from local node to local network nodes (shared
+        # by sessions of the same local node). An engine created here is
+        # detached from the network by close method.
+        self.routing_engine_owner = False
+        if(routing_engine is None):
+            routing_engine = ZigBeeRoutingEngine(
+                self.local_zb_network, self.local_node.get_node_id())
+            self.routing_engine_owner = True
+            if(routing_state is not None):
+                # Paths computed before the snapshot was saved
+                routing_engine.set_state(routing_state)
+        self.routing_engine = routing_engine
+
+        # Delay of remote node responses
+        if(latency_model is None):
+            latency_model = ZigBeeLatencyModel()
+        self.latency_model = latency_model
+
+        # Packet loss of remote node messages
+        if(loss_model is None):
+            loss_model = ZigBeeLossModel()
+        self.loss_model = loss_model
+
         # Simulation control
         self.main_loop = False
         self.echo_enabled = False
@@ -102,13 +199,49 @@ class ETRX3xSimulator(object):
         # AT data
         self.seq_counter = 0
 
-        self.write_queue = Queue.Queue()
+        # Serial output messages. When the host does not read the serial
+        # port, a bounded queue applies its overflow policy ("error" policy
+        # sends ERROR 18 - node has run out of buffers)
+        self.write_queue = ETRX3xOutputQueue(
+            output_queue_size, output_policy,
+            overflow_message=self.etrx3x_at.error_response("18"))
         self.write_thread = None
 
+        # Queued messages are written together up to write_batch_size bytes.
+        # The writer waits up to write_flush_time seconds for more messages
+        # before writing a batch (0 writes the queued messages at once)
+        self.write_batch_size = 65536
+        self.write_flush_time = 0
+
+        # Maximum wait in seconds for the writer thread on stop
+        self.write_stop_timeout = 5
+
+        # Scheduler of delayed responses
+        self.scheduler = ETRX3xScheduler()
+
         # AT input character buffer limit
         # This is used to simulate error 0C (Too many characters)
         self.serial_input_limit = 129
 
+        # Serial input is read in chunks of serial_read_size bytes and
+        # buffered until a complete command is received
+        self.serial_read_size = 4096
+        self.input_buffer = ""
+        self.store_data = ""
+
+        # Pending binary data read: [size, callback, args]
+        self.binary_read = None
+
+        # Serial port file descriptors (see open_serial method)
+        self.master = None
+        self.slave = None
+
+        # Event loop mode (see attach method)
+        self.loop = None
+        self.output_buffer = []  # data not written by partial write
+        self.write_pending = False
+        self.input_paused = False
+
     def _validate_etrx3x_config(self, config_dict):
         try:
             for sreg in config_dict:
@@ -131,98 +264,251 @@ class ETRX3xSimulator(object):
         if(re.match("[0-9A-Z]{2}", index.upper()) is None):
             raise ValueError("invalid index format: {!r}".format(index))
 
+    def _get_role_sregisters(self, node_type):
+        if(node_type == "COO"):
+            return self.coo_etrx3x_sregs
+        elif(node_type == "FFD"):
+            return self.router_etrx3x_sregs
+        elif(node_type == "SED"):
+            return self.sed_etrx3x_sregs
+        elif(node_type == "MED"):
+            return self.med_etrx3x_sregs
+        elif(node_type == "ZED"):
+            return self.zed_etrx3x_sregs
+
+        raise ETRX3xSimulatorException(
+            "_load_zb_networks: invalid node type {!r}".format(node_type))
+
     def _load_zb_networks(self, zbnet_list, local_node_eui, local_pan_eid):
         for zbnet in zbnet_list:
-            net = ZigBeeNetwork()
+            net, profiles = self._add_zb_network(zbnet["pan"], local_pan_eid)
 
-            pan = zbnet["pan"]
-            pan_channel = pan["channel"]
-            pan_id = pan["id"]
-            pan_eid = pan["eid"]
-            pan_netkey = pan["netkey"]
-            pan_linkkey = pan["linkkey"]
+            for dict_node in zbnet["nodes"]:
+                self._add_zb_node(
+                    net, zbnet["pan"], profiles, dict_node, local_node_eui)
 
-            zbpan = net.add_pan(
-                pan_channel, "-07", pan_id, pan_eid, "02", True)
+            for link in zbnet["links"]:
+                self._add_zb_link(net, link)
 
-            if(pan_eid == local_pan_eid):
-                net.set_local_pan(zbpan)
+    def _load_topology_file(self, topology_file, local_node_eui,
+                            local_pan_eid):
+        # Networks are built item by item while the file is read
+        net = None
+        try:
+            with open(topology_file) as json_file:
+                for item_type, data in read_topology_file(json_file):
+                    if(item_type == "pan"):
+                        pan = data
+                        net, profiles = self._add_zb_network(
+                            pan, local_pan_eid)
+
+                        if(local_pan_eid is None):
+                            # Default local PAN is the first PAN
+                            local_pan_eid = pan["eid"]
+                            net.set_local_pan(net.get_pan_index(0))
+
+                    elif(item_type == "node"):
+                        if(local_node_eui is None and
+                                pan["eid"] == local_pan_eid and
+                                data["type"] == "COO"):
+                            # Default local node is the local PAN coordinator
+                            local_node_eui = data["eui"]
+
+                        self._add_zb_node(
+                            net, pan, profiles, data, local_node_eui)
+
+                    elif(item_type == "link"):
+                        self._add_zb_link(net, data)
+
+        except (IOError, ValueError, KeyError, TypeError) as err:
+            raise ETRX3xSimulatorException(
+                "_load_topology_file: invalid topology file {!r}: {}".format(
+                    topology_file, err))
 
-            for dict_node in zbnet["nodes"]:
-                node_id = dict_node["id"]
-                node_eui = dict_node["eui"]
-                node_type = dict_node["type"]
-                node_parent_id = dict_node["parent_id"]
-                node_sregs = dict_node["sregs"]
-
-                node = net.add_node(
-                    node_eui,
-                    node_id=node_id,
-                    node_type=node_type,
-                    registers=[]  # Use '[]' to set new array object
-                )
-
-                if(node_type == "COO"):
-                    regs = self.coo_etrx3x_sregs
-                elif(node_type == "FFD"):
-                    regs = self.router_etrx3x_sregs
-                elif(node_type == "SED"):
-                    regs = self.sed_etrx3x_sregs
-                elif(node_type == "MED"):
-                    regs = self.med_etrx3x_sregs
-                elif(node_type == "ZED"):
-                    regs = self.zed_etrx3x_sregs
-                else:
-                    raise ETRX3xSimulatorException(
-                        "_load_zb_networks: invalid node type {!r}".format(
-                            node_type))
-
-                # Set nodes set sregisters values
-                for reg in regs:
-                    # TODO(rubens): set pan channel mask in hex format
-                    # regs["00"] = pan_channel
-                    if(reg == "03"):
-                        node.add_sregister(reg, pan_eid)
-                    elif(reg == "04"):
-                        node.add_sregister(reg, node_eui)
-                    elif(reg == "05"):
-                        node.add_sregister(reg, node_id)
-                    # TODO(rubens): set node parent eui
-                    # regs["06"] = node_parent_eui
-                    elif(reg == "07"):
-                        node.add_sregister(reg, node_parent_id)
-                    elif(reg == "08"):
-                        node.add_sregister(reg, pan_netkey)
-                    elif(reg == "09"):
-                        node.add_sregister(reg, pan_linkkey)
-                    else:
-                        node.add_sregister(reg, regs[reg])
-
-                # Set custom sregisters from node
-                for reg in node_sregs:
-                    node.add_sregister(reg, node_sregs[reg])
-
-                # Set Address Table
-                for i in range(0, 7):
-                    node.add_address_entry("N", "FFFF", "FFFFFFFFFFFFFFFF")
-
-                if(node_eui == local_node_eui):
-                    net.set_local_node(node)
+        if(local_pan_eid not in self.zb_networks):
+            raise ETRX3xSimulatorException(
+                "_load_topology_file: local PAN {!r} not found in topology "
+                "file {!r}".format(local_pan_eid, topology_file))
 
-            for link in zbnet["links"]:
-                link_id_src = link["id_src"]
-                link_id_dst = link["id_dst"]
-                link_quality = link["lqi"]
+        if(local_node_eui is None or
+                self.zb_networks[local_pan_eid].get_node_eui(
+                    local_node_eui) is None):
+            raise ETRX3xSimulatorException(
+                "_load_topology_file: local node {!r} not found in PAN {!r} "
+                "of topology file {!r}".format(
+                    local_node_eui, local_pan_eid, topology_file))
+
+        return [local_node_eui, local_pan_eid]
+
+    def _find_local_pan_eid(self, local_node_eui):
+        for pan_eid in self.zb_networks:
+            if(self.zb_networks[pan_eid].get_node_eui(local_node_eui)
+                    is not None):
+                return pan_eid
+
+        raise ETRX3xSimulatorException(
+            "_find_local_pan_eid: node {!r} not found".format(
+                local_node_eui))
+
+    def add_local_module(self, local_node_eui, local_pan_eid=None):
+        """Create a simulator of other local module of the same networks.
+
+        The new simulator shares the networks, latency model and loss model
+        of this simulator, and has its own serial port, local node, sequence
+        counter and echo state. Simulators sharing networks must be run by
+        the same thread (see run_simulators). A module that is no longer
+        used must be released with close method.
+
+        Args:
+            local_node_eui: EUI of local node of new module.
+            local_pan_eid: PAN extended identifier of local node (None
+                searches the node in all networks).
+
+        Returns:
+            ETRX3xSimulator object.
+
+        Raises:
+            ETRX3xSimulatorException if local node is not found.
+        """
+        if(local_pan_eid is None):
+            local_pan_eid = self._find_local_pan_eid(local_node_eui)
+
+        # Modules of the same local node share the computed paths
+        routing_engine = None
+        if(local_node_eui == self.local_node.get_node_eui() and
+                local_pan_eid == self.local_pan_eid):
+            routing_engine = self.routing_engine
+
+        return ETRX3xSimulator(
+            None,
+            local_node_eui,
+            local_pan_eid,
+            latency_model=self.latency_model,
+            loss_model=self.loss_model,
+            zb_networks=self.zb_networks,
+            routing_engine=routing_engine,
+            output_queue_size=self.write_queue.max_size,
+            output_policy=self.write_queue.policy)
+
+    def _load_snapshot(self, snapshot_file):
+        try:
+            return load_snapshot(snapshot_file)
+        except (IOError, ValueError) as err:
+            raise ETRX3xSimulatorException(
+                "_load_snapshot: invalid snapshot file {!r}: {}".format(
+                    snapshot_file, err))
+
+    def save_snapshot(self, snapshot_file):
+        """Save simulator networks in binary snapshot file.
+
+        The snapshot can be used as snapshot_file argument to create a
+        simulator without loading and validating the networks again. Paths
+        from local node are computed (if needed) and stored too.
 
-                node_src = net.get_node(link_id_src)
-                node_src.add_neighbour(
-                    link_id_src, link_id_dst, lqi=link_quality)
+        Args:
+            snapshot_file: snapshot file path.
+        """
+        save_snapshot(
+            snapshot_file, self.zb_networks, self.local_node_eui,
+            self.local_pan_eid, self.routing_engine.get_state())
 
-                node_dst = net.get_node(link_id_dst)
-                node_dst.add_neighbour(
-                    link_id_dst, link_id_src, lqi=link_quality)
+    def _add_zb_network(self, pan, local_pan_eid):
+        net = ZigBeeNetwork()
 
-            self.zb_networks[pan_eid] = net
+        zbpan = net.add_pan(
+            pan["channel"], "-07", pan["id"], pan["eid"], "02", True)
+
+        if(pan["eid"] == local_pan_eid):
+            net.set_local_pan(zbpan)
+
+        self.zb_networks[pan["eid"]] = net
+
+        # Shared SRegister profiles by node type of this PAN
+        profiles = {}
+
+        return [net, profiles]
+
+    def _add_zb_node(self, net, pan, profiles, dict_node, local_node_eui):
+        node_id = dict_node["id"]
+        node_eui = dict_node["eui"]
+        node_type = dict_node["type"]
+        node_parent_id = dict_node["parent_id"]
+        node_sregs = dict_node["sregs"]
+
+        try:
+            self._validate_node_identifier(node_id)
+            self._validate_node_identifier(node_eui)
+            self._validate_node_identifier(node_parent_id)
+        except ValueError as err:
+            raise ETRX3xSimulatorException(
+                "_load_zb_networks: node {!r}: {}".format(node_eui, err))
+
+        self._validate_etrx3x_config(node_sregs)
+
+        node = net.add_node(
+            node_eui,
+            node_id=node_id,
+            node_type=node_type,
+            registers=[]  # Use '[]' to set new array object
+        )
+
+        profile = profiles.get(node_type)
+        if(profile is None):
+            regs = self._get_role_sregisters(node_type)
+
+            # TODO(rubens): set pan channel mask in hex format
+            # regs["00"] = pan_channel
+            # TODO(rubens): set node parent eui
+            # regs["06"] = node_parent_eui
+            profile_regs = dict(regs)
+            for reg, value in (("03", pan["eid"]), ("08", pan["netkey"]),
+                               ("09", pan["linkkey"])):
+                if(reg in profile_regs):
+                    profile_regs[reg] = value
+
+            profile = [regs, create_sregister_profile(profile_regs)]
+            profiles[node_type] = profile
+
+        # Nodes of same type share the profile and keep only its own
+        # SRegisters values
+        node.set_sregister_profile(profile[1])
+
+        regs = profile[0]
+        for reg, value in (("04", node_eui), ("05", node_id),
+                           ("07", node_parent_id)):
+            if(reg in regs):
+                node.add_sregister(reg, value)
+
+        # Set custom sregisters from node
+        for reg in node_sregs:
+            node.add_sregister(reg, node_sregs[reg])
+
+        # Set Address Table
+        for i in range(0, 7):
+            node.add_address_entry("N", "FFFF", "FFFFFFFFFFFFFFFF")
+
+        if(node_eui == local_node_eui):
+            net.set_local_node(node)
+
+        return node
+
+    def _add_zb_link(self, net, link):
+        link_id_src = link["id_src"]
+        link_id_dst = link["id_dst"]
+        link_quality = link["lqi"]
+
+        node_src = net.get_node(link_id_src)
+        node_dst = net.get_node(link_id_dst)
+        if(node_src is None or node_dst is None):
+            raise ETRX3xSimulatorException(
+                "_load_zb_networks: invalid link {} -> {}: node not "
+                "found".format(link_id_src, link_id_dst))
+
+        node_src.add_neighbour(
+            link_id_src, link_id_dst, lqi=link_quality)
+
+        node_dst.add_neighbour(
+            link_id_dst, link_id_src, lqi=link_quality)
 
     def get_ntable(self, node_id):
         # {"type": "COO", "node_eui": "000D6F0000BA19DB",
@@ -258,33 +544,915 @@ class ETRX3xSimulator(object):
         self.seq_counter = (self.seq_counter + 1) % 256
         return seq_number
 
+    def _get_write_batch(self, data, flush_time):
+        batch = [data]
+        size = len(data)
+        deadline = time.time() + flush_time
+
+        # Drain queued messages up to batch size or flush deadline
+        while(size < self.write_batch_size):
+            message = self.write_queue.get_nowait()
+            if(message is None):
+                timeout = deadline - time.time()
+                if(timeout <= 0):
+                    break
+
+                message = self.write_queue.get(timeout)
+                if(message is None):
+                    break
+
+            batch.append(message)
+            size += len(message)
+
+        return "".join(batch)
+
+    def _write_all(self, data):
+        # os.write can write only part of data
+        written = os.write(self.master, data)
+        while(written < len(data)):
+            written += os.write(self.master, buffer(data, written))
+
     def _write_thread_function(self):
         while(self.main_loop is True):
-            try:
-                message = self.write_queue.get(True, 1)
+            message = self.write_queue.get(1)
+            if(message is None):
+                continue
+
+            self._write_all(
+                self._get_write_batch(message, self.write_flush_time))
+
+    def write_serial(self, message, notification=False):
+        if(self.loop is not None):
+            if(self.master is None):
+                # Delayed response of a closed session
+                return
+
+            # Event loop mode: message is written when serial is writable
+            self.write_queue.put(message, block=False,
+                                 notification=notification)
+            if(self.write_pending is False):
+                self.write_pending = True
+                self.loop.add_writer(self.master, self._write_ready)
+
+            if(self.input_paused is False and
+                    self.write_queue.is_blocked() is True):
+                # Backpressure: host commands are not read until the output
+                # queue has free space
+                self.input_paused = True
+                self.loop.remove_reader(self.master)
+        else:
+            # Producer waits for free space (see output policies)
+            self.write_queue.put(message, notification=notification)
+
+    def is_output_blocked(self, notification=False):
+        """Test if new serial output must be held by its producer.
+
+        Args:
+            notification: True to test unsolicited notifications or False to
+                test host command responses.
+
+        Returns:
+            True if output queue has no free space for the message (see
+            ETRX3xOutputQueue policies), otherwise False.
+        """
+        return self.write_queue.is_blocked(notification)
+
+    def _write_ready(self):
+        data = self._get_write_batch("".join(self.output_buffer), 0)
+        try:
+            written = os.write(self.master, data)
+        except OSError as err:
+            if(err.errno in (errno.EPIPE, errno.ECONNRESET)):
+                # Socket session closed by host
+                self.close_serial()
+                return
+            if(err.errno != errno.EAGAIN):
+                raise
+            written = 0
+
+        if(written < len(data)):
+            self.output_buffer = [data[written:]]
+        else:
+            self.output_buffer = []
+            if(self.write_queue.get_depth() == 0):
+                self.write_pending = False
+                self.loop.remove_writer(self.master)
+
+        if(self.input_paused is True and
+                self.write_queue.is_blocked() is False):
+            self.input_paused = False
+            self.loop.add_reader(self.master, self._read_ready)
+            self._process_input()
+
+    def _read_ready(self):
+        try:
+            data = os.read(self.master, self.serial_read_size)
+        except OSError as err:
+            if(err.errno == errno.ECONNRESET):
+                data = ""
+            elif(err.errno != errno.EAGAIN):
+                raise
+            else:
+                return
 
-                os.write(self.master, message)
-            except Queue.Empty:
-                pass
+        if(len(data) == 0):
+            # End of file: socket session closed by host
+            self.close_serial()
+            return
 
-    def write_serial(self, message):
-        self.write_queue.put(message)
+        self.input_buffer += data
+        self._process_input()
 
     def write_async_message(self, message, delay=0.1):
-        # print(
-        #     "Starting thread to send async response {!r} in"
-        #     " {} seconds".format(message, delay))
+        # Delayed messages are sent to write queue by the scheduler thread
+        # in deadline order
+        self.scheduler.call_later(delay, self.write_serial, message)
+
+    def _next_command(self):
+        """Extract the next complete AT command from the input buffer.
+
+        The input is filtered the same way as the ETRX3x module: characters
+        are discarded until an "AT" prefix is found and commands longer than
+        serial_input_limit characters are rejected with error 0C.
+
+        Returns:
+            AT command string without the carriage return terminator or None
+            if the input buffer does not hold a complete command yet.
+        """
+        buf = self.input_buffer
+        buf_len = len(buf)
+        store_data = self.store_data
+        command = None
+        pos = 0
+
+        while(pos < buf_len):
+            if(store_data == ""):
+                # Discard every character until a command start
+                match = AT_START_PATTERN.search(buf, pos)
+                if(match is None):
+                    pos = buf_len
+                else:
+                    store_data = match.group()
+                    pos = match.end()
 
-        self.write_thread = threading.Thread(
-            target=self._write_async_message, args=(message, delay))
-        self.write_thread.setDaemon(True)
-        self.write_thread.start()
+            elif(len(store_data) == 1):
+                if(buf[pos] in "tT"):
+                    store_data += buf[pos]
+                else:
+                    # Clear stored data for invalid char
+                    store_data = ""
+                pos += 1
+
+            elif(len(store_data) == 2):
+                data = buf[pos]
+                pos += 1
+                if(data in AT_COMMAND_CHARS):
+                    store_data += data
+                elif(data == "\r"):
+                    command = store_data
+                    store_data = ""
+                    break
+                else:
+                    # Clear stored data for invalid char
+                    store_data = ""
+
+            else:
+                line_end = buf.find("\r", pos)
+                if(line_end < 0):
+                    data_end = buf_len
+                else:
+                    data_end = line_end
+
+                # NOTE(rubens): simulate input serial buffer limit of
+                # ETRX3x R309 module
+                free_space = self.serial_input_limit - len(store_data)
+                if(data_end - pos > free_space):
+                    # 0C = Too many characters
+                    response = self.etrx3x_at.error_response("0C")
+                    self.write_serial(response)
+
+                    # The exceeding character is discarded
+                    store_data = ""
+                    pos += free_space + 1
+                else:
+                    store_data += buf[pos:data_end]
+                    pos = data_end
+
+                    if(line_end >= 0):
+                        command = store_data
+                        store_data = ""
+                        pos += 1
+                        break
+
+        if(self.echo_enabled is True and pos > 0):
+            self.write_serial(buf[:pos])
+
+        self.input_buffer = buf[pos:]
+        self.store_data = store_data
+
+        return command
+
+    def _read_serial_binary(self, size, callback, *args):
+        """Read binary data from serial port.
+
+        The callback is executed with the binary data as first argument when
+        size bytes are received. Serial input is not parsed as AT commands
+        until the binary data is complete.
+
+        Args:
+            size: amount of bytes to read.
+            callback: callable executed with received data.
+            args: callback extra arguments.
+        """
+        self.binary_read = [size, callback, args]
+
+    def _process_input(self):
+        """Process buffered serial input.
+
+        Buffered input is delivered to a pending binary read or parsed as AT
+        commands.
+        """
+        # Buffered input is processed again when output is written (see
+        # write_serial backpressure)
+        while(self.input_paused is False):
+            if(self.binary_read is not None):
+                size, callback, args = self.binary_read
+                if(len(self.input_buffer) < size):
+                    break
+
+                data = self.input_buffer[:size]
+                self.input_buffer = self.input_buffer[size:]
+                self.binary_read = None
+
+                callback(data, *args)
+                continue
+
+            command = self._next_command()
+            if(command is None):
+                break
+
+            self._process_command(command)
+
+    def register_command(self, name, grammar, handler):
+        """Register an AT command handler.
+
+        Handlers of the same command name are tested in the registration
+        order and the first one with matching arguments grammar is called.
+        If none matches, the handlers of the longest registered name that
+        starts the command name are tested, so "at+n" also handles
+        "at+nxyz".
+
+        Args:
+            name: AT command name in lower case, such as "ati", "ats" or
+                "at+ucast".
+            grammar: regular expression of the command arguments (text after
+                the command name) in lower case.
+            handler: callable that receives the AT command string and returns
+                the response string.
+        """
+        if(name not in self.at_handlers):
+            self.at_handlers[name] = []
+            self.at_command_names.append(name)
+            self.at_command_names.sort(key=len, reverse=True)
+
+        self.at_handlers[name].append((re.compile(grammar), handler))
+
+    def _find_command_handler(self, store_data_low):
+        name = AT_COMMAND_NAME_PATTERN.match(store_data_low).group()
+        for grammar, handler in self.at_handlers.get(name, []):
+            if(grammar.match(store_data_low, len(name)) is not None):
+                return handler
+
+        # Command name prefixes, such as "at+n" for "at+ntable:zz"
+        for prefix in self.at_command_names:
+            if(len(prefix) >= len(name) or name.startswith(prefix) is False):
+                continue
+
+            for grammar, handler in self.at_handlers[prefix]:
+                if(grammar.match(store_data_low, len(prefix)) is not None):
+                    return handler
+
+        return None
+
+    def _register_at_commands(self):
+        self.register_command("at", "$", self._at_ok)
+        self.register_command("ati", "$", self._at_info)
+        self.register_command("atz", "$", self._at_ok)
+
+        # SRegisters access
+        self.register_command("ats", "$", self._at_invalid_parameter)
+        self.register_command(
+            "ats", "[0-9a-f]{4}\?", self._at_read_sregister_bit)
+        self.register_command(
+            "ats", "[0-9a-f]{3}\?", self._at_read_sregister_bit)
+        self.register_command(
+            "ats", "[0-9a-f]{2}\?", self._at_read_sregister)
+        self.register_command(
+            "ats", "[0-9a-f]{2}=[0-9a-z]*", self._at_write_sregister)
+        self.register_command("ats", "[0-9a-f]", self._at_invalid_parameter)
+
+        self.register_command("at+tokdump", "$", self._at_tokdump)
+        self.register_command("at+atable", "", self._at_address_table)
+        self.register_command("at+n", "", self._at_network_info)
+        self.register_command("at+panscan", "", self._at_pan_scan)
+
+        # REMOTE COMMANDS - SHOULD INCLUDE SEQ-ACK
+        self.register_command(
+            "at+ntable", ":[0-9a-f]{2},[0-9a-f]{16}", self._at_ntable_eui)
+        self.register_command(
+            "at+ntable", ":[0-9a-f]{2},[0-9a-f]{4}", self._at_ntable_node_id)
+        self.register_command(
+            "at+ntable", ":[0-9a-f]{2},[0-9a-f]{2}", self._at_ntable_index)
+
+        # Binary UCAST only supports address table index format
+        self.register_command(
+            "at+ucastb", ":[0-9a-f]{2},[0-9a-f]{16}",
+            self._at_invalid_parameter)
+        self.register_command(
+            "at+ucastb", ":[0-9a-f]{2},[0-9a-f]{4}",
+            self._at_invalid_parameter)
+        self.register_command(
+            "at+ucastb", ":[0-9a-f]{2},[0-9a-f]{2}", self._at_ucastb_index)
+
+        self.register_command(
+            "at+ucast", ":[0-9a-f]{16},", self._at_ucast_eui)
+        self.register_command(
+            "at+ucast", ":[0-9a-f]{4},", self._at_ucast_node_id)
+        self.register_command(
+            "at+ucast", ":[0-9a-f]{2},", self._at_ucast_index)
+
+        self.register_command(
+            "atrems", ":[0-9a-f]{2,16},[0-9a-f]{2,4}\?",
+            self._at_read_remote_sregister)
+
+    def _process_command(self, store_data):
+        """Process a complete AT command and queue its response.
+
+        The command handler is selected by command name and then by the
+        arguments grammar registered with register_command.
+
+        Args:
+            store_data: AT command string without the carriage return
+                terminator.
+        """
+        print store_data
+        store_data_low = store_data.lower()
+
+        response = None
+        handler = self._find_command_handler(store_data_low)
+        if(handler is not None):
+            response = handler(store_data)
+
+        if(response is None):
+            # 02 = Invalid comand
+            response = self.etrx3x_at.error_response("02")
+
+        # Send response to serial port (empty response is sent later by the
+        # command handler)
+        if(response != ""):
+            self.write_serial(response)
+
+    def _get_sregister_bit(self, value, bit_position):
+        # Get bit position from Little Endian
+        return str((int(value, 16) >> bit_position) & 1)
+
+    def _get_address_table_node_id(self, address_table_index):
+        # Raises IndexError for invalid address table index
+        addr = self.local_node.get_address_table()
+        return addr[address_table_index][1]
+
+    def _get_remote_links(self, node_id):
+        # Links of path from local node or None for unreachable node
+        if(node_id is None):
+            return None
+
+        return self.routing_engine.get_path_links(node_id)
+
+    def _get_remote_delay(self, links, payload_size=0):
+        # Delay of delivered message or None for lost message
+        if(links is None):
+            return None
+
+        delivered, transmissions = self.loss_model.send(links)[0]
+        if(delivered is False):
+            return None
+
+        return self.latency_model.get_delay(
+            links, payload_size, transmissions=transmissions)
+
+    def _remote_ntable(self, node_id, index):
+        seq_num = self.get_seq_number()
+        response = self.etrx3x_at.seq_response(seq_num)
+        response += self.etrx3x_at.ok_response()
+
+        delay = self._get_remote_delay(self._get_remote_links(node_id))
+        if(delay is not None):
+            error_code = "00"
+
+            async_response = self.etrx3x_at.at_ntable_response(
+                node_id, error_code, index, self.get_ntable(node_id))
+            async_response += self.etrx3x_at.ack_response(seq_num)
+
+            self.write_async_message(async_response, delay=delay)
+        else:
+            # Remote node not found or message lost
+            async_response = self.etrx3x_at.nack_response(seq_num)
+
+            self.write_async_message(
+                async_response, delay=self.get_local_node_delay())
+
+        return response
+
+    def _remote_unicast(self, node, payload_size=0):
+        seq_num = self.get_seq_number()
+        response = self.etrx3x_at.seq_response(seq_num)
+        response += self.etrx3x_at.ok_response()
+
+        links = None
+        if(node is not None):
+            # Node is reachable only if there is a path from local node
+            links = self._get_remote_links(node.get_node_id())
+
+        if(links is not None):
+            node.set_hops(len(links))
+
+        delay = self._get_remote_delay(links, payload_size)
+        if(delay is not None):
+            # TODO(rubens): forward message to MCU handler
+            # async_response = self.etrx3x_at.ucast_notification()
+            async_response = self.etrx3x_at.ack_response(seq_num)
+
+            self.write_async_message(async_response, delay=delay)
+        else:
+            # Remote node not found or message lost
+            async_response = self.etrx3x_at.nack_response(seq_num)
+
+            self.write_async_message(
+                async_response, delay=self.get_local_node_delay())
 
-    def _write_async_message(self, message, delay):
-        time.sleep(delay)
-        os.write(self.master, message)
+        return response
 
-    def start(self):
+    def _remote_sread(self, node, reg):
+        seq_num = self.get_seq_number()
+        response = self.etrx3x_at.seq_response(seq_num)
+        response += self.etrx3x_at.ok_response()
+
+        delay = None
+        if(node is not None):
+            delay = self._get_remote_delay(
+                self._get_remote_links(node.get_node_id()))
+
+        if(delay is not None):
+            async_response = self.etrx3x_at.ack_response(seq_num)
+
+            node_id = node.get_node_id()
+            node_eui = node.get_node_eui()
+            value = node.get_sregister_value(reg)
+
+            if(value is not None):
+                error_code = "00"
+            else:
+                error_code = "05"
+
+            async_response += self.etrx3x_at.sread_notification(
+                node_id, node_eui, reg, error_code, value=value)
+
+            self.write_async_message(async_response, delay=delay)
+        else:
+            # Remote node not found or message lost
+            async_response = self.etrx3x_at.nack_response(seq_num)
+
+            self.write_async_message(
+                async_response, delay=self.get_local_node_delay())
+
+        return response
+
+    def _parse_ntable_index(self, index):
+        try:
+            return int(index, 16)
+        except ValueError:
+            return -1
+
+    def _at_ok(self, command):
+        return self.etrx3x_at.ok_response()
+
+    def _at_invalid_parameter(self, command):
+        # 05 = invalid_parameter
+        return self.etrx3x_at.error_response("05")
+
+    def _at_info(self, command):
+        response = self.etrx3x_at.ati_response(self.local_node.get_node_eui())
+        response += self.etrx3x_at.ok_response()
+
+        return response
+
+    def _at_tokdump(self, command):
+        local_node_sregs = {}
+        for regs in self.local_node.get_sregisters():
+            local_node_sregs[regs[0]] = regs[1]
+
+        response = self.etrx3x_at.at_tokdump_response(local_node_sregs)
+        response += self.etrx3x_at.ok_response()
+
+        return response
+
+    def _at_address_table(self, command):
+        # Get local pre-configured address table
+        local_atable = []
+        for addr in self.local_node.get_address_table():
+            if(addr[0] is True):
+                active = "Y"
+            else:
+                active = "N"
+
+            addr_entry = {
+                "active": active,
+                "node_id": addr[1],
+                "node_eui": addr[2]
+            }
+            local_atable.append(addr_entry)
+
+        return self.etrx3x_at.at_atable_response(local_atable)
+
+    def _at_read_sregister_bit(self, command):
+        # atsXXP? or atsXXPP? = get local XX sregister with P bit position
+        # value (PP for 32 bits sregisters)
+        reg = command[3:5].upper()
+        bit_pos = command[5:command.index("?")].upper()
+
+        try:
+            reg_prop = self.etrx3x_at.sregister_list_properties[reg]
+        except KeyError as err:
+            print "keyerror: {} - {}".format(reg, err)
+            # 05 = invalid_parameter
+            return self.etrx3x_at.error_response("05")
+
+        reg_value = self.local_node.get_sregister_value(reg)
+        if(reg_value is None):
+            # 05 = invalid_parameter
+            return self.etrx3x_at.error_response("05")
+
+        if(reg_prop["rules"] is None or
+                reg_prop["rules"].get("bit_position") is not True):
+            # return the sregister full content
+            response = self.etrx3x_at.ats_response(reg, reg_value)
+            response += self.etrx3x_at.ok_response()
+            return response
+
+        bit_pos_int = int(bit_pos, 16)
+        if(len(bit_pos) == 2 and
+                (reg_prop["type"] != "hex16" or bit_pos_int > 15)):
+            # 05 = invalid_parameter
+            return self.etrx3x_at.error_response("05")
+
+        value = self._get_sregister_bit(reg_value, bit_pos_int)
+
+        response = self.etrx3x_at.ats_response(reg + bit_pos, value)
+        response += self.etrx3x_at.ok_response()
+
+        return response
+
+    def _at_read_sregister(self, command):
+        # atsXX? = get local s register
+        reg = command[3:5].upper()
+        value = self.local_node.get_sregister_value(reg)
+
+        if(value is not None):
+            response = self.etrx3x_at.ats_response(reg, value)
+            response += self.etrx3x_at.ok_response()
+
+        else:
+            print("local sregisters {} not found".format(reg))
+            # 05 = invalid_parameter
+            response = self.etrx3x_at.error_response("05")
+
+        return response
+
+    def _at_write_sregister(self, command):
+        # atsXX=V* = set local s register
+        reg = command[3:5].upper()
+        new_value = command[6:]
+        try:
+            self.etrx3x_at.validate_sregister_value(reg, new_value)
+
+            set_status = self.local_node.set_sregister_value(reg, new_value)
+
+            if(set_status is True):
+                response = self.etrx3x_at.ok_response()
+            else:
+                response = self.etrx3x_at.error_response("05")
+
+        except ValueError:
+            print(
+                "invalid SRegister value {} for register {}".format(
+                    new_value, reg))
+            # 05 = invalid_parameter
+            response = self.etrx3x_at.error_response("05")
+
+        except KeyError:
+            print("keyerror: {}".format(reg))
+            # 05 = invalid_parameter
+            response = self.etrx3x_at.error_response("05")
+
+        return response
+
+    def _at_network_info(self, command):
+        response = self.etrx3x_at.at_n_response(
+            self.local_node.get_type(),
+            self.local_pan.get_channel(),
+            self.local_pan.get_power(),
+            self.local_pan.get_pan_id(),
+            self.local_pan.get_epan_id()
+        )
+        response += self.etrx3x_at.ok_response()
+
+        return response
+
+    def _at_pan_scan(self, command):
+        response = ""
+        for epanid in self.zb_networks:
+            zbnet = self.zb_networks[epanid].get_local_pan()
+
+            pan_channel = zbnet.get_channel()
+            pan_id = zbnet.get_pan_id()
+            pan_eid = zbnet.get_epan_id()
+            pan_zb_stack = zbnet.get_zb_stack()
+
+            if(zbnet.get_joinable() is True):
+                pan_joinable = "01"
+            else:
+                pan_joinable = "00"
+
+            response += self.etrx3x_at.panscan_notification(
+                pan_channel,
+                pan_id,
+                pan_eid,
+                pan_zb_stack,
+                pan_joinable
+            )
+
+        response += self.etrx3x_at.ok_response()
+
+        return response
+
+    def _at_ntable_eui(self, command):
+        # NTABLE from address in node eui format (16 hexa)
+        params = command.split(":")[1].split(",")
+        index = self._parse_ntable_index(params[0])
+        node_eui = params[1]
+
+        try:
+            self._validate_node_identifier(node_eui)
+
+        except ValueError:
+            # 05 = invalid_parameter
+            return self.etrx3x_at.error_response("05")
+
+        # TODO(rubens): check for address in zigbee.py library file
+        node = self.local_zb_network.get_node_eui(node_eui.upper())
+        if(node is not None):
+            node_id = node.get_node_id()
+        else:
+            node_id = None
+
+        return self._remote_ntable(node_id, index)
+
+    def _at_ntable_node_id(self, command):
+        # NTABLE from address in node id format (4 hexa)
+        params = command.split(":")[1].split(",")
+        index = self._parse_ntable_index(params[0])
+        node_id = params[1]
+
+        try:
+            self._validate_node_identifier(node_id)
+
+        except ValueError:
+            # 05 = invalid_parameter
+            return self.etrx3x_at.error_response("05")
+
+        if(self.local_zb_network.get_node(node_id) is None):
+            node_id = None
+
+        return self._remote_ntable(node_id, index)
+
+    def _at_ntable_index(self, command):
+        # NTABLE from address in ATABLE index format, or FF/ff to local node
+        params = command.split(":")[1].split(",")
+        index = self._parse_ntable_index(params[0])
+
+        try:
+            address_table_index = int(params[1], 16)
+
+            if(address_table_index == 255):
+                # "FF" - local node
+                node_id = self.local_node.get_node_id()
+            else:
+                # Get remote node id
+                node_id = self._get_address_table_node_id(
+                    address_table_index)
+
+                if(node_id == "FFFF"):
+                    return self.etrx3x_at.error_response("01")
+
+                if(self.local_zb_network.get_node(node_id) is None):
+                    node_id = None
+
+        except ValueError:
+            # 05 - Invalid parameter
+            return self.etrx3x_at.error_response("05")
+
+        except IndexError:
+            # 01 - could poll parent (default error for invalid address
+            # table index)
+            return self.etrx3x_at.error_response("01")
+
+        return self._remote_ntable(node_id, index)
+
+    def _at_ucastb_index(self, command):
+        # Send UCAST with binary payload for target node in address table
+        # index format
+        params = command.split(":")[1].split(",")
+
+        table_index = params[0]
+        payload_size_hex = params[1]
+        try:
+            address_table_index = int(table_index, 16)
+            payload_size = int(payload_size_hex, 16)
+
+        except ValueError:
+            # 05 - Invalid parameter
+            return self.etrx3x_at.error_response("05")
+
+        # TODO(rubens): add validation for payload size zero
+
+        self.write_serial(">")
+
+        # TODO(rubens): implement UCAST timeout
+        self._read_serial_binary(
+            payload_size, self._ucastb_payload, address_table_index)
+
+        # Response is sent when binary payload is received
+        return ""
+
+    def _ucastb_payload(self, payload_binary, address_table_index):
+        try:
+            if(address_table_index == 255):
+                # "FF" - local node
+
+                # TODO(rubens): forward message to MCU handler
+                node = self.local_node
+            else:
+                # Get remote node id
+                node_id = self._get_address_table_node_id(
+                    address_table_index)
+
+                if(node_id == "FFFF"):
+                    response = self.etrx3x_at.error_response("01")
+                    self.write_serial(response)
+                    return
+
+                node = self.local_zb_network.get_node(node_id)
+
+        except IndexError:
+            # 01 - could poll parent (default error for invalid address
+            # table index)
+            response = self.etrx3x_at.error_response("01")
+            self.write_serial(response)
+            return
+
+        self.write_serial(
+            self._remote_unicast(node, payload_size=len(payload_binary)))
+
+    def _at_ucast_eui(self, command):
+        # Send UCAST for target node eui address format
+        params = command.split(":")[1].split(",")
+        node_eui = params[0]
+        payload = ",".join(params[1:])
+
+        try:
+            self._validate_node_identifier(node_eui)
+
+        except ValueError:
+            # 05 - Invalid parameter
+            return self.etrx3x_at.error_response("05")
+
+        node = self.local_zb_network.get_node_eui(node_eui)
+
+        return self._remote_unicast(node, payload_size=len(payload))
+
+    def _at_ucast_node_id(self, command):
+        # Send UCAST for target node id address format
+        params = command.split(":")[1].split(",")
+        node_id = params[0]
+        payload = ",".join(params[1:])
+
+        try:
+            self._validate_node_identifier(node_id)
+
+        except ValueError:
+            # 05 - Invalid parameter
+            return self.etrx3x_at.error_response("05")
+
+        node = self.local_zb_network.get_node(node_id)
+
+        return self._remote_unicast(node, payload_size=len(payload))
+
+    def _at_ucast_index(self, command):
+        # Send UCAST for target node in address table index format
+        params = command.split(":")[1].split(",")
+        table_index = params[0]
+        payload = ",".join(params[1:])
+
+        try:
+            address_table_index = int(table_index, 16)
+
+            if(address_table_index == 255):
+                # "FF" - local node
+
+                # TODO(rubens): forward message to MCU handler
+                node = self.local_node
+            else:
+                # Get remote node id
+                node_id = self._get_address_table_node_id(
+                    address_table_index)
+
+                if(node_id == "FFFF"):
+                    return self.etrx3x_at.error_response("01")
+
+                node = self.local_zb_network.get_node(node_id)
+
+        except ValueError:
+            # 05 - Invalid parameter
+            return self.etrx3x_at.error_response("05")
+
+        except IndexError:
+            # 01 - could poll parent (default error for invalid address
+            # table index)
+            return self.etrx3x_at.error_response("01")
+
+        return self._remote_unicast(node, payload_size=len(payload))
+
+    def _at_read_remote_sregister(self, command):
+        # Get remote SRegister from node with address in address table index
+        # (2 hexa), node id (4 hexa) or node EUI (16 hexa) format
+        params = command.split(":")[1].split(",")
+        node_addr = params[0]
+        reg = ",".join(params[1:])[0:-1]
+
+        try:
+            if(len(node_addr) == 2):
+                address_table_index = int(node_addr, 16)
+
+                if(address_table_index == 255):
+                    # "FF" - local node
+                    # Send ATS response
+                    value = self.local_node.get_sregister_value(reg)
+
+                    response = self.etrx3x_at.ats_response(reg, value)
+                    response += self.etrx3x_at.ok_response()
+
+                    return response
+
+                # Get remote node id
+                node_id = self._get_address_table_node_id(
+                    address_table_index)
+
+                if(node_id == "FFFF"):
+                    return self.etrx3x_at.error_response("01")
+
+                node = self.local_zb_network.get_node(node_id)
+
+            elif(len(node_addr) == 4):
+                self._validate_node_identifier(node_addr)
+
+                node = self.local_zb_network.get_node(node_addr)
+
+            elif(len(node_addr) == 16):
+                self._validate_node_identifier(node_addr)
+
+                node = self.local_zb_network.get_node_eui(node_addr)
+
+            else:
+                # 05 - Invalid parameter
+                return self.etrx3x_at.error_response("05")
+
+        except ValueError:
+            # 05 - Invalid parameter
+            return self.etrx3x_at.error_response("05")
+
+        except IndexError:
+            # 01 - could poll parent (default error for invalid address
+            # table index)
+            return self.etrx3x_at.error_response("01")
+
+        return self._remote_sread(node, reg)
+
+    def open_serial(self):
+        """Open simulator serial port (pty).
+
+        Returns:
+            Name of the slave serial port used by the host.
+        """
         self.master, self.slave = pty.openpty()
 
         slave_name = os.ttyname(self.slave)
@@ -292,1018 +1460,128 @@ class ETRX3xSimulator(object):
         print("Slave : {}".format(slave_name))
         print("Master: {}".format(master_name))
 
+        return slave_name
+
+    def attach(self, loop):
+        """Attach simulator serial port to an event loop.
+
+        Serial input, serial output and delayed responses are handled by the
+        loop thread. The serial port must be opened with open_serial.
+
+        Args:
+            loop: ETRX3xEventLoop object.
+        """
+        self.loop = loop
+
+        # Events scheduled before attach (such as traffic generator events)
+        # are run by the loop
+        self.scheduler.transfer(loop.scheduler)
+        self.scheduler = loop.scheduler
+
+        fcntl.fcntl(
+            self.master, fcntl.F_SETFL,
+            fcntl.fcntl(self.master, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+        loop.add_reader(self.master, self._read_ready)
+
+    def close_serial(self):
+        """Close simulator serial port of event loop mode.
+
+        Pending delayed responses of the closed serial port are discarded.
+        """
+        if(self.master is None):
+            return
+
+        if(self.loop is not None):
+            self.loop.remove_reader(self.master)
+            self.loop.remove_writer(self.master)
+
+        os.close(self.master)
+        if(self.slave is not None):
+            os.close(self.slave)
+
+        self.master = None
+        self.slave = None
+        self.output_buffer = []
+        self.write_queue.clear()
+        self.write_pending = False
+        self.input_paused = False
+        self.main_loop = False
+
+    def close(self):
+        """Release simulator of event loop mode.
+
+        Serial port is closed and the routing engine created by this
+        simulator stops following the network links (an engine shared by
+        add_local_module is kept by its owner).
+        """
+        self.close_serial()
+
+        if(self.routing_engine_owner is True):
+            self.routing_engine.close()
+            self.routing_engine_owner = False
+
+    def start_session(self, loop, fd=None):
+        """Start simulator in an event loop without running it.
+
+        Args:
+            loop: ETRX3xEventLoop object.
+            fd: file descriptor used as serial port, such as a connected
+                socket (None opens a pty).
+        """
+        if(fd is not None):
+            self.master = fd
+
+        self._prepare_start()
+        self.attach(loop)
+
+    def _prepare_start(self):
+        # Serial port can be opened before start (see ETRX3xForkServer)
+        if(self.master is None):
+            self.open_serial()
+
+        self.input_buffer = ""
+        self.store_data = ""
+
         self.main_loop = True
 
+    def start(self, event_loop=False, virtual_clock=False):
+        """Start simulator.
+
+        Args:
+            event_loop: True to run simulator in a single thread event loop
+                or False to use serial reader, serial writer and scheduler
+                threads.
+            virtual_clock: True to run event loop with a virtual clock (see
+                run_simulators). It requires event_loop.
+
+        Raises:
+            ValueError if virtual clock is used without event loop.
+        """
+        if(virtual_clock is True and event_loop is False):
+            raise ValueError("virtual clock requires event loop")
+
+        if(event_loop is True):
+            run_simulators([self], virtual_clock=virtual_clock)
+            return
+
+        self._prepare_start()
+
         print("Starting write thread queue")
         self.write_thread = threading.Thread(
             target=self._write_thread_function, args=())
         self.write_thread.setDaemon(True)
         self.write_thread.start()
 
-        store_data = ""
-        command_list = []
+        print("Starting scheduler thread")
+        self.scheduler.start()
 
         while self.main_loop is True:
             try:
-                data = os.read(self.master, 1)
-
-                if(self.echo_enabled is True):
-                    os.write(self.master, data)
-
-                if(store_data.lower() == "" and (data == "a" or data == "A")):
-                    store_data = data
-
-                elif((store_data.lower() == "a") or
-                        (store_data.lower() == "A")):
-                    if((data == "t") or (data == "T")):
-                        store_data += data
-                    else:
-                        # Clear stored data for invalid char
-                        store_data = ""
-
-                elif(store_data.lower() == "at"):
-                    if(data == "+"):
-                        store_data += data
-                    elif((data == "i") or (data == "I")):
-                        store_data += data
-                    elif((data == "n") or (data == "N")):
-                        store_data += data
-                    elif((data == "s") or (data == "S")):
-                        store_data += data
-                    elif((data == "r") or (data == "R")):
-                        store_data += data
-                    elif((data == "z") or (data == "Z")):
-                        store_data += data
-                    # elif(data == "b"):
-                    #     store_data += data
-                    elif(data == "\r"):
-                        response = self.etrx3x_at.ok_response()
-                        os.write(self.master, response)
-                        store_data = ""
-                    else:
-                        # Clear stored data for invalid char
-                        store_data = ""
-
-                elif(len(store_data) >= 3):
-                    if(data == "\r"):
-                        print store_data
-                        store_data_low = store_data.lower()
-
-                        if(store_data_low == "ati"):
-                            response = self.etrx3x_at.ati_response(
-                                self.local_node.get_node_eui())
-                            response += self.etrx3x_at.ok_response()
-
-                        elif(store_data_low == "ats"):
-                            # return error message
-                            # 05 = invalid_parameter
-                            response = self.etrx3x_at.error_response("05")
-
-                        elif(store_data_low == "atz"):
-                            # TODO(rubens): check if it was connected to local
-                            # pan to notify "JPAN" message
-                            response = self.etrx3x_at.ok_response()
-
-                        elif(store_data_low == "at+tokdump"):
-                            local_node_sregs = {}
-                            for regs in self.local_node.get_sregisters():
-                                local_node_sregs[regs[0]] = regs[1]
-
-                            response = self.etrx3x_at.at_tokdump_response(
-                                local_node_sregs)
-                            response += self.etrx3x_at.ok_response()
-
-                            store_data = ""
-
-                        elif(re.match("at\+atable", store_data_low)):
-                            # Get local pre-configured address table
-                            local_atable = []
-                            for addr in self.local_node.get_address_table():
-                                if(addr[0] is True):
-                                    active = "Y"
-                                else:
-                                    active = "N"
-
-                                addr_entry = {
-                                    "active": active,
-                                    "node_id": addr[1],
-                                    "node_eui": addr[2]
-                                }
-                                local_atable.append(addr_entry)
-
-                            response = self.etrx3x_at.at_atable_response(
-                                local_atable)
-
-                        elif(re.match("ats[0-9a-f]{4}\?", store_data_low)):
-                            # atsXXPP = get local XX sregister with P bit
-                            # position value for 32 bits sregisters
-                            reg = store_data[3:5].upper()
-                            bit_pos = store_data[5:7].upper()
-                            try:
-                                reg_prop = \
-                                    self.etrx3x_at.\
-                                    sregister_list_properties[reg]
-
-                                if("bit_position" in reg_prop["rules"] and
-                                        reg_prop["rules"]["bit_position"] is
-                                        True):
-                                    # return bit position value
-                                    reg_value = self.local_node.\
-                                        get_sregister_value(reg)
-                                    bit_pos_int = int(bit_pos, 16)
-
-                                    if(reg_value is not None):
-
-                                        if(reg_prop["type"] == "hex16"):
-                                            if(bit_pos_int > 15):
-                                                # 05 = invalid_parameter
-                                                response = self.etrx3x_at.\
-                                                    error_response("05")
-
-                                            else:
-                                                # Get bit position from Little
-                                                # Endian
-                                                value = bin(int(
-                                                    reg_value, 16))[2:][
-                                                        (bit_pos_int * -1) - 1]
-
-                                                response = self.etrx3x_at.\
-                                                    ats_response(
-                                                        reg + bit_pos, value)
-                                                response += self.etrx3x_at.\
-                                                    ok_response()
-                                        else:
-                                            # 05 = invalid_parameter
-                                            response = self.etrx3x_at.\
-                                                error_response("05")
-
-                                    else:
-                                        # Get bit position from Little Endian
-                                        value = bin(int(
-                                            reg_value, 16))[2:][
-                                                (bit_pos_int * -1) - 1]
-
-                                        response = self.etrx3x_at.ats_response(
-                                            reg + bit_pos, value)
-                                        response += \
-                                            self.etrx3x_at.ok_response()
-
-                                else:
-                                    # return the sregister full content
-                                    response = self.etrx3x_at.ats_response(
-                                        reg, value)
-                                    response += self.etrx3x_at.ok_response()
-
-                            except KeyError as err:
-                                print "keyerror: {} - {}".format(reg, err)
-                                # 05 = invalid_parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match("ats[0-9a-f]{3}\?", store_data_low)):
-                            # atsXXP = get local XX sregister with P bit
-                            # position value
-                            reg = store_data[3:5].upper()
-                            bit_pos = store_data[5].upper()
-
-                            try:
-                                reg_prop = self.etrx3x_at.\
-                                    sregister_list_properties[reg]
-
-                                if(reg_prop["rules"] is not None and
-                                        "bit_position" in reg_prop["rules"] and
-                                        reg_prop["rules"]["bit_position"] is
-                                        True):
-                                    # return bit position value
-                                    reg_value = self.local_node.\
-                                        get_sregister_value(reg)
-
-                                    if(reg_value is not None):
-                                        bit_pos_int = int(bit_pos, 16)
-
-                                        # Get bit position from Little Endian
-                                        value = bin(int(
-                                            reg_value, 16))[2:][(
-                                                bit_pos_int * -1) - 1]
-
-                                        response = self.etrx3x_at.ats_response(
-                                            reg + bit_pos, value)
-                                        response += self.etrx3x_at.\
-                                            ok_response()
-                                    else:
-                                        # 05 = invalid_parameter
-                                        response = self.etrx3x_at.\
-                                            error_response("05")
-
-                                else:
-                                    # return the sregister full content
-                                    response = self.etrx3x_at.ats_response(
-                                        reg, value)
-                                    response += self.etrx3x_at.ok_response()
-
-                            except KeyError as err:
-                                print "keyerror: {} - {}".format(reg, err)
-                                # 05 = invalid_parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match("ats[0-9a-f]{2}\?", store_data_low)):
-                            # atsXX = get local s register
-                            reg = store_data[3:5].upper()
-                            value = self.local_node.get_sregister_value(reg)
-
-                            if(value is not None):
-                                response = self.etrx3x_at.ats_response(
-                                    reg, value)
-                                response += self.etrx3x_at.ok_response()
-
-                            else:
-                                print("local sregisters {} not found".format(
-                                    reg))
-                                # 05 = invalid_parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match(
-                                "ats[0-9a-f]{2}=[0-9a-z]*", store_data_low)):
-                            # atsXX=V* = set local s register
-                            reg = store_data[3:5].upper()
-                            new_value = store_data[6:]
-                            try:
-                                self.etrx3x_at.validate_sregister_value(
-                                    reg, new_value)
-
-                                set_status = self.local_node.\
-                                    set_sregister_value(
-                                        reg, new_value)
-
-                                if(set_status is not None):
-                                    response = self.etrx3x_at.ok_response()
-                                else:
-                                    response = self.etrx3x_at.error_response(
-                                        "05")
-
-                            except ValueError:
-                                print(
-                                    "invalid SRegister value {} for register "
-                                    "{}".format(new_value, reg))
-                                # 05 = invalid_parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                            except KeyError:
-                                print("keyerror: {}".format(reg))
-                                # 05 = invalid_parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match("ats[0-9a-f]", store_data_low)):
-                            # 05 = invalid_parameter
-                            response = self.etrx3x_at.error_response("05")
-
-                        # REMOTE COMMANDS - SHOULD INCLUDE SEQ-ACK
-                        elif(re.match(
-                                "at\+ntable:[0-9a-f]{2},[0-9a-f]{16}",
-                                store_data_low)):
-                            # NTABLE from address in node eui format (16 hexa)
-                            params = store_data.split(":")[1].split(",")
-                            try:
-                                index = int(params[0], 16)
-
-                            except ValueError:
-                                index = -1
-
-                            node_eui = params[1]
-                            try:
-                                self._validate_node_identifier(node_eui)
-
-                                # TODO(rubens): check for address in zigbee.py
-                                # library file
-                                node = self.local_zb_network.get_node_eui(
-                                    node_eui.upper())
-
-                                if(node is not None):
-                                    # "FF" - local node
-                                    seq_num = self.get_seq_number()
-                                    response = self.etrx3x_at.seq_response(
-                                        seq_num)
-                                    response += self.etrx3x_at.ok_response()
-
-                                    node_id = node.get_node_id()
-                                    error_code = "00"
-
-                                    async_response = self.etrx3x_at.\
-                                        at_ntable_response(
-                                            node_id, error_code,
-                                            index, self.get_ntable(
-                                                node_id))
-                                    async_response += self.etrx3x_at.\
-                                        ack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=0.1)
-                                else:
-                                    # Remote
-                                    seq_num = self.get_seq_number()
-                                    response = self.etrx3x_at.seq_response(
-                                        seq_num)
-                                    response += \
-                                        self.etrx3x_at.ok_response()
-
-                                    async_response = self.etrx3x_at.\
-                                        nack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=self.get_local_node_delay())
-
-                            except ValueError:
-                                # 05 = invalid_parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match(
-                                "at\+ntable:[0-9a-f]{2},[0-9a-f]{4}",
-                                store_data_low)):
-                            # NTABLE from address in node id format (4 hexa)
-                            params = store_data.split(":")[1].split(",")
-                            try:
-                                index = int(params[0], 16)
-
-                            except ValueError:
-                                index = -1
-
-                            node_id = params[1]
-                            try:
-                                self._validate_node_identifier(node_id)
-
-                                node = self.local_zb_network.get_node(node_id)
-                                if(node is not None):
-                                    # "FF" - local node
-                                    seq_num = self.get_seq_number()
-                                    response = self.etrx3x_at.seq_response(
-                                        seq_num)
-                                    response += self.etrx3x_at.ok_response()
-
-                                    error_code = "00"
-
-                                    async_response = self.etrx3x_at.\
-                                        at_ntable_response(
-                                            node_id, error_code,
-                                            index, self.get_ntable(
-                                                node_id))
-                                    async_response += self.etrx3x_at.\
-                                        ack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=0.1)
-                                else:
-                                    # Remote
-                                    seq_num = self.get_seq_number()
-                                    response = self.etrx3x_at.seq_response(
-                                        seq_num)
-                                    response += \
-                                        self.etrx3x_at.ok_response()
-
-                                    async_response = self.etrx3x_at.\
-                                        nack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=self.get_local_node_delay())
-
-                            except ValueError:
-                                # 05 = invalid_parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match(
-                                "at\+ntable:[0-9a-f]{2},[0-9a-f]{2}",
-                                store_data_low)):
-                            # NTABLE from address in ATABLE index format,
-                            # or FF/ff to local node
-                            params = store_data.split(":")[1].split(",")
-                            try:
-                                index = int(params[0], 16)
-
-                            except ValueError:
-                                index = -1
-
-                            try:
-                                address_table_index = int(params[1], 16)
-
-                                if(address_table_index == 255):
-                                    # "FF" - local node
-                                    seq_num = self.get_seq_number()
-                                    response = self.etrx3x_at.seq_response(
-                                        seq_num)
-                                    response += self.etrx3x_at.ok_response()
-
-                                    error_code = "00"
-
-                                    node_id = self.local_node.get_node_id()
-
-                                    async_response = self.etrx3x_at.\
-                                        at_ntable_response(
-                                            node_id, error_code,
-                                            index, self.get_ntable(node_id))
-
-                                    async_response += self.etrx3x_at.\
-                                        ack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=0.1)
-                                else:
-                                    # Remote node
-
-                                    # Get remote node id
-                                    addr = self.local_node.get_address_table()
-                                    node_id = addr[address_table_index][1]
-
-                                    if(node_id == "FFFF"):
-                                        response = self.etrx3x_at.\
-                                            error_response("01")
-                                    else:
-                                        seq_num = self.get_seq_number()
-                                        response = self.etrx3x_at.seq_response(
-                                            seq_num)
-                                        response += \
-                                            self.etrx3x_at.ok_response()
-
-                                        node = self.local_zb_network.get_node(
-                                            node_id)
-                                        if(node is not None):
-                                            # "FF" - local node
-                                            error_code = "00"
-
-                                            async_response = self.etrx3x_at.\
-                                                at_ntable_response(
-                                                    node_id, error_code,
-                                                    index, self.get_ntable(
-                                                        node_id))
-
-                                            async_response += self.etrx3x_at.\
-                                                ack_response(seq_num)
-
-                                            self.write_async_message(
-                                                async_response,
-                                                delay=0.1)
-                                        else:
-                                            # Remote
-                                            seq_num = self.get_seq_number()
-                                            response = self.etrx3x_at.\
-                                                seq_response(seq_num)
-                                            response += \
-                                                self.etrx3x_at.ok_response()
-
-                                            async_response = self.etrx3x_at.\
-                                                nack_response(seq_num)
-
-                                            self.write_async_message(
-                                                async_response,
-                                                delay=self.
-                                                get_local_node_delay())
-
-                            except ValueError:
-                                # 05 - Invalid parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                            except IndexError:
-                                # 01 - could poll parent (default error for
-                                # invalid address trable index)
-                                response = self.etrx3x_at.error_response("01")
-
-                        elif(re.match("at\+n[\0-\xFF]*", store_data_low)):
-                            response = response = self.etrx3x_at.at_n_response(
-                                self.local_node.get_type(),
-                                self.local_pan.get_channel(),
-                                self.local_pan.get_power(),
-                                self.local_pan.get_pan_id(),
-                                self.local_pan.get_epan_id()
-                            )
-                            response += self.etrx3x_at.ok_response()
-
-                        elif(re.match(
-                                "at\+panscan[\0-\xFF]*", store_data_low)):
-                            response = ""
-                            for epanid in self.zb_networks:
-                                zbnet = self.zb_networks[epanid].\
-                                    get_local_pan()
-
-                                pan_channel = zbnet.get_channel()
-                                pan_id = zbnet.get_pan_id()
-                                pan_eid = zbnet.get_epan_id()
-                                pan_zb_stack = zbnet.get_zb_stack()
-
-                                if(zbnet.get_joinable() is True):
-                                    pan_joinable = "01"
-                                else:
-                                    pan_joinable = "00"
-
-                                response += self.etrx3x_at.\
-                                    panscan_notification(
-                                        pan_channel,
-                                        pan_id,
-                                        pan_eid,
-                                        pan_zb_stack,
-                                        pan_joinable
-                                    )
-
-                            response += self.etrx3x_at.ok_response()
-
-                        elif(re.match(
-                                "at\+ucastb:[0-9a-f]{2},[0-9a-f]{16}",
-                                store_data_low)):
-                            # Send UCAST with binary payloa for target node
-                            # eui address format
-                            # 05 = invalid_parameter
-                            response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match(
-                                "at\+ucastb:[0-9a-f]{2},[0-9a-f]{4}",
-                                store_data_low)):
-                            # Send UCAST with binary payload for target node
-                            # id address format
-                            # 05 = invalid_parameter
-                            response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match(
-                                "at\+ucastb:[0-9a-f]{2},[0-9a-f]{2}",
-                                store_data_low)):
-                            # Send UCAST with binary payload for target node
-                            # in address table index format
-                            params = store_data.split(":")[1].split(",")
-
-                            table_index = params[0]
-                            payload_size_hex = params[1]
-                            try:
-                                address_table_index = int(table_index, 16)
-                                payload_size = int(payload_size_hex, 16)
-
-                                # TODO(rubens): add validation for payload size
-                                # zero
-
-                                self.write_serial(">")
-
-                                payload_binary = ""
-                                while (len(payload_binary) < payload_size):
-                                    input_binary = os.read(self.master, 1)
-                                    payload_binary += input_binary
-
-                                    # TODO(rubens): implement UCAST timeout
-
-                                seq_num = self.get_seq_number()
-                                response = self.etrx3x_at.seq_response(
-                                    seq_num)
-                                response += self.etrx3x_at.ok_response()
-
-                                if(address_table_index == 255):
-                                    # "FF" - local node
-
-                                    # TODO(rubens): forward message to MCU
-                                    # handler
-
-                                    async_response = self.etrx3x_at.\
-                                        ack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=0.1)
-                                else:
-                                    # Remote node
-
-                                    # Get remote node id
-                                    addr = self.local_node.get_address_table()
-                                    node_id = addr[address_table_index][1]
-
-                                    if(node_id == "FFFF"):
-                                        response = self.etrx3x_at.\
-                                            error_response("01")
-                                    else:
-                                        seq_num = self.get_seq_number()
-                                        response = self.etrx3x_at.seq_response(
-                                            seq_num)
-                                        response += \
-                                            self.etrx3x_at.ok_response()
-
-                                        node = self.local_zb_network.get_node(
-                                            node_id)
-
-                                        if(node is not None):
-                                            # TODO(rubens): forward message to
-                                            # MCU handler
-                                            # async_response = self.etrx3x_at.\
-                                            #     ucast_notification()
-
-                                            async_response = self.etrx3x_at.\
-                                                ack_response(seq_num)
-
-                                            self.write_async_message(
-                                                async_response,
-                                                delay=0.1)
-                                        else:
-                                            # Remote node not found
-                                            async_response = self.etrx3x_at.\
-                                                nack_response(seq_num)
-
-                                            self.write_async_message(
-                                                async_response,
-                                                delay=self.
-                                                get_local_node_delay())
-
-                            except ValueError:
-                                # 05 - Invalid parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                            except IndexError:
-                                # 01 - could poll parent (default error for
-                                # invalid address trable index)
-                                response = self.etrx3x_at.error_response("01")
-
-                        elif(re.match(
-                                "at\+ucast:[0-9a-f]{16},[\0-\xFF]*",
-                                store_data_low)):
-                            # Send UCAST for target node eui address format
-                            # Send UCAST for target node id address format
-                            params = store_data.split(":")[1].split(",")
-
-                            node_eui = params[0]
-                            payload = ",".join(params[1:])
-                            try:
-                                self._validate_node_identifier(node_eui)
-
-                                seq_num = self.get_seq_number()
-                                response = self.etrx3x_at.seq_response(
-                                    seq_num)
-                                response += \
-                                    self.etrx3x_at.ok_response()
-
-                                node = self.local_zb_network.get_node_eui(
-                                    node_eui)
-
-                                if(node is not None):
-                                    # "FF" - local node
-                                    error_code = "00"
-
-                                    # TODO(rubens): forward message to
-                                    # MCU handler
-                                    # async_response = self.etrx3x_at.\
-                                    #     ucast_notification()
-
-                                    async_response = self.etrx3x_at.\
-                                        ack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=0.1)
-                                else:
-                                    # Remote
-                                    async_response = self.etrx3x_at.\
-                                        nack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=self.
-                                        get_local_node_delay())
-
-                            except ValueError:
-                                # 05 - Invalid parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match(
-                                "at\+ucast:[0-9a-f]{4},[\0-\xFF]*",
-                                store_data_low)):
-                            # Send UCAST for target node id address format
-                            params = store_data.split(":")[1].split(",")
-
-                            try:
-                                # Validate node_id parameter
-                                node_id = params[0]
-                                payload = ",".join(params[1:])
-
-                                self._validate_node_identifier(node_id)
-
-                                seq_num = self.get_seq_number()
-                                response = self.etrx3x_at.seq_response(
-                                    seq_num)
-                                response += \
-                                    self.etrx3x_at.ok_response()
-
-                                node = self.local_zb_network.get_node(
-                                    node_id)
-
-                                if(node is not None):
-                                    # TODO(rubens): forward message to
-                                    # MCU handler
-                                    # async_response = self.etrx3x_at.\
-                                    #     ucast_notification()
-
-                                    async_response = self.etrx3x_at.\
-                                        ack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=0.1)
-                                else:
-                                    # Remote
-                                    async_response = self.etrx3x_at.\
-                                        nack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=self.
-                                        get_local_node_delay())
-
-                            except ValueError:
-                                # 05 - Invalid parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                        elif(re.match(
-                                "at\+ucast:[0-9a-f]{2},[\0-\xFF]*",
-                                store_data_low)):
-                            # Send UCAST for target node in address table index
-                            # format
-                            params = store_data.split(":")[1].split(",")
-                            table_index = params[0]
-                            payload = ",".join(params[1:])
-
-                            try:
-                                address_table_index = int(table_index, 16)
-
-                                seq_num = self.get_seq_number()
-                                response = self.etrx3x_at.seq_response(
-                                    seq_num)
-                                response += self.etrx3x_at.ok_response()
-
-                                if(address_table_index == 255):
-                                    # "FF" - local node
-
-                                    # TODO(rubens): forward message to MCU
-                                    # handler
-
-                                    async_response = self.etrx3x_at.\
-                                        ack_response(seq_num)
-
-                                    self.write_async_message(
-                                        async_response,
-                                        delay=0.1)
-                                else:
-                                    # Remote node
-
-                                    # Get remote node id
-                                    addr = self.local_node.get_address_table()
-                                    node_id = addr[address_table_index][1]
-
-                                    if(node_id == "FFFF"):
-                                        response = self.etrx3x_at.\
-                                            error_response("01")
-                                    else:
-                                        seq_num = self.get_seq_number()
-                                        response = self.etrx3x_at.seq_response(
-                                            seq_num)
-                                        response += \
-                                            self.etrx3x_at.ok_response()
-
-                                        node = self.local_zb_network.get_node(
-                                            node_id)
-
-                                        if(node is not None):
-                                            # TODO(rubens): forward message to
-                                            # MCU handler
-                                            # async_response = self.etrx3x_at.\
-                                            #     ucast_notification()
-
-                                            async_response = self.etrx3x_at.\
-                                                ack_response(seq_num)
-
-                                            self.write_async_message(
-                                                async_response,
-                                                delay=0.1)
-                                        else:
-                                            # Remote node not found
-                                            async_response = self.etrx3x_at.\
-                                                nack_response(seq_num)
-
-                                            self.write_async_message(
-                                                async_response,
-                                                delay=self.
-                                                get_local_node_delay())
-
-                            except ValueError:
-                                # 05 - Invalid parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                            except IndexError:
-                                # 01 - could poll parent (default error for
-                                # invalid address trable index)
-                                response = self.etrx3x_at.error_response("01")
-
-                        elif(re.match(
-                                "atrems:[0-9a-f]{2,16},[0-9a-f]{2,4}\?",
-                                store_data_low)):
-                            # Get remote SRegister from node with address in
-                            # address index format format (2 hexa)
-                            params = store_data.split(":")[1].split(",")
-                            node_addr = params[0]
-                            reg = ",".join(params[1:])[0:-1]
-
-                            # Set default success response
-                            seq_num = self.get_seq_number()
-                            response = self.etrx3x_at.seq_response(seq_num)
-                            response += self.etrx3x_at.ok_response()
-
-                            try:
-                                if(len(node_addr) == 2):
-                                    address_table_index = int(node_addr, 16)
-
-                                    if(address_table_index == 255):
-                                        # "FF" - local node
-                                        # Send ATS response
-
-                                        value = self.local_node.\
-                                            get_sregister_value(reg)
-
-                                        response = self.etrx3x_at.ats_response(
-                                            reg, value)
-                                        response += self.etrx3x_at.\
-                                            ok_response()
-
-                                    else:
-                                        # Remote node
-
-                                        # Get remote node id
-                                        addr = self.local_node.\
-                                            get_address_table()
-                                        node_id = addr[address_table_index][1]
-
-                                        if(node_id == "FFFF"):
-                                            response = self.etrx3x_at.\
-                                                error_response("01")
-                                        else:
-
-                                            node = self.local_zb_network.\
-                                                get_node(node_id)
-
-                                            if(node is not None):
-                                                async_response = self.\
-                                                    etrx3x_at.ack_response(
-                                                        seq_num)
-
-                                                node_id = node.get_node_id()
-                                                node_eui = node.get_node_eui()
-                                                value = node.\
-                                                    get_sregister_value(
-                                                        reg)
-
-                                                if(value is not None):
-                                                    error_code = "00"
-                                                else:
-                                                    error_code = "05"
-
-                                                async_response += self.\
-                                                    etrx3x_at.\
-                                                    sread_notification(
-                                                        node_id, node_eui,
-                                                        reg, error_code,
-                                                        value=value)
-
-                                                self.write_async_message(
-                                                    async_response,
-                                                    delay=0.1)
-                                            else:
-                                                # Remote node not found
-                                                async_response = self.\
-                                                    etrx3x_at.\
-                                                    nack_response(seq_num)
-
-                                                self.write_async_message(
-                                                    async_response,
-                                                    delay=self.
-                                                    get_local_node_delay())
-
-                                elif(len(node_addr) == 4):
-                                    self._validate_node_identifier(node_addr)
-
-                                    node = self.local_zb_network.get_node(
-                                        node_addr)
-
-                                    if(node is not None):
-                                        async_response = self.\
-                                            etrx3x_at.ack_response(
-                                                seq_num)
-
-                                        node_id = node.get_node_id()
-                                        node_eui = node.get_node_eui()
-                                        value = node.\
-                                            get_sregister_value(
-                                                reg)
-
-                                        if(value is not None):
-                                            error_code = "00"
-                                        else:
-                                            error_code = "05"
-
-                                        async_response += self.\
-                                            etrx3x_at.\
-                                            sread_notification(
-                                                node_id, node_eui,
-                                                reg, error_code,
-                                                value=value)
-
-                                        self.write_async_message(
-                                            async_response,
-                                            delay=0.1)
-                                    else:
-                                        # Remote node not found
-                                        async_response = self.\
-                                            etrx3x_at.\
-                                            nack_response(seq_num)
-
-                                        self.write_async_message(
-                                            async_response,
-                                            delay=self.
-                                            get_local_node_delay())
-
-                                elif(len(node_addr) == 16):
-                                    self._validate_node_identifier(node_addr)
-
-                                    node = self.local_zb_network.get_node_eui(
-                                        node_addr)
-
-                                    if(node is not None):
-                                        async_response = self.\
-                                            etrx3x_at.ack_response(
-                                                seq_num)
-
-                                        node_id = node.get_node_id()
-                                        node_eui = node.get_node_eui()
-                                        value = node.\
-                                            get_sregister_value(
-                                                reg)
-
-                                        print node_id, node_eui, reg, value
-
-                                        if(value is not None):
-                                            error_code = "00"
-                                        else:
-                                            error_code = "05"
-
-                                        async_response += self.\
-                                            etrx3x_at.\
-                                            sread_notification(
-                                                node_id, node_eui,
-                                                reg, error_code,
-                                                value=value)
-
-                                        self.write_async_message(
-                                            async_response,
-                                            delay=0.1)
-                                    else:
-                                        # Remote node not found
-                                        async_response = self.\
-                                            etrx3x_at.\
-                                            nack_response(seq_num)
-
-                                        self.write_async_message(
-                                            async_response,
-                                            delay=self.
-                                            get_local_node_delay())
-
-                                else:
-                                    # 05 - Invalid parameter
-                                    response = self.etrx3x_at.error_response(
-                                        "05")
-
-                            except ValueError:
-                                # 05 - Invalid parameter
-                                response = self.etrx3x_at.error_response("05")
-
-                            except IndexError:
-                                # 01 - could poll parent (default error for
-                                # invalid address trable index)
-                                response = self.etrx3x_at.error_response("01")
-
-                        else:
-                            # 02 = Invalid comand
-                            response = self.etrx3x_at.error_response("02")
-
-                        # Send response to serial port
-                        self.write_serial(response)
-
-                        # Clear stored data command
-                        store_data = ""
-
-                    else:
-                        # NOTE(rubens): simulate input serial buffer limit of
-                        # ETRX3x R309 module
-                        if(len(store_data) >= self.serial_input_limit):
-                            # 0C = Too many characters
-                            response = self.etrx3x_at.error_response("0C")
-                            self.write_serial(response)
-
-                            store_data = ""
-                        else:
-                            store_data += data
+                data = os.read(self.master, self.serial_read_size)
+                self.input_buffer += data
 
-                else:
-                    # Clear stored data for invalid char
-                    store_data = ""
+                self._process_input()
 
             except KeyboardInterrupt:
                 self.stop()
@@ -1311,8 +1589,146 @@ class ETRX3xSimulator(object):
     def stop(self):
         self.main_loop = False
 
+        if(self.loop is not None):
+            self.loop.stop()
+            return
+
+        # Closed queue releases the scheduler events waiting for output
+        # space, so both threads finish before the interpreter shutdown
+        self.write_queue.close()
+        self.scheduler.stop()
+
+        # Writer blocked by a host that does not read the serial port is
+        # abandoned after write_stop_timeout seconds
+        if(self.write_thread is not None and
+                self.write_thread is not threading.current_thread()):
+            self.write_thread.join(self.write_stop_timeout)
+
+
+def run_simulators(simulators, transports=(), virtual_clock=False):
+    """Run simulators in a single thread event loop.
+
+    Each simulator has its own serial port and all serial ports are
+    multiplexed by the same loop, so simulators created with
+    add_local_module can share the networks.
+
+    Args:
+        simulators: list of ETRX3xSimulator objects (not started) reached
+            by pty.
+        transports: list of other transports (such as ETRX3xTCPTransport
+            and ETRX3xUnixTransport objects).
+        virtual_clock: True to use a virtual clock: when the hosts are idle
+            the clock jumps to the next delayed response, so delays (and
+            ZigBee model timestamps) take no real time.
+    """
+    if(virtual_clock is True):
+        loop = ETRX3xEventLoop(clock=ETRX3xVirtualClock())
+        set_clock(loop.time)
+    else:
+        loop = ETRX3xEventLoop()
+
+    transports = [ETRX3xPtyTransport(simulator) for simulator in simulators] \
+        + list(transports)
+    for transport in transports:
+        transport.start(loop)
+
+    print("Starting event loop")
+
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        loop.stop()
+    finally:
+        for transport in transports:
+            transport.stop()
+
+        set_clock(None)
+
 
 def main():
+    parser = argparse.ArgumentParser(
+        description="Telegesis ETRX3x Network Simulator")
+    parser.add_argument(
+        "--event-loop", action="store_true",
+        help="run simulator in a single thread event loop")
+    parser.add_argument(
+        "--virtual-clock", action="store_true",
+        help="run event loop with a virtual clock that jumps to the next "
+        "delayed event when there is no serial input or output (implies "
+        "--event-loop)")
+    parser.add_argument(
+        "--seed", type=int, default=None,
+        help="random seed of remote node response delays and losses")
+    parser.add_argument(
+        "--jitter", type=float, default=0.005,
+        help="maximum random delay per hop in seconds (default: 0.005)")
+    parser.add_argument(
+        "--topology", choices=TOPOLOGIES, default=None,
+        help="generate a network with the topology instead of the default "
+        "two nodes network")
+    parser.add_argument(
+        "--nodes", type=int, default=1000,
+        help="amount of nodes of generated network (default: 1000). "
+        "Networks with more than 65528 nodes are split in several PANs")
+    parser.add_argument(
+        "--save-topology", metavar="FILE", default=None,
+        help="save generated network in JSON topology file")
+    parser.add_argument(
+        "-f", "--topology-file", metavar="FILE", default=None,
+        help="load network from JSON topology file. The local node is the "
+        "coordinator of the first PAN")
+    parser.add_argument(
+        "--snapshot", metavar="FILE", default=None,
+        help="load networks from binary snapshot file")
+    parser.add_argument(
+        "--save-snapshot", metavar="FILE", default=None,
+        help="save loaded networks in binary snapshot file")
+    parser.add_argument(
+        "--fork-server", metavar="SOCKET", default=None,
+        help="load networks once and start a simulator with its own serial "
+        "port for each request of Unix socket")
+    parser.add_argument(
+        "--local-node", metavar="EUI", action="append", default=[],
+        help="simulate other local module with the node EUI, with its own "
+        "serial port and sharing the networks (can be repeated, implies "
+        "--event-loop)")
+    parser.add_argument(
+        "--tcp", metavar="HOST:PORT", action="append", default=[],
+        help="accept module sessions of local node on TCP address (can be "
+        "repeated, implies --event-loop)")
+    parser.add_argument(
+        "--unix", metavar="PATH", action="append", default=[],
+        help="accept module sessions of local node on Unix socket (can be "
+        "repeated, implies --event-loop)")
+    parser.add_argument(
+        "--output-queue-size", type=int, default=0,
+        help="maximum serial output messages queued while the host does "
+        "not read the serial port (default: 0, unbounded)")
+    parser.add_argument(
+        "--output-policy", choices=OUTPUT_POLICIES, default="block",
+        help="policy of full output queue: block producers, drop oldest "
+        "messages or send ERROR:18 (default: block)")
+    parser.add_argument(
+        "--traffic", choices=TRAFFIC_DISTRIBUTIONS, default=None,
+        help="send unsolicited messages of all remote nodes of local "
+        "network with the rate distribution")
+    parser.add_argument(
+        "--traffic-rate", type=float, default=1.0,
+        help="mean messages per second of each remote node (default: 1)")
+    parser.add_argument(
+        "--traffic-message", choices=TRAFFIC_MESSAGES, default="ucast",
+        help="notification sent by remote nodes (default: ucast)")
+    parser.add_argument(
+        "--traffic-signal", action="store_true",
+        help="add RSSI and LQI to UCAST messages of remote nodes")
+    parser.add_argument(
+        "--traffic-counter", action="store_true",
+        help="write a message counter at the start of UCAST and RX payload")
+    args = parser.parse_args()
+
+    if(args.virtual_clock is True):
+        args.event_loop = True
+
     default_router_etrx3x_sregs = {
         "00": "8000",  # channel 26
         "01": "-07",
@@ -1524,18 +1940,96 @@ def main():
         "pan": pan,
     }
 
+    zbnet_list = [zbnet0]
+
+    if(args.topology is not None):
+        print("Generating {} network with {} nodes".format(
+            args.topology, args.nodes))
+        zbnet_list = create_networks(args.topology, args.nodes, seed=args.seed)
+
+        # Local node is the coordinator of first PAN
+        zbnet0 = zbnet_list[0]
+        coo_zbnode = zbnet0["nodes"][0]
+        pan = zbnet0["pan"]
+
+        if(args.save_topology is not None):
+            with open(args.save_topology, "w") as json_file:
+                write_topology_file(zbnet_list, json_file)
+
+    local_node_eui = coo_zbnode["eui"]
+    local_pan_eid = pan["eid"]
+
+    if(args.topology_file is not None):
+        # Networks, local node and local PAN are read from file
+        zbnet_list = None
+        local_node_eui = None
+        local_pan_eid = None
+
     etrx3x_sim = ETRX3xSimulator(
-        [zbnet0],
-        coo_zbnode["eui"],
-        pan["eid"],
+        zbnet_list,
+        local_node_eui,
+        local_pan_eid,
         router_etrx3x_sregs=default_router_etrx3x_sregs,
-        coo_etrx3x_sregs=default_coo_etrx3x_sregs
+        coo_etrx3x_sregs=default_coo_etrx3x_sregs,
+        latency_model=ZigBeeLatencyModel(seed=args.seed, jitter=args.jitter),
+        loss_model=ZigBeeLossModel(seed=args.seed),
+        topology_file=args.topology_file,
+        snapshot_file=args.snapshot,
+        output_queue_size=args.output_queue_size,
+        output_policy=args.output_policy
     )
 
-    print("Starting ETRX3x Simulator")
+    if(args.save_snapshot is not None):
+        etrx3x_sim.save_snapshot(args.save_snapshot)
+
+    if(args.traffic is not None):
+        traffic = ETRX3xTrafficGenerator(etrx3x_sim, seed=args.seed)
+        traffic.add_nodes(
+            [node for node in etrx3x_sim.local_zb_network.get_node_list()
+             if node is not etrx3x_sim.local_node],
+            message=args.traffic_message,
+            distribution=args.traffic,
+            rate=args.traffic_rate,
+            signal=args.traffic_signal,
+            counter=args.traffic_counter)
+
+        # Messages are sent when simulator is started
+        traffic.start()
+
+    if(args.fork_server is not None):
+        fork_server = ETRX3xForkServer(
+            etrx3x_sim, args.fork_server, event_loop=args.event_loop,
+            virtual_clock=args.virtual_clock)
+        try:
+            fork_server.serve_forever()
+        except KeyboardInterrupt:
+            fork_server.stop()
+        return
 
-    etrx3x_sim.start()
+    print("Starting ETRX3x Simulator")
 
+    transports = []
+    try:
+        for addr_string in args.tcp:
+            transports.append(ETRX3xTCPTransport(etrx3x_sim, addr_string))
+    except ValueError as err:
+        parser.error("--tcp: {}".format(err))
+
+    for socket_path in args.unix:
+        transports.append(ETRX3xUnixTransport(etrx3x_sim, socket_path))
+
+    if(len(args.local_node) > 0 or len(transports) > 0):
+        simulators = [etrx3x_sim]
+        for local_node_eui in args.local_node:
+            simulators.append(etrx3x_sim.add_local_module(local_node_eui))
+        run_simulators(
+            simulators, transports, virtual_clock=args.virtual_clock)
+    else:
+        etrx3x_sim.start(
+            event_loop=args.event_loop, virtual_clock=args.virtual_clock)
+
+    print("Output queue: depth={depth}, high-water={high_water}, "
+          "drops={drops}".format(**etrx3x_sim.write_queue.get_stats()))
     print("Terminating ETRX3x Network simulator")
 
 
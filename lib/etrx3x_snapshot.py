@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import marshal
+import struct
+import zlib
+
+from lib.zigbee import ZigBeeLink
+from lib.zigbee import ZigBeeNetwork
+from lib.zigbee import ZigBeeNode
+from lib.zigbee import ZigBeePan
+from lib.zigbee import ZigBeeRoute
+from lib.zigbee import ZigBeeRouteControl
+
+# Snapshot file header: magic, version, reserved, payload CRC32 and payload
+# size
+SNAPSHOT_MAGIC = "ETRX3XSN"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_HEADER = struct.Struct("<8sHHII")
+
+# Model classes attributes stored in snapshot. A snapshot created with
+# different attributes can not be loaded.
+SNAPSHOT_SCHEMA = (
+    ZigBeePan.__slots__,
+    ZigBeeNode.__slots__,
+    ZigBeeLink.__slots__,
+    ZigBeeRoute.__slots__
+)
+
+_NODE_ID = ZigBeeNode.__slots__.index("node_id")
+_NODE_NTABLE = ZigBeeNode.__slots__.index("ntable")
+_NODE_NTABLE_INDEX = ZigBeeNode.__slots__.index("ntable_index")
+_NODE_ATABLE = ZigBeeNode.__slots__.index("atable")
+_NODE_ROUTES = ZigBeeNode.__slots__.index("_routes")
+_NODE_PROFILE = ZigBeeNode.__slots__.index("sregister_profile")
+
+
+def _dump_object(obj):
+    return tuple([getattr(obj, name) for name in obj.__slots__])
+
+
+def _make_loader(cls):
+    # Objects are restored without constructor, assigning all slots with a
+    # single unpack (as collections.namedtuple, the loader is generated
+    # because setattr loop is three times slower)
+    source = "def load(values):\n" \
+        "    obj = new(cls)\n" \
+        "    ({},) = values\n" \
+        "    return obj\n".format(
+            ", ".join("obj." + name for name in cls.__slots__))
+
+    namespace = {"new": cls.__new__, "cls": cls}
+    exec source in namespace
+    return namespace["load"]
+
+
+def _make_ntable_loader():
+    # Links of a node table are restored in a single loop, without a loader
+    # call per link, also building the node neighbour positions. Link source
+    # equal to node identifier is stored as None and shares node string.
+    names = ZigBeeLink.__slots__
+    variables = ["value{}".format(i) for i in range(len(names))]
+    assignments = []
+    for name, variable in zip(names, variables):
+        if(name == "node_id_src"):
+            variable = "node_id if {0} is None else {0}".format(variable)
+        assignments.append("        link.{} = {}\n".format(name, variable))
+
+    source = "def load(node_id, links):\n" \
+        "    ntable = []\n" \
+        "    ntable_index = {{}}\n" \
+        "    append = ntable.append\n" \
+        "    for ({},) in links:\n" \
+        "        link = new(cls)\n" \
+        "{}" \
+        "        ntable_index[link.node_id_dest] = len(ntable)\n" \
+        "        append(link)\n" \
+        "    return ntable, ntable_index\n".format(
+            ", ".join(variables), "".join(assignments))
+
+    namespace = {"new": ZigBeeLink.__new__, "cls": ZigBeeLink}
+    exec source in namespace
+    return namespace["load"]
+
+
+_load_pan = _make_loader(ZigBeePan)
+_load_node = _make_loader(ZigBeeNode)
+_load_ntable = _make_ntable_loader()
+_load_route = _make_loader(ZigBeeRoute)
+
+
+def _dump_link(link, node_id):
+    values = _dump_object(link)
+    if(link.node_id_src == node_id):
+        values = (None,) + values[1:]
+
+    return values
+
+
+def _dump_atable(atable, entries):
+    # Address table entries (the same default entries in most nodes) are
+    # stored once, as SRegister profiles
+    indexes = []
+    for entry in atable:
+        entry = tuple(entry)
+        index = entries.get(entry)
+        if(index is None):
+            index = len(entries)
+            entries[entry] = index
+        indexes.append(index)
+
+    return indexes
+
+
+def _dump_routes(route_control):
+    if(route_control is None):
+        return None
+
+    return (
+        route_control.max_route,
+        route_control.eviction,
+        route_control.ttl,
+        [_dump_object(route) for route in route_control.get_all_routes()])
+
+
+def _load_routes(values):
+    if(values is None):
+        return None
+
+    max_route, eviction, ttl, routes = values
+    route_control = ZigBeeRouteControl(
+        max_route=max_route, eviction=eviction, ttl=ttl)
+
+    for route_values in routes:
+        route = _load_route(route_values)
+        key = tuple(route.get_route())
+
+        route_control.routes[key] = route
+        route_control._add_route_index(key, route)
+
+    if(len(route_control.hops_index) > 0):
+        route_control.max_hops = max(route_control.hops_index)
+        route_control.min_hops = min(route_control.hops_index)
+
+    return route_control
+
+
+def _dump_network(net, profiles, entries):
+    pans = [_dump_object(pan) for pan in net.get_pan_list()]
+
+    local_pan_index = None
+    if(net.get_local_pan() is not None):
+        local_pan_index = net.get_pan_list().index(net.get_local_pan())
+
+    nodes = []
+    for node in net.get_node_list():
+        values = list(_dump_object(node))
+
+        values[_NODE_NTABLE] = [
+            _dump_link(link, node.get_node_id())
+            for link in node.get_ntable()]
+        # Index is rebuilt from links
+        values[_NODE_NTABLE_INDEX] = None
+        values[_NODE_ATABLE] = _dump_atable(
+            node.get_address_table(), entries)
+        values[_NODE_ROUTES] = _dump_routes(node._routes)
+
+        # Profiles shared by nodes are stored once
+        profile = node.get_sregister_profile()
+        index = profiles.get(id(profile))
+        if(index is None):
+            index = len(profiles)
+            profiles[id(profile)] = index
+        values[_NODE_PROFILE] = index
+
+        nodes.append(tuple(values))
+
+    local_node_eui = None
+    if(net.get_local_node() is not None):
+        local_node_eui = net.get_local_node().get_node_eui()
+
+    sink_eui = None
+    if(net.get_sink() is not None):
+        sink_eui = net.get_sink().get_node_eui()
+
+    return (pans, local_pan_index, nodes, local_node_eui, sink_eui,
+            net.get_password(), net.get_key())
+
+
+def _load_network(values, profiles, entries):
+    pans, local_pan_index, nodes, local_node_eui, sink_eui, password, key = \
+        values
+
+    net = ZigBeeNetwork()
+
+    for pan_values in pans:
+        net.pan_list.append(_load_pan(pan_values))
+
+    if(local_pan_index is not None):
+        net.set_local_pan(net.get_pan_index(local_pan_index))
+
+    node_list = []
+    for node_values in nodes:
+        node_values = list(node_values)
+
+        node_values[_NODE_NTABLE], node_values[_NODE_NTABLE_INDEX] = \
+            _load_ntable(node_values[_NODE_ID], node_values[_NODE_NTABLE])
+        node_values[_NODE_ATABLE] = [
+            list(entries[index]) for index in node_values[_NODE_ATABLE]]
+        node_values[_NODE_ROUTES] = _load_routes(node_values[_NODE_ROUTES])
+        node_values[_NODE_PROFILE] = profiles[node_values[_NODE_PROFILE]]
+
+        node_list.append(_load_node(node_values))
+
+    net.insert_nodes(node_list)
+
+    if(local_node_eui is not None):
+        net.set_local_node(net.get_node_eui(local_node_eui))
+
+    if(sink_eui is not None):
+        net.set_sink(net.get_node_eui(sink_eui))
+
+    net.set_password(password)
+    net.set_key(key)
+
+    return net
+
+
+def save_snapshot(snapshot_file, zb_networks, local_node_eui, local_pan_eid,
+                  routing_state=None):
+    """Save ZigBee networks in binary snapshot file.
+
+    Args:
+        snapshot_file: snapshot file path.
+        zb_networks: dictionary of ZigBeeNetwork objects by PAN extended
+            identifier.
+        local_node_eui: simulator local node EUI.
+        local_pan_eid: simulator local PAN extended identifier.
+        routing_state: computed paths from local node (see
+            ZigBeeRoutingEngine get_state) or None.
+    """
+    # item = id(profile): profile index
+    profiles = {}
+
+    # item = address entry tuple: entry index
+    entries = {}
+
+    networks = []
+    for pan_eid in zb_networks:
+        networks.append(
+            (pan_eid, _dump_network(zb_networks[pan_eid], profiles, entries)))
+
+    profile_list = [None] * len(profiles)
+    for pan_eid in zb_networks:
+        for node in zb_networks[pan_eid].get_node_list():
+            profile = node.get_sregister_profile()
+            profile_list[profiles[id(profile)]] = profile
+
+    entry_list = [None] * len(entries)
+    for entry in entries:
+        entry_list[entries[entry]] = entry
+
+    payload = marshal.dumps((
+        SNAPSHOT_SCHEMA,
+        local_node_eui,
+        local_pan_eid,
+        profile_list,
+        entry_list,
+        networks,
+        routing_state
+    ))
+
+    header = SNAPSHOT_HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0,
+        zlib.crc32(payload) & 0xFFFFFFFF, len(payload))
+
+    with open(snapshot_file, "wb") as snapshot:
+        snapshot.write(header)
+        snapshot.write(payload)
+
+
+def load_snapshot(snapshot_file):
+    """Load ZigBee networks from binary snapshot file.
+
+    Args:
+        snapshot_file: snapshot file path.
+
+    Returns:
+        List with dictionary of ZigBeeNetwork objects by PAN extended
+        identifier, local node EUI, local PAN extended identifier and
+        computed paths from local node (None if not stored).
+
+    Raises:
+        IOError for file read errors.
+        ValueError for invalid snapshot file, version or checksum.
+    """
+    with open(snapshot_file, "rb") as snapshot:
+        header = snapshot.read(SNAPSHOT_HEADER.size)
+        if(len(header) != SNAPSHOT_HEADER.size):
+            raise ValueError("invalid snapshot header")
+
+        magic, version, reserved, crc, size = SNAPSHOT_HEADER.unpack(header)
+        if(magic != SNAPSHOT_MAGIC):
+            raise ValueError("invalid snapshot file")
+
+        if(version != SNAPSHOT_VERSION):
+            raise ValueError(
+                "unsupported snapshot version {}".format(version))
+
+        payload = snapshot.read(size)
+
+    if(len(payload) != size or zlib.crc32(payload) & 0xFFFFFFFF != crc):
+        raise ValueError("invalid snapshot checksum")
+
+    # Garbage collector is disabled while millions of objects are created,
+    # otherwise it is triggered repeatedly over objects that are all alive
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        (schema, local_node_eui, local_pan_eid, profile_list, entry_list,
+         networks, routing_state) = marshal.loads(payload)
+        del payload
+
+        if(tuple(tuple(names) for names in schema) != SNAPSHOT_SCHEMA):
+            raise ValueError("snapshot created by incompatible simulator")
+
+        # Profiles are shared by nodes again
+        profiles = [tuple(profile) for profile in profile_list]
+
+        zb_networks = {}
+        for pan_eid, values in networks:
+            zb_networks[pan_eid] = _load_network(
+                values, profiles, entry_list)
+    finally:
+        if(gc_enabled is True):
+            gc.enable()
+
+    return [zb_networks, local_node_eui, local_pan_eid, routing_state]
@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import random
+
+from lib.zigbee_routing import parse_link_quality
+
+# Supported message rate distributions
+TRAFFIC_DISTRIBUTIONS = ("poisson", "periodic", "bursty")
+
+# Supported notifications sent by remote nodes
+TRAFFIC_MESSAGES = ("ucast", "sink", "rx")
+
+# Maximum random LQI variation of messages with signal fields
+LQI_VARIATION = 8
+
+# Byte value in 2 hexadecimal characters
+HEX_BYTES = ["{:02X}".format(value) for value in range(256)]
+
+
+def get_signal_rssi(lqi):
+    """Get simulated RSSI from LQI.
+
+    Args:
+        lqi: link LQI ranging from 0 to 255.
+
+    Returns:
+        RSSI byte (two's complement of -90 dBm to -30 dBm).
+    """
+    return int(-90 + lqi * 60 / 255) & 0xFF
+
+
+class ETRX3xNotification(object):
+    """Pre-rendered notification message.
+
+    The message is rendered once in a bytearray and only its variable
+    fields (RSSI and LQI of UCAST notifications, message counter in the
+    first 4 payload characters) are patched before each copy.
+    """
+    __slots__ = ("buffer", "signal_offset", "counter_offset")
+
+    def __init__(self, text, signal_offset=None, counter_offset=None):
+        """Constructor for ETRX3xNotification class.
+
+        Args:
+            text: rendered message.
+            signal_offset: offset of RSSI field (LQI field is 3 characters
+                after) or None if message has no signal fields.
+            counter_offset: offset of counter field (4 hexadecimal
+                characters) or None if message has no counter.
+        """
+        self.buffer = bytearray(text)
+        self.signal_offset = signal_offset
+        self.counter_offset = counter_offset
+
+    def set_signal(self, rssi, lqi):
+        """Patch RSSI and LQI fields.
+
+        Args:
+            rssi: RSSI byte ranging from 0 to 255.
+            lqi: LQI ranging from 0 to 255.
+        """
+        offset = self.signal_offset
+        self.buffer[offset:offset + 2] = HEX_BYTES[rssi]
+        self.buffer[offset + 3:offset + 5] = HEX_BYTES[lqi]
+
+    def set_counter(self, counter):
+        """Patch counter field.
+
+        Args:
+            counter: counter value ranging from 0 to 65535.
+        """
+        offset = self.counter_offset
+        self.buffer[offset:offset + 2] = HEX_BYTES[counter >> 8]
+        self.buffer[offset + 2:offset + 4] = HEX_BYTES[counter & 0xFF]
+
+
+class ETRX3xNotificationPool(object):
+    """Pool of pre-rendered notification messages.
+
+    Messages are rendered by ETRX3xATCommand builders once for each node and
+    payload template, and shared by all traffic sources of the same message.
+    """
+    def __init__(self, etrx3x_at):
+        """Constructor for ETRX3xNotificationPool class.
+
+        Args:
+            etrx3x_at: ETRX3xATCommand object.
+        """
+        self.etrx3x_at = etrx3x_at
+
+        # item = message key: ETRX3xNotification
+        self.notifications = {}
+
+    def _get(self, key, render):
+        notification = self.notifications.get(key)
+        if(notification is None):
+            notification = render()
+            self.notifications[key] = notification
+
+        return notification
+
+    def _render_ucast(self, eui, payload, signal, counter):
+        if(signal is True):
+            text = self.etrx3x_at.ucast_notification(
+                eui, payload, rssi=0, lqi=0)
+            # ...=<payload>,<rssi>,<lqi>\r\n
+            signal_offset = len(text) - 7
+            payload_offset = signal_offset - 1 - len(payload)
+        else:
+            text = self.etrx3x_at.ucast_notification(eui, payload)
+            # ...=<payload>\r\n
+            signal_offset = None
+            payload_offset = len(text) - 2 - len(payload)
+
+        return ETRX3xNotification(
+            text, signal_offset, payload_offset if counter else None)
+
+    def ucast(self, eui, payload, signal=False, counter=False):
+        """Get UCAST notification.
+
+        Args:
+            eui: source node EUI.
+            payload: message payload.
+            signal: True to add RSSI and LQI fields.
+            counter: True to patch a counter in first 4 payload characters.
+
+        Returns:
+            ETRX3xNotification object.
+        """
+        return self._get(
+            ("ucast", eui, payload, signal, counter),
+            lambda: self._render_ucast(eui, payload, signal, counter))
+
+    def sink(self, eui, node_id):
+        """Get SINK notification.
+
+        Args:
+            eui: sink node EUI.
+            node_id: sink node identifier.
+
+        Returns:
+            ETRX3xNotification object.
+        """
+        return self._get(
+            ("sink", eui, node_id),
+            lambda: ETRX3xNotification(
+                self.etrx3x_at.sink_notification(eui, node_id)))
+
+    def _render_rx(self, node_id, profile_id, dst_ep, src_ep, cluster_id,
+                   payload, eui, counter):
+        text = self.etrx3x_at.rx_notification(
+            node_id, profile_id, dst_ep, src_ep, cluster_id, payload, eui=eui)
+
+        # ...:<payload>\r\n
+        counter_offset = None
+        if(counter is True):
+            counter_offset = len(text) - 2 - len(payload)
+
+        return ETRX3xNotification(text, counter_offset=counter_offset)
+
+    def rx(self, node_id, profile_id, dst_ep, src_ep, cluster_id, payload,
+           eui=None, counter=False):
+        """Get RX notification.
+
+        Args:
+            node_id: source node identifier.
+            profile_id: profile identifier.
+            dst_ep: destination endpoint.
+            src_ep: source endpoint.
+            cluster_id: cluster identifier.
+            payload: message payload.
+            eui: source node EUI or None to omit it.
+            counter: True to patch a counter in first 4 payload characters.
+
+        Returns:
+            ETRX3xNotification object.
+        """
+        return self._get(
+            ("rx", node_id, profile_id, dst_ep, src_ep, cluster_id, payload,
+             eui, counter),
+            lambda: self._render_rx(
+                node_id, profile_id, dst_ep, src_ep, cluster_id, payload, eui,
+                counter))
+
+    def get_total_notifications(self):
+        """Get amount of rendered notifications.
+
+        Returns:
+            Amount of notifications stored in pool.
+        """
+        return len(self.notifications)
+
+
+class _TrafficSource(object):
+    __slots__ = ("notification", "distribution", "rate", "burst_size",
+                 "burst_gap", "burst_remaining", "lqi", "counter")
+
+    def __init__(self, notification, distribution, rate, burst_size,
+                 burst_gap, lqi):
+        self.notification = notification
+        self.distribution = distribution
+        self.rate = rate
+        self.burst_size = burst_size
+        self.burst_gap = burst_gap
+        self.burst_remaining = 0
+        self.lqi = lqi
+        self.counter = 0
+
+
+class ETRX3xTrafficGenerator(object):
+    """Unsolicited traffic of remote ZigBee nodes.
+
+    Each remote node sends UCAST, SINK or RX notifications to the host
+    following its own rate distribution:
+        poisson: exponential intervals with mean 1 / rate seconds.
+        periodic: fixed intervals of 1 / rate seconds (random first send).
+        bursty: bursts of burst_size messages, burst_gap seconds apart,
+            with exponential intervals between bursts (mean rate is kept).
+
+    The next send of all nodes is stored in a single heap and the generator
+    keeps a single scheduler event for the earliest send. Messages are taken
+    from an ETRX3xNotificationPool and the ones due in the same batch_time
+    window are copied to one buffer written to the serial port.
+    """
+    def __init__(self, simulator, seed=None, batch_time=0.001):
+        """Constructor for ETRX3xTrafficGenerator class.
+
+        Args:
+            simulator: ETRX3xSimulator object that receives the messages.
+            seed: random generator seed (None uses system random seed).
+            batch_time: time window in seconds of messages written together.
+        """
+        self.simulator = simulator
+        self.random = random.Random(seed)
+        self.batch_time = batch_time
+
+        self.pool = ETRX3xNotificationPool(simulator.etrx3x_at)
+
+        # item = [send time, sequence, _TrafficSource]
+        self.sends = []
+        self.sequence = itertools.count()
+
+        self.event = None
+        self.running = False
+
+        self.total_messages = 0
+
+    def _get_node_lqi(self, node):
+        # LQI of the route link received by local node
+        links = self.simulator.routing_engine.get_path_links(
+            node.get_node_id())
+        if(links is None or len(links) == 0):
+            return 0
+
+        return parse_link_quality(links[0].get_quality())
+
+    def add_node(
+            self,
+            node,
+            message="ucast",
+            distribution="poisson",
+            rate=1.0,
+            payload="0123456789",
+            burst_size=10,
+            burst_gap=0.001,
+            signal=False,
+            counter=False,
+            profile_id="C091",
+            dst_ep="01",
+            src_ep="01",
+            cluster_id="0000"):
+        """Add remote node traffic.
+
+        Args:
+            node: ZigBeeNode object of remote node.
+            message: notification type ("ucast", "sink" or "rx").
+            distribution: rate distribution ("poisson", "periodic" or
+                "bursty").
+            rate: mean amount of messages per second.
+            payload: UCAST and RX message payload.
+            burst_size: amount of messages per burst (bursty distribution).
+            burst_gap: interval in seconds between messages of a burst.
+            signal: True to add RSSI and LQI of route link to UCAST
+                messages (with a small random variation per message).
+            counter: True to write a message counter (4 hexadecimal
+                characters) at the start of UCAST and RX payload.
+            profile_id: RX message profile identifier.
+            dst_ep: RX message destination endpoint.
+            src_ep: RX message source endpoint.
+            cluster_id: RX message cluster identifier.
+
+        Raises:
+            ValueError for invalid message, distribution, rate, burst size
+            or payload shorter than counter.
+        """
+        if(message not in TRAFFIC_MESSAGES):
+            raise ValueError("invalid message {!r}".format(message))
+
+        if(distribution not in TRAFFIC_DISTRIBUTIONS):
+            raise ValueError("invalid distribution {!r}".format(distribution))
+
+        if(rate <= 0):
+            raise ValueError("invalid rate {!r}".format(rate))
+
+        if(burst_size < 1):
+            raise ValueError("invalid burst size {!r}".format(burst_size))
+
+        if(counter is True and len(payload) < 4):
+            raise ValueError("payload {!r} shorter than counter".format(
+                payload))
+
+        lqi = None
+        if(message == "ucast"):
+            notification = self.pool.ucast(
+                node.get_node_eui(), payload, signal=signal, counter=counter)
+            if(signal is True):
+                lqi = self._get_node_lqi(node)
+        elif(message == "sink"):
+            notification = self.pool.sink(
+                node.get_node_eui(), node.get_node_id())
+        else:
+            notification = self.pool.rx(
+                node.get_node_id(), profile_id, dst_ep, src_ep, cluster_id,
+                payload, eui=node.get_node_eui(), counter=counter)
+
+        source = _TrafficSource(
+            notification, distribution, float(rate), burst_size, burst_gap,
+            lqi)
+
+        if(distribution == "periodic"):
+            # Random phase avoids all nodes sending at the same time
+            first = self.random.uniform(0, 1 / source.rate)
+        else:
+            first = self._next_interval(source)
+
+        self._push(self._get_time() + first, source)
+
+    def add_nodes(self, nodes, **options):
+        """Add traffic of several remote nodes with the same options.
+
+        Args:
+            nodes: iterable of ZigBeeNode objects.
+            options: add_node options.
+        """
+        for node in nodes:
+            self.add_node(node, **options)
+
+    def _get_time(self):
+        return self.simulator.scheduler.clock()
+
+    def _next_interval(self, source):
+        distribution = source.distribution
+
+        if(distribution == "poisson"):
+            return self.random.expovariate(source.rate)
+        elif(distribution == "periodic"):
+            return 1 / source.rate
+
+        # Bursty: messages of current burst, then interval to next burst
+        if(source.burst_remaining > 0):
+            source.burst_remaining -= 1
+            return source.burst_gap
+
+        source.burst_remaining = source.burst_size - 1
+        return self.random.expovariate(source.rate / source.burst_size)
+
+    def _push(self, send_time, source):
+        heapq.heappush(self.sends, [send_time, next(self.sequence), source])
+
+        if(self.running is True and self.sends[0][2] is source):
+            self._schedule()
+
+    def _schedule(self):
+        if(self.event is not None):
+            self.simulator.scheduler.cancel(self.event)
+
+        self.event = self.simulator.scheduler.call_at(
+            self.sends[0][0], self._send)
+
+    def _patch(self, source):
+        notification = source.notification
+
+        if(source.lqi is not None):
+            variation = int(self.random.random() * (2 * LQI_VARIATION + 1))
+            lqi = max(0, min(255, source.lqi + variation - LQI_VARIATION))
+            notification.set_signal(get_signal_rssi(lqi), lqi)
+
+        if(notification.counter_offset is not None):
+            notification.set_counter(source.counter)
+            source.counter = (source.counter + 1) & 0xFFFF
+
+    def _send(self):
+        self.event = None
+        if(self.running is False):
+            return
+
+        if(self.simulator.is_output_blocked(notification=True) is True):
+            # Full output queue: messages are held (and sent later)
+            self.event = self.simulator.scheduler.call_later(
+                self.batch_time, self._send)
+            return
+
+        sends = self.sends
+        limit = self._get_time() + self.batch_time
+
+        batch = bytearray()
+        total = 0
+        while(len(sends) > 0 and sends[0][0] <= limit):
+            send = sends[0]
+            source = send[2]
+
+            # Shared message is patched and copied to batch
+            notification = source.notification
+            if(source.lqi is not None or
+                    notification.counter_offset is not None):
+                self._patch(source)
+            batch += notification.buffer
+            total += 1
+
+            # Next send of source replaces heap top
+            send[0] += self._next_interval(source)
+            send[1] = next(self.sequence)
+            heapq.heapreplace(sends, send)
+
+        if(total > 0):
+            self.total_messages += total
+            self.simulator.write_serial(str(batch), notification=True)
+
+        if(len(sends) > 0):
+            self._schedule()
+
+    def start(self):
+        """Start sending messages.
+
+        The generator uses the simulator scheduler, so messages are sent by
+        the scheduler thread or by the simulator event loop.
+        """
+        self.running = True
+        if(len(self.sends) > 0):
+            self._schedule()
+
+    def stop(self):
+        """Stop sending messages.
+        """
+        self.running = False
+        if(self.event is not None):
+            self.simulator.scheduler.cancel(self.event)
+            self.event = None
+
+    def get_total_messages(self):
+        """Get amount of sent messages.
+
+        Returns:
+            Amount of messages written to simulator serial port.
+        """
+        return self.total_messages
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+import socket
+import weakref
+
+from lib.sgcon_validators import get_host_port
+
+
+class ETRX3xPtyTransport(object):
+    """Serial port (pty) transport of ETRX3x simulator.
+
+    The simulator is reached by a single host through the pty slave.
+    """
+    def __init__(self, simulator):
+        """Constructor for ETRX3xPtyTransport class.
+
+        Args:
+            simulator: ETRX3xSimulator object.
+        """
+        self.simulator = simulator
+
+    def start(self, loop):
+        """Open pty and handle simulator session in event loop.
+
+        Args:
+            loop: ETRX3xEventLoop object.
+        """
+        self.simulator.start_session(loop)
+
+    def stop(self):
+        """Close pty and release simulator.
+        """
+        self.simulator.close()
+
+
+class ETRX3xSocketTransport(object):
+    """Listening socket transport of ETRX3x simulator.
+
+    Each accepted connection is a separate module session: a simulator of
+    the same local node (see ETRX3xSimulator.add_local_module) with its own
+    input buffer, sequence counter and echo state. All sessions are handled
+    by the same event loop and a session is closed when host closes the
+    connection.
+    """
+    def __init__(self, simulator, family, address):
+        """Constructor for ETRX3xSocketTransport class.
+
+        Args:
+            simulator: ETRX3xSimulator object of sessions local node.
+            family: socket address family (AF_INET or AF_UNIX).
+            address: socket address to listen.
+        """
+        self.simulator = simulator
+        self.family = family
+        self.address = address
+
+        self.server = None
+        self.loop = None
+
+        # Open sessions (closed sessions are released by event loop)
+        self.sessions = weakref.WeakSet()
+
+    def start(self, loop):
+        """Listen socket and handle sessions in event loop.
+
+        Args:
+            loop: ETRX3xEventLoop object.
+
+        Raises:
+            socket.error if address can not be listened.
+        """
+        self.server = socket.socket(self.family, socket.SOCK_STREAM)
+        if(self.family == socket.AF_INET):
+            self.server.setsockopt(
+                socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(self.address)
+        self.server.listen(128)
+        self.server.setblocking(False)
+
+        self.loop = loop
+        loop.add_reader(self.server.fileno(), self._accept)
+
+        print("Listening: {}".format(self.address))
+
+    def _accept(self):
+        try:
+            conn, address = self.server.accept()
+        except socket.error as err:
+            if(err.args[0] in (errno.EAGAIN, errno.ECONNABORTED)):
+                return
+            raise
+
+        # Session owns a duplicated descriptor, so it is not closed with
+        # the socket object
+        fd = os.dup(conn.fileno())
+        conn.close()
+
+        session = self.simulator.add_local_module(
+            self.simulator.local_node.get_node_eui(),
+            self.simulator.local_pan_eid)
+        session.start_session(self.loop, fd=fd)
+
+        self.sessions.add(session)
+
+    def stop(self):
+        """Stop listening socket and close open sessions.
+        """
+        if(self.server is None):
+            return
+
+        self.loop.remove_reader(self.server.fileno())
+        self.server.close()
+        self.server = None
+
+        for session in list(self.sessions):
+            session.close()
+
+
+class ETRX3xTCPTransport(ETRX3xSocketTransport):
+    """TCP transport of ETRX3x simulator (see ETRX3xSocketTransport).
+    """
+    def __init__(self, simulator, addr_string):
+        """Constructor for ETRX3xTCPTransport class.
+
+        Args:
+            simulator: ETRX3xSimulator object of sessions local node.
+            addr_string: listen address in "<host>:<port>" format.
+
+        Raises:
+            ValueError for invalid addr_string format, host or port.
+        """
+        super(ETRX3xTCPTransport, self).__init__(
+            simulator, socket.AF_INET, get_host_port(addr_string))
+
+
+class ETRX3xUnixTransport(ETRX3xSocketTransport):
+    """Unix domain socket transport of ETRX3x simulator (see
+    ETRX3xSocketTransport).
+    """
+    def __init__(self, simulator, socket_path):
+        """Constructor for ETRX3xUnixTransport class.
+
+        Args:
+            simulator: ETRX3xSimulator object of sessions local node.
+            socket_path: Unix socket path.
+        """
+        super(ETRX3xUnixTransport, self).__init__(
+            simulator, socket.AF_UNIX, socket_path)
+
+    def start(self, loop):
+        """Listen socket and handle sessions in event loop.
+
+        A socket file left by a previous simulator is replaced.
+
+        Args:
+            loop: ETRX3xEventLoop object.
+
+        Raises:
+            socket.error if address can not be listened.
+        """
+        if(os.path.exists(self.address)):
+            os.unlink(self.address)
+
+        super(ETRX3xUnixTransport, self).start(loop)
+
+    def stop(self):
+        """Stop listening socket, close open sessions and remove socket
+        file.
+        """
+        if(self.server is None):
+            return
+
+        super(ETRX3xUnixTransport, self).stop()
+        os.unlink(self.address)
@@ -3,17 +3,91 @@
 
 import threading
 import hashlib
+from collections import OrderedDict
 from time import time
 
+from lib.zigbee_routing import get_link_drop_probability
+
+# Clock of ZigBee model timestamps (see set_clock)
+_clock = time
+
+
+def set_clock(clock):
+    """Set clock of ZigBee model timestamps (last update and last contact).
+
+    Args:
+        clock: function that returns current timestamp in seconds, such as
+            ETRX3xVirtualClock time method (None restores time.time).
+    """
+    global _clock
+
+    if(clock is None):
+        clock = time
+    _clock = clock
+
+
+def get_time():
+    """Get current timestamp of ZigBee model clock.
+
+    Returns:
+        Timestamp in seconds.
+    """
+    return _clock()
+
+
 # TODO(rubens): create exception class for each ZigBee class
 # TODO(rubens): validate input data (parameters) of each method
 
+# ETRX3x SRegisters range from 00 to 4F
+SREGISTER_TOTAL = 0x50
+
+# SRegister slot by register number string (upper and lower case)
+SREGISTER_SLOTS = {}
+for _slot in range(SREGISTER_TOTAL):
+    SREGISTER_SLOTS["{:02X}".format(_slot)] = _slot
+    SREGISTER_SLOTS["{:02x}".format(_slot)] = _slot
+del _slot
+
+
+def create_sregister_profile(sregisters):
+    """Create an immutable SRegister profile shared by ZigBee nodes.
+
+    Args:
+        sregisters: dictionary with SRegister values by register number (in
+            2 hexadecimal character).
+
+    Returns:
+        Tuple with SRegister values by register slot.
+
+    Raises:
+        ValueError for SRegister number out of range 00 to 4F.
+    """
+    profile = [None] * SREGISTER_TOTAL
+    for register in sregisters:
+        slot = SREGISTER_SLOTS.get(register)
+        if(slot is None):
+            raise ValueError("invalid SRegister {!r}".format(register))
+
+        profile[slot] = sregisters[register]
+
+    return tuple(profile)
+
+
+EMPTY_SREGISTER_PROFILE = create_sregister_profile({})
+
+# ZigBeeRouteControl route eviction policies
+ROUTE_EVICTION_POLICIES = (None, "lru", "ttl", "hops")
+
 
-class ZigBeePan:
+class ZigBeePan(object):
     """Class of ZigBee PAN.
 
     This object contains data of ETRX3x ZigBee PAN data content.
     """
+    __slots__ = (
+        "channel", "power", "pan_id", "epan_id", "zb_stack", "joinable",
+        "last_update", "network_key", "link_key")
+
     def __init__(self, channel, power, pan_id, epan_id, zb_stack, joinable):
         """Constructor for ZigBeePan object.
 
@@ -34,7 +108,7 @@ class ZigBeePan:
         self.epan_id = epan_id
         self.zb_stack = zb_stack
         self.joinable = joinable
-        self.last_update = time()
+        self.last_update = _clock()
         self.network_key = None
         self.link_key = None
 
@@ -112,7 +186,7 @@ class ZigBeePan:
         Args:
             key: 32 hexadecimal characters.
         """
-        self.key = key
+        self.network_key = key
 
     def get_network_key(self):
         """Get ZigBee PAN Network key.
@@ -122,7 +196,7 @@ class ZigBeePan:
         Returns:
             key: 32 hexadecimal characters.
         """
-        return self.key
+        return self.network_key
 
     def set_link_key(self, key):
         """Set ZigBee PAN Link key.
@@ -133,7 +207,7 @@ class ZigBeePan:
         Args:
             key: 32 hexadecimal characters.
         """
-        self.key = key
+        self.link_key = key
 
     def get_link_key(self):
         """Get ZigBee PAN Link Key.
@@ -144,14 +218,17 @@ class ZigBeePan:
         Returns:
             key: 32 hexadecimal characters.
         """
-        return self.key
+        return self.link_key
 
 
-class ZigBeeLink:
+class ZigBeeLink(object):
     """Class of ZigBee nodes link.
 
     This object contains data of a link between two network nodes.
     """
+    __slots__ = (
+        "node_id_src", "node_id_dest", "quality", "last_contact", "state")
+
     def __init__(self, node_id_src, node_id_dest, lqi):
         """Constructor for ZigBee link object.
 
@@ -163,7 +240,7 @@ class ZigBeeLink:
         self.node_id_src = node_id_src
         self.node_id_dest = node_id_dest
         self.quality = lqi
-        self.last_contact = time()
+        self.last_contact = _clock()
         self.state = 1
 
     def __str__(self):
@@ -221,10 +298,20 @@ class ZigBeeLink:
         perc = round((float(dec) / 255) * 100)
         return perc
 
+    def get_drop_probability(self):
+        """Get probability of a transmission to be lost in link.
+
+        Returns:
+            Drop probability estimated from link quality (packet error rate
+            curve of zigbee_routing.LINK_DROP_TABLE), ranging from 0.0 to
+            1.0.
+        """
+        return get_link_drop_probability(self.quality)
+
     def update_last_contact(self):
         """Set last contact (update) of link.
         """
-        self.last_contact = time()
+        self.last_contact = _clock()
 
     def get_last_contact(self):
         """Get last contact (update) of link.
@@ -277,13 +364,16 @@ class ZigBeeLink:
         return text
 
 
-class ZigBeeRoute:
+class ZigBeeRoute(object):
     """Class of specific ZigBee route.
 
     Route comes in ZigBee network stack header when an message is sent in the
     network. It starts with source node (where message is created) and reaches
     local node.
     """
+    __slots__ = (
+        "eui", "node_id", "route", "hash_index", "hops", "last_update")
+
     def __init__(self, eui, node_id, hash_index, route):
         """Constructor for ZigBeeRoute class.
 
@@ -304,7 +394,7 @@ class ZigBeeRoute:
         # The destiny's node_id is not counted as a node route
         self.hops = len(route) - 1
 
-        self.last_update = time()
+        self.last_update = _clock()
 
     def __str__(self):
         text = "EUI: {}\n".format(self.eui)
@@ -382,7 +472,7 @@ class ZigBeeRoute:
         Returns:
             Set last update timestamp.
         """
-        self.last_update = time()
+        self.last_update = _clock()
 
 
 class ZigBeeRouteControl:
@@ -390,19 +480,51 @@ class ZigBeeRouteControl:
 
     All routes are based on local node perspective. The local node is the
     destiny of any route.
+
+    When the maximum amount of routes is reached, the eviction policy defines
+    which route is removed to store the new one:
+        None: new route is discarded (routes are never evicted).
+        "lru": least recently updated route is removed.
+        "ttl": routes not updated for ttl seconds are removed, and the least
+            recently updated route is removed if none has expired.
+        "hops": route with most hops is removed (routes with fewest hops are
+            kept). New route is discarded if it has more hops than all
+            stored routes.
     """
-    def __init__(self, max_route=100000):
+    def __init__(self, max_route=100000, eviction=None, ttl=None):
         """Constructor for ZigBeeRouteControl
 
         Args:
             max_route: maximum amount of routes to be stored.
+            eviction: route eviction policy (None, "lru", "ttl" or "hops").
+            ttl: route time to live in seconds used by "ttl" policy.
+
+        Raises:
+            ValueError for invalid eviction policy or missing ttl.
         """
-        self.routes = []
+        if(eviction not in ROUTE_EVICTION_POLICIES):
+            raise ValueError(
+                "invalid route eviction policy {!r}".format(eviction))
+
+        if(eviction == "ttl" and ttl is None):
+            raise ValueError("ttl route eviction policy requires ttl value")
+
+        # Routes in insertion order or in update order (least recently
+        # updated first) for "lru" and "ttl" policies
+        self.routes = OrderedDict()  # item = tuple(route): ZigBeeRoute()
+
+        # Route indexes by source node EUI, source node id and hops
+        # item = key: OrderedDict(tuple(route): ZigBeeRoute())
+        self.eui_index = {}
+        self.node_id_index = {}
+        self.hops_index = {}
 
         self.max_hops = None
         self.min_hops = None
 
         self.max_route = max_route
+        self.eviction = eviction
+        self.ttl = ttl
 
         self.add_lock = threading.Lock()
 
@@ -417,56 +539,156 @@ class ZigBeeRouteControl:
             route: route in list of ZigBee nodes. ex: ["ABFC", "0DFE",
                 "EDD1"].
         """
+        key = tuple(route_list)
+
         self.add_lock.acquire()
-        route = self.get_route(route_list)
-        if(route is None):
+        try:
+            route = self.routes.get(key)
+            if(route is not None):
+                # Update route
+                route.set_last_update()
+
+                if(self.eviction in ("lru", "ttl")):
+                    # Keep least recently updated route first
+                    del self.routes[key]
+                    self.routes[key] = route
+                return
+
+            if(self.eviction == "ttl"):
+                self._remove_expired_routes()
+
             # Test if maximum amount of route has been reached
-            if(len(self.routes) < self.max_route):
-                # Make has index base on route
-                hash_index = self.make_index(route_list)
-
-                route = ZigBeeRoute(eui, node_id, hash_index, route_list)
-
-                self.routes.append(route)
-                self.add_lock.release()
-
-                # Set max_hops
-                if(self.max_hops is None):
-                    self.max_hops = route.get_hops()
-                else:
-                    if(self.max_hops < route.get_hops()):
-                        self.max_hops = route.get_hops()
-
-                # Set min_hops
-                if(self.min_hops is None):
-                    self.min_hops = route.get_hops()
-                else:
-                    if(self.min_hops > route.get_hops()):
-                        self.min_hops = route.get_hops()
-            else:
-                self.add_lock.release()
+            if(len(self.routes) >= self.max_route and
+                    self._evict_route(len(route_list) - 1) is False):
                 print "ERROR: maximum amount of routes reached."
+                return
+
+            # Make has index base on route
+            hash_index = self.make_index(route_list)
+
+            route = ZigBeeRoute(eui, node_id, hash_index, route_list)
+
+            self.routes[key] = route
+            self._add_route_index(key, route)
+
+            # Set max_hops
+            if(self.max_hops is None or self.max_hops < route.get_hops()):
+                self.max_hops = route.get_hops()
+
+            # Set min_hops
+            if(self.min_hops is None or self.min_hops > route.get_hops()):
+                self.min_hops = route.get_hops()
+        finally:
+            self.add_lock.release()
+
+    def _evict_route(self, hops):
+        if(self.eviction is None or len(self.routes) == 0):
+            return False
+
+        if(self.eviction == "hops"):
+            if(hops > self.max_hops):
+                return False
+
+            # Oldest route with most hops
+            key = next(iter(self.hops_index[self.max_hops]))
         else:
-            # Update route
-            route.set_last_update()
+            # Least recently updated route
+            key = next(iter(self.routes))
+
+        self._remove_route(key)
+        return True
+
+    def remove_route(self, route):
+        """Remove route by route node list.
+
+        Args:
+            route: list with nodes id. Ex: ["ABFC", "0DFE", "EDD1"].
+
+        Returns:
+            Removed ZigBeeRoute object or None if route was not found.
+        """
+        self.add_lock.acquire()
+        try:
+            return self._remove_route(tuple(route))
+        finally:
             self.add_lock.release()
 
+    def remove_expired_routes(self):
+        """Remove routes not updated for ttl seconds.
+
+        This method is used only with "lru" and "ttl" eviction policies, where
+        routes are stored by update order.
+
+        Returns:
+            Amount of removed routes.
+        """
+        self.add_lock.acquire()
+        try:
+            return self._remove_expired_routes()
+        finally:
+            self.add_lock.release()
+
+    def _remove_expired_routes(self):
+        total = 0
+        if(self.ttl is None or self.eviction not in ("lru", "ttl")):
+            return total
+
+        expire_time = _clock() - self.ttl
+        while(len(self.routes) > 0):
+            key = next(iter(self.routes))
+            if(self.routes[key].get_last_update() > expire_time):
+                break
+
+            self._remove_route(key)
+            total += 1
+
+        return total
+
+    def _remove_route(self, key):
+        route = self.routes.pop(key, None)
+        if(route is None):
+            return None
+
+        for index, value in ((self.eui_index, route.get_eui()),
+                             (self.node_id_index, route.get_node_id()),
+                             (self.hops_index, route.get_hops())):
+            routes = index[value]
+            del routes[key]
+            if(len(routes) == 0):
+                del index[value]
+
+        # Hops range from remaining routes
+        if(len(self.hops_index) > 0):
+            self.max_hops = max(self.hops_index)
+            self.min_hops = min(self.hops_index)
+        else:
+            self.max_hops = None
+            self.min_hops = None
+
+        return route
+
+    def _add_route_index(self, key, route):
+        for index, value in ((self.eui_index, route.get_eui()),
+                             (self.node_id_index, route.get_node_id()),
+                             (self.hops_index, route.get_hops())):
+            routes = index.get(value)
+            if(routes is None):
+                routes = OrderedDict()
+                index[value] = routes
+            routes[key] = route
+
     def get_route(self, route):
-        """Get route based on route hash.
+        """Get route based on route node list.
 
         This method is used only for unit test.
 
         Args:
-            route: ZigBeeRoute object.
+            route: list with nodes id. Ex: ["ABFC", "0DFE", "EDD1"].
 
         Returns:
-            Return the has List None if route was not found.
+            ZigBeeRoute object or None if route was not found.
         """
-        hash_index = self.make_index(route)
-        for route in self.routes:
-            if(route.get_hash_index() == hash_index):
-                return route
-        return None
+        return self.routes.get(tuple(route))
 
     def has_route(self, route):
         """Test if route exist in routes.
@@ -476,11 +698,7 @@ class ZigBeeRouteControl:
         Returns:
             True if exists or False otherwise.
         """
-        hash_index = self.make_index(route)
-        for route in self.routes:
-            if(route.get_hash_index() == hash_index):
-                return True
-        return False
+        return tuple(route) in self.routes
 
     def get_max_hops(self):
         """Return the amount of hops from longest route.
@@ -512,12 +730,7 @@ class ZigBeeRouteControl:
         Returns:
             List of ZigBeeRoute objects with origin in node EUI.
         """
-        result_list = []
-        for route in self.routes:
-            if(route.get_eui() == eui):
-                result_list.append(route)
-
-        return result_list
+        return self._get_indexed_routes(self.eui_index, eui)
 
     def get_routes_by_node_id(self, node_id):
         """Get all routes by node id source.
@@ -525,12 +738,7 @@ class ZigBeeRouteControl:
         Returns:
             List of ZigBeeRoute objects by source node id.
         """
-        result_list = []
-        for route in self.routes:
-            if(route.get_node_id() == node_id):
-                result_list.append(route)
-
-        return result_list
+        return self._get_indexed_routes(self.node_id_index, node_id)
 
     def get_routes_by_hops(self, hops):
         """Get all routes by amount of hops.
@@ -538,12 +746,14 @@ class ZigBeeRouteControl:
         Returns:
             List of ZigBeeRoute objects by amount of hops in route.
         """
-        result_list = []
-        for route in self.routes:
-            if(route.get_hops() == hops):
-                result_list.append(route)
+        return self._get_indexed_routes(self.hops_index, hops)
+
+    def _get_indexed_routes(self, index, value):
+        routes = index.get(value)
+        if(routes is None):
+            return []
 
-        return result_list
+        return routes.values()
 
     def get_all_routes(self):
         """Get all routes.
@@ -551,7 +761,7 @@ class ZigBeeRouteControl:
         Returns:
             List of all ZigBeeRout objects stored.
         """
-        return self.routes
+        return self.routes.values()
 
     def make_index(self, route):
         """Create index based on hash function over route.
@@ -574,9 +784,17 @@ class ZigBeeRouteControl:
         return hash_index
 
 
-class ZigBeeNode:
+class ZigBeeNode(object):
     """Class of ZigBeeNode.
     """
+    __slots__ = (
+        "name", "node_id", "eui", "type", "parent_id", "parent_eui",
+        "enddevice", "timeout", "hops", "ntable", "ntable_index", "rtable",
+        "atable",
+        "_routes", "sregister_profile", "sregister_overrides",
+        "last_contact", "version", "state", "endpoints", "sink_mode",
+        "serial_number", "device_type", "device_version")
+
     def __init__(self, eui):
         """Constructor for ZigBeeNode class.
 
@@ -588,7 +806,7 @@ class ZigBeeNode:
         self.node_id = None  # Identifier
         self.eui = eui  # MAC
         self.type = "FFD"
-        self.parend_id = None
+        self.parent_id = None
         self.parent_eui = None
         self.enddevice = "0000"
 
@@ -598,17 +816,23 @@ class ZigBeeNode:
         self.hops = 0  # number of hops to reach this node
 
         # Network data
-        self.ntable = []  # item = [index, dev, EUI, node_id, LQI]
+        # Neighbour links in insertion order (AT+NTABLE index order) and
+        # their positions by destiny node identifier. Removed links are
+        # replaced by None until the list is compacted.
+        self.ntable = []  # item = ZigBeeLink() or None
+        self.ntable_index = {}  # item = node_id_dest: ntable position
         self.rtable = []  # item = [dest, next_node, status, index]
         self.atable = []  # item = [active, node_id, node_eui]
 
-        # Set max amount of routes to 100000
-        # TODO: the max_route depends of number of nodes in the network
-        self.routes = ZigBeeRouteControl(max_route=100000)
+        # Route control is created on first access (see routes property)
+        self._routes = None
 
         # Configuration
-        self.sregisters = []
-        self.last_contact = time()
+        # Shared SRegister values by register slot (None for undefined
+        # register) and node own SRegister values by register slot
+        self.sregister_profile = EMPTY_SREGISTER_PROFILE
+        self.sregister_overrides = None
+        self.last_contact = _clock()
         self.version = None
         self.state = 4  # STATE UNKNOW
 
@@ -627,6 +851,20 @@ class ZigBeeNode:
 
         self.device_version = "0.0"
 
+    @property
+    def routes(self):
+        """ZigBeeRouteControl of node routes.
+
+        Most nodes of a large network do not store routes, so the route
+        control object is only created on first access.
+        """
+        if(self._routes is None):
+            # Set max amount of routes to 100000
+            # TODO: the max_route depends of number of nodes in the network
+            self._routes = ZigBeeRouteControl(max_route=100000)
+
+        return self._routes
+
     def __str__(self):
         text = "ZigBee Node [id={}]\n".format(self.node_id)
         text += "EUI: {}\n".format(self.eui)
@@ -639,12 +877,12 @@ class ZigBeeNode:
         text += "Timout message (sec): {}\n".format(self.timeout)
         text += "Hops: {}\n".format(self.hops)
         text += "SRegisters:\n"
-        text += str(self.sregisters) + "\n"
+        text += str(self.get_sregisters()) + "\n"
         text += "Neighbour Table:\n"
         text += "["
 
         first = True
-        for i in self.ntable:
+        for i in self.get_ntable():
             if(first is False):
                 text += ", "
             else:
@@ -773,17 +1011,23 @@ class ZigBeeNode:
         Args:
             register: SRegister number (in 2 hexadecimal character).
             value: SRegister value.
+
+        Raises:
+            ValueError for SRegister number out of range 00 to 4F.
         """
-        register_up = register.upper()
+        slot = SREGISTER_SLOTS.get(register)
+        if(slot is None):
+            raise ValueError("invalid SRegister {!r}".format(register))
 
-        reg = self.get_sregister(register_up)
-        if(reg is None):
-            # Add new register
-            reg = [register_up, value]
-            self.sregisters.append(reg)
+        if(self.sregister_profile[slot] == value):
+            # Same value of shared profile
+            if(self.sregister_overrides is not None):
+                self.sregister_overrides.pop(slot, None)
         else:
-            # Update value
-            reg[1] = value
+            # Copy on write: only the node own value is stored
+            if(self.sregister_overrides is None):
+                self.sregister_overrides = {}
+            self.sregister_overrides[slot] = value
 
     def get_sregister(self, register):
         """Get ETRX3x SRegister with register identifier and value.
@@ -794,15 +1038,14 @@ class ZigBeeNode:
             register: SRegister number (in 2 hexadecimal character).
 
         Returns:
-            Tuple with SRegister number and value content.
+            Tuple with SRegister number and value content or None if
+            SRegister is not defined.
         """
-        reg = None
-        register_up = register.upper()
-        for i in self.sregisters:
-            if(i[0] == register_up):
-                reg = i
-                break
-        return reg
+        value = self.get_sregister_value(register)
+        if(value is None):
+            return None
+
+        return [register.upper(), value]
 
     def get_sregister_value(self, register):
         """Get only ETRX3x SRegister value.
@@ -815,13 +1058,15 @@ class ZigBeeNode:
         Returns:
             SRegister value content.
         """
-        value = None
-        reg = self.get_sregister(register)
+        slot = SREGISTER_SLOTS.get(register)
+        if(slot is None):
+            return None
 
-        if(reg is not None):
-            value = reg[1]
+        if(self.sregister_overrides is not None and
+                slot in self.sregister_overrides):
+            return self.sregister_overrides[slot]
 
-        return value
+        return self.sregister_profile[slot]
 
     def set_sregister_value(self, register, value):
         """Set only ETRX3x SRegister value.
@@ -835,25 +1080,33 @@ class ZigBeeNode:
         Returns:
             Set operation status: True for success and False for fail.
         """
-        return_status = False
-        reg = self.get_sregister(register)
+        if(self.get_sregister_value(register) is None):
+            return False
 
-        if(reg is not None):
-            reg[1] = value
-            return_status = True
+        self.add_sregister(register, value)
 
-        return return_status
+        return True
 
     def get_sregisters(self):
         """Get all SRegisters values stored.
 
         This method is used only in ETRX3x ZiBee module.
 
-
         Returns:
-            List with all tuples of SRegister number and value.
+            List with all tuples of SRegister number and value ordered by
+            SRegister number.
         """
-        return self.sregisters
+        overrides = self.sregister_overrides
+        if(overrides is None):
+            overrides = {}
+
+        sregister_list = []
+        for slot, value in enumerate(self.sregister_profile):
+            value = overrides.get(slot, value)
+            if(value is not None):
+                sregister_list.append(["{:02X}".format(slot), value])
+
+        return sregister_list
 
     def set_sregisters(self, sregister_array):
         """Set all SRegisters values stored.
@@ -864,7 +1117,41 @@ class ZigBeeNode:
             sregister_array: list with SRegister tuple with register number
                 and value.
         """
-        self.sregisters = sregister_array
+        self.sregister_profile = EMPTY_SREGISTER_PROFILE
+        self.sregister_overrides = None
+
+        for reg in sregister_array:
+            self.add_sregister(reg[0], reg[1])
+
+    def set_sregister_profile(self, profile):
+        """Set shared SRegister profile.
+
+        The profile contains the default SRegisters values and it can be
+        shared by many nodes. Node values added after the profile are stored
+        in the node and do not change the profile.
+
+        Args:
+            profile: SRegister profile created by create_sregister_profile.
+        """
+        self.sregister_profile = profile
+        self.sregister_overrides = None
+
+    def get_sregister_profile(self):
+        """Get shared SRegister profile.
+
+        Returns:
+            Tuple with SRegister values by register slot.
+        """
+        return self.sregister_profile
+
+    def get_sregister_overrides(self):
+        """Get SRegisters values which differ from the shared profile.
+
+        Returns:
+            Dictionary of SRegister values by register slot or None if node
+            uses only profile values.
+        """
+        return self.sregister_overrides
 
     def set_name(self, name):
         """Set node name.
@@ -893,7 +1180,7 @@ class ZigBeeNode:
 
         The timestamp is updated using current system timestamp.
         """
-        self.last_contact = time()
+        self.last_contact = _clock()
 
     def set_last_contact(self, timestamp):
         """Set last contact timestamp.
@@ -901,7 +1188,7 @@ class ZigBeeNode:
         Args:
             timestamp: time in epoch timestamp UTC format.
         """
-        self.timestamp = timestamp
+        self.last_contact = timestamp
 
     def get_last_contact(self):
         """Get last contact timestamp.
@@ -1011,7 +1298,7 @@ class ZigBeeNode:
         Args:
             node_id: parent ZigBee node identifier.
         """
-        self.parend_id = node_id
+        self.parent_id = node_id
 
     def get_parent_id(self):
         """Get ZigBee parent node id.
@@ -1019,7 +1306,7 @@ class ZigBeeNode:
         Returns:
             Parent ZigBee node identifier.
         """
-        return self.parend_id
+        return self.parent_id
 
     def set_parent_eui(self, eui):
         """Set ZigBee parent node EUI.
@@ -1162,18 +1449,30 @@ class ZigBeeNode:
         if(link is None):
             # Add neighbour link
             link = ZigBeeLink(node_id_src, node_id_dest, lqi)
+            self.ntable_index[node_id_dest] = len(self.ntable)
             self.ntable.append(link)
         else:
             # Update neighbour link quality
             link.set_quality(lqi)
         return link
 
+    def _compact_ntable(self):
+        # Removed links are discarded keeping insertion order (list is
+        # updated in place, as returned by get_ntable)
+        self.ntable[:] = [link for link in self.ntable if link is not None]
+        for position, link in enumerate(self.ntable):
+            self.ntable_index[link.node_id_dest] = position
+
     def get_ntable(self):
         """Get all neighbour links of current node.
 
         Returns:
-            List of ZigBeeLink with all neighbour stored in current node.
+            List of ZigBeeLink with all neighbour stored in current node
+            ordered by insertion.
         """
+        if(len(self.ntable) != len(self.ntable_index)):
+            self._compact_ntable()
+
         return self.ntable
 
     def get_neighbour(self, node_id):
@@ -1185,12 +1484,11 @@ class ZigBeeNode:
         Returns:
             ZigBeeLink object with neighbour node identifier.
         """
-        link = None
-        for i in self.ntable:
-            if (i.get_node_id_dest() == node_id):
-                link = i
-                break
-        return link
+        position = self.ntable_index.get(node_id)
+        if(position is None):
+            return None
+
+        return self.ntable[position]
 
     def remove_neighbour(self, node_id):
         """Remove neighbour link by node identifier.
@@ -1202,10 +1500,17 @@ class ZigBeeNode:
             ZigBeeLink object if removed with success or None if
             link was not found.
         """
-        link = self.get_neighbour(node_id)
+        position = self.ntable_index.pop(node_id, None)
+        if(position is None):
+            return None
+
+        link = self.ntable[position]
+        self.ntable[position] = None
 
-        if(link is not None):
-            self.ntable.remove(link)
+        # List is compacted when most of it is removed links, so removal
+        # takes constant amortized time
+        if(len(self.ntable) > 2 * len(self.ntable_index)):
+            self._compact_ntable()
 
         return link
 
@@ -1235,9 +1540,8 @@ class ZigBeeNode:
         Remove all neighbour from current node.
         """
         # Remove all nodes from neighbour list
-        for i in range(len(self.ntable) - 1, -1, -1):
-            node = self.ntable[i]
-            self.ntable.remove(node)
+        self.ntable = []
+        self.ntable_index.clear()
 
     def get_rtable(self):
         """Get all local node routing table.
@@ -1320,11 +1624,18 @@ class ZigBeeNetwork:
         self.node_list = []  # item = ZigBeeNode()
         self.pan_list = []  # item = ZigBeePan()
 
+        # Node indexes by integer node id and integer node EUI
+        self.node_id_index = {}  # item = int(node_id, 16): ZigBeeNode()
+        self.node_eui_index = {}  # item = int(eui, 16): ZigBeeNode()
+
         self.password = None
         self.key = None
 
         self.add_lock = threading.Lock()
 
+        # Callables notified of link changes (see add_link_listener)
+        self.link_listeners = []
+
     def __str__(self):
         text = "ZigBee Network Object\n"
         text += "Local Node: \n"
@@ -1420,6 +1731,9 @@ class ZigBeeNetwork:
             node.set_device_version(dev_version)
 
             self.node_list.append(node)
+            self.node_eui_index[int(node_eui, 16)] = node
+            if(node_id is not None):
+                self.node_id_index.setdefault(int(node_id, 16), node)
             self.add_lock.release()
         else:
             self.add_lock.release()
@@ -1428,6 +1742,64 @@ class ZigBeeNetwork:
 
         return node
 
+    def insert_node(self, node):
+        """Insert a configured node in network.
+
+        Args:
+            node: ZigBeeNode object with EUI not stored in network.
+
+        Raises:
+            ValueError if node EUI is already stored in network.
+        """
+        eui_key = int(node.get_node_eui(), 16)
+
+        self.add_lock.acquire()
+        try:
+            if(eui_key in self.node_eui_index):
+                raise ValueError(
+                    "node {!r} already in network".format(
+                        node.get_node_eui()))
+
+            self.node_list.append(node)
+            self.node_eui_index[eui_key] = node
+            if(node.get_node_id() is not None):
+                self.node_id_index.setdefault(
+                    int(node.get_node_id(), 16), node)
+        finally:
+            self.add_lock.release()
+
+    def insert_nodes(self, nodes):
+        """Insert several configured nodes in network.
+
+        Args:
+            nodes: list of ZigBeeNode objects with EUIs not stored in network.
+
+        Raises:
+            ValueError if a node EUI is already stored in network (nodes
+            before it are inserted).
+        """
+        node_list = self.node_list
+        node_eui_index = self.node_eui_index
+        node_id_index = self.node_id_index
+
+        self.add_lock.acquire()
+        try:
+            for node in nodes:
+                eui_key = int(node.get_node_eui(), 16)
+                if(eui_key in node_eui_index):
+                    raise ValueError(
+                        "node {!r} already in network".format(
+                            node.get_node_eui()))
+
+                node_list.append(node)
+                node_eui_index[eui_key] = node
+
+                node_id = node.get_node_id()
+                if(node_id is not None):
+                    node_id_index.setdefault(int(node_id, 16), node)
+        finally:
+            self.add_lock.release()
+
     def update_node(
         self,
             node_eui, node_id=None, name=None, version=None,
@@ -1443,7 +1815,7 @@ class ZigBeeNetwork:
         if (node is not None):
             # Update node values
             if(node_id is not None):
-                node.set_node_id(node_id)
+                self.set_node_id(node_eui, node_id)
 
             if(name is not None):
                 node.set_name(name)
@@ -1489,21 +1861,64 @@ class ZigBeeNetwork:
             node = self.get_node_eui(node_id)
 
         if(node is not None):
+            node_id = node.get_node_id()
+            removed_links = []
+
             # Remove all links from neighbours
-            for link in node.ntable:
+            for link in node.get_ntable():
                 neighbour_id = link.get_node_id_dest()
                 if(neighbour_id is not None):
+                    removed_links.append([node_id, neighbour_id])
+
                     neighbour = self.get_node(neighbour_id)
                     # Some cases, the node_id has neighbour
                     # that is not present in node_list
                     # FIX: Check this case and find the
                     # reasons to add a node that is not
                     # present in this network.
-                    if (neighbour is not None):
-                        neighbour.remove_neighbour(node_id)
+                    if (neighbour is not None and
+                            neighbour.remove_neighbour(node_id) is not None):
+                        removed_links.append([neighbour_id, node_id])
 
             # Remove node from nodelist
             self.node_list.remove(node)
+            self._remove_node_index(node)
+
+            for node_id_src, node_id_dest in removed_links:
+                self._notify_link(node_id_src, node_id_dest, None)
+
+    def _remove_node_index(self, node):
+        self.node_eui_index.pop(int(node.get_node_eui(), 16), None)
+
+        if(node.get_node_id() is not None):
+            key = int(node.get_node_id(), 16)
+            if(self.node_id_index.get(key) is node):
+                del self.node_id_index[key]
+
+    def set_node_id(self, node_eui, node_id):
+        """Set node identifier and update node index.
+
+        Node identifier of nodes stored in the network must be changed by
+        this method to keep get_node index updated.
+
+        Args:
+            node_eui: ZigBee node EUI.
+            node_id: new ZigBee node identifier.
+
+        Returns:
+            ZigBeeNode object or None if node was not found.
+        """
+        node = self.get_node_eui(node_eui)
+        if(node is not None):
+            self._remove_node_index(node)
+
+            node.set_node_id(node_id)
+
+            self.node_eui_index[int(node.get_node_eui(), 16)] = node
+            if(node_id is not None):
+                self.node_id_index.setdefault(int(node_id, 16), node)
+
+        return node
 
     def get_node(self, node_id):
         """Get node by node identifier.
@@ -1511,12 +1926,7 @@ class ZigBeeNetwork:
         Args:
             node_id: ZigBee node identifier.
         """
-        node = None
-        for i in self.node_list:
-            if(int(i.node_id, 16) == int(node_id, 16)):
-                node = i
-                break
-        return node
+        return self.node_id_index.get(int(node_id, 16))
 
     def get_node_eui(self, eui):
         """Get node by node eui.
@@ -1524,19 +1934,14 @@ class ZigBeeNetwork:
         Args:
             eui: ZigBee node EUI.
         """
-        node = None
-        for i in self.node_list:
-            if(int(i.eui, 16) == int(eui, 16)):
-                node = i
-                break
-        return node
+        return self.node_eui_index.get(int(eui, 16))
 
     def clear_node_list(self):
         """Remove all nodes from node_list.
         """
-        for i in range(len(self.node_list) - 1, -1, -1):
-            node = self.node_list[i]
-            self.node_list.remove(node)
+        del self.node_list[:]
+        self.node_id_index.clear()
+        self.node_eui_index.clear()
 
         # Clear local node
         self.set_local_node(None)
@@ -1691,6 +2096,33 @@ class ZigBeeNetwork:
         """
         return self.key
 
+    def add_link_listener(self, listener):
+        """Add listener of network link changes.
+
+        Listener is called with source node identifier, destiny node
+        identifier and ZigBeeLink object (None for removed link) when a link
+        is changed by add_link, update_link, remove_link, remove_node or
+        clear_node_links methods.
+
+        Args:
+            listener: callable with arguments (node_id_src, node_id_dest,
+                link).
+        """
+        self.link_listeners.append(listener)
+
+    def remove_link_listener(self, listener):
+        """Remove listener of network link changes.
+
+        Args:
+            listener: callable added by add_link_listener.
+        """
+        if(listener in self.link_listeners):
+            self.link_listeners.remove(listener)
+
+    def _notify_link(self, node_id_src, node_id_dest, link):
+        for listener in self.link_listeners:
+            listener(node_id_src, node_id_dest, link)
+
     def add_link(self, node_id_src, node_id_dest, lqi=0):
         """Add link to ZigBee network structure.
 
@@ -1711,6 +2143,7 @@ class ZigBeeNetwork:
             link = node.add_neighbour(
                 node_id_src, node_id_dest, lqi=lqi)
 
+            self._notify_link(node_id_src, node_id_dest, link)
         else:
             # Node not found
             link = None
@@ -1737,6 +2170,9 @@ class ZigBeeNetwork:
         if(node is not None):
             link = node.remove_neighbour(node_id_dest)
 
+            if(link is not None):
+                self._notify_link(node_id_src, node_id_dest, None)
+
         return link
 
     def get_link(self, node_id_src, node_id_dest):
@@ -1781,10 +2217,18 @@ class ZigBeeNetwork:
             link = node.update_link(
                 node_id_dest, lqi=lqi)
 
+            if(link is not None):
+                self._notify_link(node_id_src, node_id_dest, link)
+
         return link
 
     def clear_node_links(self):
         """Remove all links from all nodes.
         """
         for node in self.node_list:
+            links = node.get_ntable()
             node.clear_ntable()
+
+            for link in links:
+                self._notify_link(
+                    link.get_node_id_src(), link.get_node_id_dest(), None)
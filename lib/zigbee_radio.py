@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+import random
+from collections import OrderedDict
+
+from lib.zigbee_routing import LINK_DROP_TABLE
+from lib.zigbee_routing import parse_link_quality
+
+
+class ZigBeeLatencyModel(object):
+    """Delay model of ZigBee unicast messages.
+
+    The delay of a message sent to a remote node and of its acknowledgement
+    is computed from the path links:
+
+        delay = base_delay + ETX * (airtime + 2 * hop_delay) + jitter
+
+    ETX is the sum of link expected transmissions (1 / p, with p = 1 - link
+    drop probability, limited to max_attempts), airtime is the 250 kbps
+    transmission time of the message and acknowledgement frames and jitter
+    is a random delay ranging from 0 to jitter seconds per hop.
+    """
+    def __init__(
+            self,
+            seed=None,
+            jitter=0.005,
+            base_delay=0.02,
+            hop_delay=0.0025,
+            byte_time=0.000032,
+            frame_overhead=31,
+            max_attempts=4):
+        """Constructor for ZigBeeLatencyModel class.
+
+        Args:
+            seed: random generator seed (None uses system random seed).
+            jitter: maximum random delay per hop in seconds.
+            base_delay: local module processing delay in seconds.
+            hop_delay: processing and channel access delay per link
+                transmission in seconds.
+            byte_time: radio transmission time per byte in seconds (default
+                is 250 kbps).
+            frame_overhead: frame headers size in bytes.
+            max_attempts: maximum transmissions per link.
+        """
+        self.seed = seed
+        self.random = random.Random(seed)
+
+        self.jitter = jitter
+        self.base_delay = base_delay
+        self.hop_delay = hop_delay
+        self.byte_time = byte_time
+        self.frame_overhead = frame_overhead
+        self.max_attempts = max_attempts
+
+        # Expected transmissions by link LQI (0 to 255)
+        self.etx_table = []
+        for drop in LINK_DROP_TABLE:
+            if((1 - drop) * max_attempts < 1):
+                self.etx_table.append(float(max_attempts))
+            else:
+                self.etx_table.append(1 / (1 - drop))
+
+    def get_link_etx(self, quality):
+        """Get expected transmissions of a link.
+
+        Args:
+            quality: link quality in hexadecimal string or integer value.
+
+        Returns:
+            Expected amount of transmissions.
+        """
+        return self.etx_table[parse_link_quality(quality)]
+
+    def get_delay(self, links, payload_size=0, transmissions=None):
+        """Get delay of message and acknowledgement over path.
+
+        Args:
+            links: list of ZigBeeLink objects of path (empty list for local
+                node).
+            payload_size: message payload size in bytes.
+            transmissions: amount of link transmissions of message and
+                acknowledgement (see ZigBeeLossModel.send). Expected
+                transmissions of links are used when it is None.
+
+        Returns:
+            Delay in seconds.
+        """
+        if(transmissions is None):
+            etx = 0.0
+            for link in links:
+                etx += self.etx_table[parse_link_quality(link.get_quality())]
+        else:
+            # Each transmission carries a message or acknowledgement frame
+            etx = transmissions / 2.0
+
+        airtime = (2 * self.frame_overhead + payload_size) * self.byte_time
+        delay = self.base_delay + etx * (airtime + 2 * self.hop_delay)
+
+        if(self.jitter > 0):
+            delay += self.random.uniform(0, self.jitter * max(1, len(links)))
+
+        return delay
+
+
+class ZigBeeLossModel(object):
+    """Packet loss and retry model of ZigBee unicast messages.
+
+    Each link transmission is lost with the link drop probability and it is
+    retried by MAC layer up to max_attempts transmissions. A message is
+    delivered when the message and its acknowledgement cross every path
+    link, otherwise it fails (NACK).
+
+    The outcomes of a path (delivered or failed and amount of transmissions)
+    are computed once and stored as a cumulative distribution, so each
+    message outcome is sampled with a single random number. Outcomes with
+    probability below min_probability are discarded while the distribution
+    is computed, so its size (and computation time) depends on the amount
+    of lossy links instead of the path length.
+
+    Distributions are stored by path links tuple (see
+    ZigBeeRoutingEngine.get_path_links), so the links of a path must be
+    given as the same tuple object, which is replaced by the routing engine
+    when a path link changes. The least recently used distribution is
+    removed when max_paths distributions are stored.
+    """
+    def __init__(self, seed=None, max_attempts=4, max_paths=10000,
+                 min_probability=1e-9):
+        """Constructor for ZigBeeLossModel class.
+
+        Args:
+            seed: random generator seed (None uses system random seed).
+            max_attempts: maximum transmissions per link (MAC retries + 1).
+            max_paths: maximum amount of path distributions stored.
+            min_probability: minimum probability of a stored outcome.
+        """
+        self.seed = seed
+        self.random = random.Random(seed)
+
+        self.max_attempts = max_attempts
+        self.max_paths = max_paths
+        self.min_probability = min_probability
+
+        # Distributions in use order (least recently used first)
+        # item = id(links): [links, cdf, outcomes] (stored links keep the
+        # tuple identifier unique)
+        self.paths = OrderedDict()
+
+        # Outcomes of a single link transmission by link LQI (0 to 255)
+        # item = [[(attempts, probability)], failure probability]
+        self.link_table = [self._get_link_outcomes(drop)
+                           for drop in LINK_DROP_TABLE]
+
+    def _get_link_outcomes(self, drop):
+        # Delivery at each attempt (significant attempts only) and failure
+        # after max_attempts
+        attempts = []
+        for attempt in range(1, self.max_attempts + 1):
+            probability = drop ** (attempt - 1) * (1 - drop)
+            if(probability >= self.min_probability):
+                attempts.append((attempt, probability))
+
+        return [attempts, drop ** self.max_attempts]
+
+    def _get_path_distribution(self, links):
+        key = id(links)
+        distribution = self.paths.pop(key, None)
+        if(distribution is not None and distribution[0] is links):
+            # Keep least recently used distribution first
+            self.paths[key] = distribution
+            return distribution
+
+        min_probability = self.min_probability
+
+        # Probability of successful transmission so far by transmissions
+        delivered = {0: 1.0}
+        failed = {}
+
+        for lqi in self._get_lqis(links):
+            attempts, failure = self.link_table[lqi]
+
+            new_delivered = {}
+            for transmissions, probability in delivered.iteritems():
+                for attempt, attempt_probability in attempts:
+                    total = transmissions + attempt
+                    new_delivered[total] = new_delivered.get(total, 0.0) + \
+                        probability * attempt_probability
+
+                failure_probability = probability * failure
+                if(failure_probability >= min_probability):
+                    total = transmissions + self.max_attempts
+                    failed[total] = failed.get(total, 0.0) + \
+                        failure_probability
+
+            delivered = dict(
+                [(transmissions, probability)
+                 for transmissions, probability in new_delivered.iteritems()
+                 if probability >= min_probability])
+
+        cdf = []
+        outcomes = []
+        cumulative = 0.0
+        for status, probabilities in ((True, delivered), (False, failed)):
+            for transmissions in sorted(probabilities):
+                if(probabilities[transmissions] > 0):
+                    cumulative += probabilities[transmissions]
+                    cdf.append(cumulative)
+                    outcomes.append((status, transmissions))
+
+        # Rounding errors must not leave random numbers without outcome
+        cdf[-1] = 1.0
+
+        if(len(self.paths) >= self.max_paths):
+            self.paths.popitem(last=False)
+
+        distribution = [links, cdf, outcomes]
+        self.paths[key] = distribution
+
+        return distribution
+
+    def _get_lqis(self, links):
+        # Message and acknowledgement cross the path links
+        lqis = [parse_link_quality(link.get_quality()) for link in links]
+        return lqis + lqis[::-1]
+
+    def get_delivery_probability(self, links):
+        """Get probability of message delivery over path.
+
+        Args:
+            links: tuple of ZigBeeLink objects of path.
+
+        Returns:
+            Delivery probability ranging from 0.0 to 1.0.
+        """
+        links, cdf, outcomes = self._get_path_distribution(links)
+
+        probability = 0.0
+        previous = 0.0
+        for cumulative, outcome in zip(cdf, outcomes):
+            if(outcome[0] is True):
+                probability += cumulative - previous
+            previous = cumulative
+
+        return probability
+
+    def send(self, links, count=1):
+        """Sample outcomes of messages sent over path.
+
+        Args:
+            links: tuple of ZigBeeLink objects of path.
+            count: amount of messages.
+
+        Returns:
+            List of (delivered, transmissions) tuples, one per message, where
+            delivered is True for acknowledged message and transmissions is
+            the amount of link transmissions of message and acknowledgement.
+        """
+        links, cdf, outcomes = self._get_path_distribution(links)
+
+        rand = self.random.random
+        return [outcomes[bisect.bisect_right(cdf, rand())]
+                for i in range(count)]
@@ -0,0 +1,493 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+import math
+
+# Maximum ZigBee link cost
+MAX_LINK_COST = 7
+
+# Link LQI with 50% packet error rate and width of the transition between
+# lossy and lossless links (see _make_link_drop_table)
+LINK_DROP_LQI = 60
+LINK_DROP_WIDTH = 8.0
+
+
+def _make_link_drop_table():
+    # IEEE 802.15.4 packet error rate falls sharply with link quality: links
+    # below the transitional region lose most frames and links above it
+    # (LQI 100 or more) are almost lossless. The curve is a logistic
+    # function of LQI: PER = 1 / (1 + exp((LQI - LINK_DROP_LQI) / width))
+    return [1 / (1 + math.exp((lqi - LINK_DROP_LQI) / LINK_DROP_WIDTH))
+            for lqi in range(0, 256)]
+
+
+# Transmission drop probability by link LQI (0 to 255)
+LINK_DROP_TABLE = _make_link_drop_table()
+
+
+def _make_link_cost_table():
+    # ZigBee link cost C = min(7, round(1 / p^4)), where p is the packet
+    # delivery probability of link LQI (p = 1 - PER)
+    table = []
+    for drop in LINK_DROP_TABLE:
+        probability = 1 - drop
+        if(probability ** 4 * MAX_LINK_COST < 1):
+            table.append(MAX_LINK_COST)
+        else:
+            table.append(int(round(1 / probability ** 4)))
+
+    return table
+
+
+# Link cost by link LQI (0 to 255)
+LINK_COST_TABLE = _make_link_cost_table()
+
+
+def parse_link_quality(quality):
+    """Parse ZigBeeLink quality value.
+
+    Args:
+        quality: link quality in hexadecimal string (range from 00 to FF) or
+            integer value (range from 0 to 255).
+
+    Returns:
+        Link LQI integer ranging from 0 to 255.
+    """
+    try:
+        lqi = int(quality, 16)
+    except TypeError:
+        lqi = int(quality)
+
+    return max(0, min(255, lqi))
+
+
+def get_link_drop_probability(quality):
+    """Get probability of a transmission to be lost in link.
+
+    Args:
+        quality: link quality in hexadecimal string (range from 00 to FF) or
+            integer value (range from 0 to 255).
+
+    Returns:
+        Drop probability ranging from 0.0 to 1.0 (see LINK_DROP_TABLE).
+    """
+    return LINK_DROP_TABLE[parse_link_quality(quality)]
+
+
+def get_link_cost(quality):
+    """Get ZigBee link cost from link quality.
+
+    Args:
+        quality: link quality in hexadecimal string (range from 00 to FF) or
+            integer value (range from 0 to 255).
+
+    Returns:
+        Link cost ranging from 1 (best link) to 7 (worst link).
+    """
+    return LINK_COST_TABLE[parse_link_quality(quality)]
+
+
+class ZigBeeRoutingEngine(object):
+    """Least cost routing of ZigBee network.
+
+    The engine computes the least cost paths (based on ZigBeeLink quality)
+    from the source node to every node of ZigBeeNetwork and stores the result
+    in next hop, hops and path cost tables, so route queries are dictionary
+    lookups.
+
+    The tables are computed on first query. Link changes made with
+    ZigBeeNetwork methods (add_link, update_link, remove_link and
+    remove_node) are received as network link events and repair only the
+    affected part of the tables. Links changed directly in ZigBeeNode require
+    a full computation with invalidate method. An engine that is no longer
+    used must be detached from the network with close method.
+
+    The links of each queried path are stored as a tuple, so a message to
+    the same node gets the same tuple with a single lookup until a link of
+    the shortest path tree changes (radio models key their caches on it).
+
+    Node identifiers are stored as integers, such as ZigBeeNetwork indexes.
+    """
+    def __init__(self, network, source_id):
+        """Constructor for ZigBeeRoutingEngine class.
+
+        Args:
+            network: ZigBeeNetwork object.
+            source_id: ZigBee node identifier of path source (local node).
+        """
+        self.network = network
+        self.source = int(source_id, 16)
+
+        # item = node_id: value
+        self.cost = {}  # path cost
+        self.hops = {}  # amount of hops
+        self.next_hop = {}  # first hop from source
+        self.parent = {}  # previous node in path
+        self.parent_link = {}  # ZigBeeLink from previous node in path
+
+        # Links of queried paths: item = node_id: tuple(ZigBeeLink)
+        self.path_links = {}
+
+        # Shortest path tree: item = node_id: set(child node_id)
+        self.children = {}
+
+        # Incoming links: item = node_id_dest: set(node_id_src)
+        self.incoming = {}
+
+        self.valid = False
+
+        network.add_link_listener(self.link_changed)
+
+    def close(self):
+        """Stop receiving network link events.
+
+        The engine must not be used after close, its paths are not repaired
+        anymore.
+        """
+        self.network.remove_link_listener(self.link_changed)
+        self.valid = False
+
+    def invalidate(self):
+        """Discard all computed paths.
+
+        Paths are computed again on next query.
+        """
+        self.valid = False
+
+    def get_state(self):
+        """Get computed paths, computing them if needed.
+
+        Returns:
+            Tuple of source node identifier and routing tables (dictionaries
+            and sets of integers, so it can be stored with marshal).
+        """
+        if(self.valid is False):
+            self._compute()
+
+        return (self.source, self.cost, self.hops, self.next_hop,
+                self.parent, self.children, self.incoming)
+
+    def set_state(self, state):
+        """Restore computed paths from get_state.
+
+        The network must have the same links of the network used by
+        get_state. Links of restored paths are fetched on first query.
+
+        Args:
+            state: tuple returned by get_state.
+
+        Raises:
+            ValueError if paths have a different source node.
+        """
+        if(state[0] != self.source):
+            raise ValueError(
+                "paths of source node {:04X}".format(state[0]))
+
+        (self.cost, self.hops, self.next_hop, self.parent, self.children,
+         self.incoming) = state[1:]
+
+        self.parent_link = {}
+        self.path_links = {}
+        self.valid = True
+
+    def _get_link(self, node_id_src, node_id_dest):
+        node = self.network.get_node("{:04X}".format(node_id_src))
+        if(node is None):
+            return None
+
+        link = node.get_neighbour("{:04X}".format(node_id_dest))
+        if(link is None):
+            # Link can be stored with a different node id format
+            for link in node.get_ntable():
+                if(int(link.get_node_id_dest(), 16) == node_id_dest):
+                    break
+            else:
+                return None
+
+        return link
+
+    def _compute(self):
+        for table in (self.cost, self.hops, self.next_hop, self.parent,
+                      self.parent_link, self.path_links, self.children,
+                      self.incoming):
+            table.clear()
+
+        self.cost[self.source] = 0
+        self.hops[self.source] = 0
+        self.next_hop[self.source] = self.source
+
+        for node in self.network.get_node_list():
+            if(node.get_node_id() is None):
+                continue
+
+            node_id_src = int(node.get_node_id(), 16)
+            for link in node.get_ntable():
+                node_id_dest = int(link.get_node_id_dest(), 16)
+                self.incoming.setdefault(node_id_dest, set()).add(
+                    node_id_src)
+
+        self.valid = True
+        self._propagate([(0, self.source)])
+
+    def _set_parent(self, node_id, parent_id, link):
+        old_parent_id = self.parent.get(node_id)
+        if(old_parent_id is not None):
+            self.children[old_parent_id].discard(node_id)
+
+        # Paths of node subtree changed
+        if(len(self.path_links) > 0):
+            self.path_links.clear()
+
+        self.parent[node_id] = parent_id
+        self.parent_link[node_id] = link
+        self.children.setdefault(parent_id, set()).add(node_id)
+
+        if(parent_id == self.source):
+            self.next_hop[node_id] = node_id
+        else:
+            self.next_hop[node_id] = self.next_hop[parent_id]
+
+        self.hops[node_id] = self.hops[parent_id] + 1
+
+    def _propagate(self, heap):
+        # Dijkstra relaxation from nodes in heap (item = [cost, node_id])
+        heapq.heapify(heap)
+
+        while(len(heap) > 0):
+            cost, node_id = heapq.heappop(heap)
+            if(cost > self.cost.get(node_id)):
+                # Outdated heap item
+                continue
+
+            node = self.network.get_node("{:04X}".format(node_id))
+            if(node is None):
+                continue
+
+            for link in node.get_ntable():
+                neighbour_id = int(link.get_node_id_dest(), 16)
+                new_cost = cost + get_link_cost(link.get_quality())
+
+                neighbour_cost = self.cost.get(neighbour_id)
+                if(neighbour_cost is None or new_cost < neighbour_cost):
+                    self.cost[neighbour_id] = new_cost
+                    self._set_parent(neighbour_id, node_id, link)
+                    heapq.heappush(heap, (new_cost, neighbour_id))
+
+    def _invalidate_subtree(self, node_id):
+        # Remove paths of node and all nodes routed through it
+        self.path_links.clear()
+
+        invalid = []
+        stack = [node_id]
+        while(len(stack) > 0):
+            node_id = stack.pop()
+            invalid.append(node_id)
+            stack.extend(self.children.pop(node_id, ()))
+
+            self.parent_link.pop(node_id, None)
+            parent_id = self.parent.pop(node_id, None)
+            if(parent_id is not None and parent_id in self.children):
+                self.children[parent_id].discard(node_id)
+
+            self.cost.pop(node_id, None)
+            self.hops.pop(node_id, None)
+            self.next_hop.pop(node_id, None)
+
+        return invalid
+
+    def _repair(self, invalid):
+        # Reseed invalidated nodes from valid nodes of subtree boundary
+        heap = []
+        for node_id in invalid:
+            for node_id_src in self.incoming.get(node_id, ()):
+                src_cost = self.cost.get(node_id_src)
+                if(src_cost is None):
+                    continue
+
+                link = self._get_link(node_id_src, node_id)
+                if(link is None):
+                    continue
+
+                new_cost = src_cost + get_link_cost(link.get_quality())
+                node_cost = self.cost.get(node_id)
+                if(node_cost is None or new_cost < node_cost):
+                    self.cost[node_id] = new_cost
+                    self._set_parent(node_id, node_id_src, link)
+
+            if(node_id in self.cost):
+                heap.append((self.cost[node_id], node_id))
+
+        self._propagate(heap)
+
+    def link_changed(self, node_id_src, node_id_dest, link):
+        """Update paths with a changed network link.
+
+        This method is registered as ZigBeeNetwork link listener.
+
+        Args:
+            node_id_src: source ZigBee node identifier.
+            node_id_dest: destiny ZigBee node identifier.
+            link: ZigBeeLink object or None if link was removed.
+        """
+        if(self.valid is False):
+            return
+
+        node_id_src = int(node_id_src, 16)
+        node_id_dest = int(node_id_dest, 16)
+
+        if(link is None):
+            self.incoming.get(node_id_dest, set()).discard(node_id_src)
+            link_cost = None
+        else:
+            self.incoming.setdefault(node_id_dest, set()).add(node_id_src)
+            link_cost = get_link_cost(link.get_quality())
+
+        if(node_id_dest == self.source):
+            return
+
+        if(self.parent.get(node_id_dest) == node_id_src):
+            # Tree link quality changed: stored paths through it are stale
+            self.path_links.clear()
+
+            old_cost = self.cost[node_id_dest] - self.cost[node_id_src]
+            if(link_cost is not None and link_cost <= old_cost):
+                # Better tree link: node and its subtree are improved
+                self.cost[node_id_dest] = self.cost[node_id_src] + link_cost
+                self.parent_link[node_id_dest] = link
+                self._propagate([(self.cost[node_id_dest], node_id_dest)])
+            elif(link_cost != old_cost):
+                # Worse tree link: node and its subtree must be rerouted
+                self._repair(self._invalidate_subtree(node_id_dest))
+            return
+
+        src_cost = self.cost.get(node_id_src)
+        if(link_cost is None or src_cost is None):
+            # Removed or unreachable link out of shortest path tree
+            return
+
+        new_cost = src_cost + link_cost
+        dest_cost = self.cost.get(node_id_dest)
+        if(dest_cost is None or new_cost < dest_cost):
+            self.cost[node_id_dest] = new_cost
+            self._set_parent(node_id_dest, node_id_src, link)
+            self._propagate([(new_cost, node_id_dest)])
+
+    def _get_value(self, table, node_id):
+        if(self.valid is False):
+            self._compute()
+
+        return table.get(int(node_id, 16))
+
+    def is_reachable(self, node_id):
+        """Test if there is a path from source to node.
+
+        Args:
+            node_id: ZigBee node identifier.
+
+        Returns:
+            True if node is reachable, otherwise False.
+        """
+        return self._get_value(self.cost, node_id) is not None
+
+    def get_path_cost(self, node_id):
+        """Get least path cost from source to node.
+
+        Args:
+            node_id: ZigBee node identifier.
+
+        Returns:
+            Sum of link costs of path or None if node is not reachable.
+        """
+        return self._get_value(self.cost, node_id)
+
+    def get_hops(self, node_id):
+        """Get amount of hops of least cost path from source to node.
+
+        Args:
+            node_id: ZigBee node identifier.
+
+        Returns:
+            Amount of hops or None if node is not reachable.
+        """
+        return self._get_value(self.hops, node_id)
+
+    def get_next_hop(self, node_id):
+        """Get first hop of least cost path from source to node.
+
+        Args:
+            node_id: ZigBee node identifier.
+
+        Returns:
+            Next hop ZigBee node identifier or None if node is not
+            reachable.
+        """
+        next_hop = self._get_value(self.next_hop, node_id)
+        if(next_hop is None):
+            return None
+
+        return "{:04X}".format(next_hop)
+
+    def get_path(self, node_id):
+        """Get least cost path from source to node.
+
+        Args:
+            node_id: ZigBee node identifier.
+
+        Returns:
+            List of ZigBee node identifiers from source to node or None if
+            node is not reachable.
+        """
+        if(self.is_reachable(node_id) is False):
+            return None
+
+        path = []
+        node_id = int(node_id, 16)
+        while(node_id is not None):
+            path.append("{:04X}".format(node_id))
+            node_id = self.parent.get(node_id)
+
+        path.reverse()
+        return path
+
+    def get_path_links(self, node_id):
+        """Get links of least cost path from source to node.
+
+        Args:
+            node_id: ZigBee node identifier.
+
+        Returns:
+            Tuple of ZigBeeLink objects from source to node (empty tuple for
+            source node) or None if node is not reachable. The same tuple is
+            returned until a link of the path changes.
+        """
+        if(self.valid is False):
+            self._compute()
+
+        node_id = int(node_id, 16)
+        links = self.path_links.get(node_id)
+        if(links is not None):
+            return links
+
+        if(node_id not in self.cost):
+            return None
+
+        links = []
+        path_node_id = node_id
+        while(path_node_id != self.source):
+            parent_id = self.parent[path_node_id]
+
+            link = self.parent_link.get(path_node_id)
+            if(link is None):
+                # Path restored by set_state
+                link = self._get_link(parent_id, path_node_id)
+                self.parent_link[path_node_id] = link
+
+            links.append(link)
+            path_node_id = parent_id
+
+        links.reverse()
+        links = tuple(links)
+        self.path_links[node_id] = links
+
+        return links
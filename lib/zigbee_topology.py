@@ -0,0 +1,589 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import math
+import random
+
+from lib.zigbee_routing import LINK_DROP_LQI
+
+# Maximum amount of nodes per PAN (node identifiers 0000 to FFF7, FFF8 to
+# FFFF are broadcast and reserved addresses)
+MAX_PAN_NODES = 0xFFF8
+
+# Supported network topologies
+TOPOLOGIES = ("grid", "geometric", "tree", "clustered")
+
+# Default maximum link distance (grid nodes have distance 1, so each grid
+# node is linked to its 8 adjacent nodes)
+RADIO_RANGE = 1.75
+
+# Minimum LQI of the link to a parent node (nodes join the network through
+# almost lossless links, see zigbee_routing.LINK_DROP_TABLE)
+PARENT_LQI = 100
+
+
+def get_link_quality(distance, radio_range):
+    """Get link quality from distance between nodes.
+
+    Radio range is the distance where half of the transmissions are lost
+    (LQI LINK_DROP_LQI, see zigbee_routing.LINK_DROP_TABLE). Link quality is
+    high for most of the radio range and falls sharply near its limit, where
+    the received signal approaches radio sensitivity:
+
+        LQI = LINK_DROP_LQI + (255 - LINK_DROP_LQI) * (1 - (d / range)^4)
+
+    Links up to 94% of radio range have LQI 100 or more (almost lossless)
+    and the remaining links are marginal.
+
+    Args:
+        distance: distance between nodes.
+        radio_range: maximum link distance.
+
+    Returns:
+        Link LQI ranging from LINK_DROP_LQI (radio range limit) to 255 (same
+        position) or None if nodes are out of radio range.
+    """
+    if(distance > radio_range):
+        return None
+
+    return int(round(LINK_DROP_LQI + (255 - LINK_DROP_LQI) *
+                     (1 - (distance / radio_range) ** 4)))
+
+
+def _create_pan(pan_number):
+    return {
+        "channel": 11 + (pan_number % 16),
+        "id": "{:04X}".format(pan_number + 1),
+        "eid": "E{:015X}".format(pan_number + 1),
+        "netkey": "{:032X}".format(pan_number + 1),
+        "linkkey": "{:032X}".format(pan_number + 1)
+    }
+
+
+def _get_cell(position, radio_range):
+    return (int(math.floor(position[0] / radio_range)),
+            int(math.floor(position[1] / radio_range)))
+
+
+def _create_cells(positions, radio_range, indexes):
+    # Spatial hash of nodes: item = cell: [index]
+    cells = {}
+    for index in indexes:
+        cells.setdefault(
+            _get_cell(positions[index], radio_range), []).append(index)
+
+    return cells
+
+
+def _create_links(positions, radio_range):
+    # Links between nodes in radio range found by spatial hashing: only nodes
+    # of the same and the adjacent cells are compared
+    cells = _create_cells(positions, radio_range, range(0, len(positions)))
+
+    # item = [index_src, index_dst, lqi]
+    links = []
+    for (cell_x, cell_y), indexes in cells.items():
+        # Half of adjacent cells, so each link is found once
+        for offset_x, offset_y in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+            neighbours = cells.get((cell_x + offset_x, cell_y + offset_y))
+            if(neighbours is None):
+                continue
+
+            same_cell = (offset_x == 0 and offset_y == 0)
+            for i in indexes:
+                x, y = positions[i]
+                for j in neighbours:
+                    if(same_cell is True and j <= i):
+                        continue
+
+                    distance = math.hypot(
+                        x - positions[j][0], y - positions[j][1])
+                    lqi = get_link_quality(distance, radio_range)
+                    if(lqi is not None):
+                        links.append([i, j, lqi])
+
+    return links
+
+
+def _get_parents(total, links):
+    # Parent of each node is the node from which it joins the network in
+    # breadth first order from coordinator (index 0), through links with
+    # PARENT_LQI or more
+    neighbours = [[] for i in range(0, total)]
+    for index_src, index_dst, lqi in links:
+        if(lqi >= PARENT_LQI):
+            neighbours[index_src].append(index_dst)
+            neighbours[index_dst].append(index_src)
+
+    parents = [None] * total
+    parents[0] = 0
+    queue = [0]
+    for index in queue:
+        for neighbour in neighbours[index]:
+            if(parents[neighbour] is None):
+                parents[neighbour] = index
+                queue.append(neighbour)
+
+    return parents
+
+
+def _find_nearest(cells, positions, position, radio_range):
+    # Nearest node of spatial hash, searched in rings of cells around
+    # position until no closer node can be found
+    cell_x, cell_y = _get_cell(position, radio_range)
+    nearest = None
+    nearest_distance = None
+
+    ring = 0
+    while(nearest is None or (ring - 1) * radio_range <= nearest_distance):
+        for offset_x in range(-ring, ring + 1):
+            for offset_y in range(-ring, ring + 1):
+                if(max(abs(offset_x), abs(offset_y)) != ring):
+                    continue
+
+                for index in cells.get(
+                        (cell_x + offset_x, cell_y + offset_y), ()):
+                    distance = math.hypot(
+                        position[0] - positions[index][0],
+                        position[1] - positions[index][1])
+                    if(nearest is None or distance < nearest_distance):
+                        nearest = index
+                        nearest_distance = distance
+        ring += 1
+
+    return nearest
+
+
+def _get_orphan_groups(total, links, parents):
+    # Groups of orphan nodes joined by links with PARENT_LQI or more
+    neighbours = {}
+    for index_src, index_dst, lqi in links:
+        if(lqi >= PARENT_LQI and parents[index_src] is None):
+            neighbours.setdefault(index_src, []).append(index_dst)
+            neighbours.setdefault(index_dst, []).append(index_src)
+
+    groups = []
+    grouped = set()
+    for index in range(0, total):
+        if(parents[index] is not None or index in grouped):
+            continue
+
+        group = [index]
+        grouped.add(index)
+        for member in group:
+            for neighbour in neighbours.get(member, ()):
+                if(neighbour not in grouped):
+                    grouped.add(neighbour)
+                    group.append(neighbour)
+        groups.append(group)
+
+    return groups
+
+
+def _attach_orphans(positions, links, parents, rnd, radio_range):
+    # Groups of nodes that can not join the network (isolated nodes or groups
+    # linked to the network only by marginal links) are moved, keeping their
+    # shape, so the group node nearest to the network is placed from 30% to
+    # 70% of radio range of its nearest connected node
+    groups = _get_orphan_groups(len(positions), links, parents)
+    if(len(groups) == 0):
+        return False
+
+    connected = [index for index, parent in enumerate(parents)
+                 if parent is not None]
+    cells = _create_cells(positions, radio_range, connected)
+
+    for group in groups:
+        pairs = []
+        for index in group:
+            nearest = _find_nearest(
+                cells, positions, positions[index], radio_range)
+            distance = math.hypot(
+                positions[index][0] - positions[nearest][0],
+                positions[index][1] - positions[nearest][1])
+            pairs.append((distance, index, nearest))
+
+        distance, index, nearest = min(pairs)
+        x, y = positions[index]
+        nearest_x, nearest_y = positions[nearest]
+
+        scale = rnd.uniform(0.3, 0.7) * radio_range / distance
+        offset_x = nearest_x + (x - nearest_x) * scale - x
+        offset_y = nearest_y + (y - nearest_y) * scale - y
+        for index in group:
+            positions[index] = (positions[index][0] + offset_x,
+                                positions[index][1] + offset_y)
+
+    return True
+
+
+def _create_zbnet(pan_number, parents, links):
+    nodes = []
+    for index, parent in enumerate(parents):
+        if(index == 0):
+            node_type = "COO"
+            parent_id = "FFFF"
+        else:
+            node_type = "FFD"
+            if(parent is None):
+                # Node out of coordinator range
+                parent_id = "FFFF"
+            else:
+                parent_id = "{:04X}".format(parent)
+
+        nodes.append({
+            "id": "{:04X}".format(index),
+            "eui": "ED{:04X}{:010X}".format(pan_number + 1, index),
+            "type": node_type,
+            "parent_id": parent_id,
+            "sregs": {}
+        })
+
+    zblinks = []
+    for index_src, index_dst, lqi in links:
+        zblinks.append({
+            "id_src": "{:04X}".format(index_src),
+            "id_dst": "{:04X}".format(index_dst),
+            "lqi": lqi
+        })
+
+    return {
+        "nodes": nodes,
+        "links": zblinks,
+        "pan": _create_pan(pan_number)
+    }
+
+
+def _grid_positions(total, rnd, radio_range, **options):
+    side = int(math.ceil(math.sqrt(total)))
+    return [(float(i % side), float(i // side)) for i in range(0, total)]
+
+
+def _geometric_positions(total, rnd, radio_range, degree=8, **options):
+    # Area side with an average of degree nodes in radio range of each node
+    side = radio_range * math.sqrt(total * math.pi / degree)
+
+    # Coordinator at area center
+    positions = [(side / 2, side / 2)]
+    for i in range(1, total):
+        positions.append((rnd.uniform(0, side), rnd.uniform(0, side)))
+
+    return positions
+
+
+def _clustered_positions(
+        total, rnd, radio_range, cluster_size=100, degree=8, **options):
+    clusters = max(1, int(math.ceil(float(total) / cluster_size)))
+
+    # Cluster centers placed in a grid with spacing equal to cluster radius,
+    # so clusters overlap (nodes are denser at cluster centers and clusters
+    # are linked by their borders) with an average of degree nodes in radio
+    # range
+    radius = radio_range * math.sqrt(math.pi * cluster_size / degree)
+    side = int(math.ceil(math.sqrt(clusters)))
+    spacing = radius
+
+    centers = [((i % side) * spacing, (i // side) * spacing)
+               for i in range(0, clusters)]
+
+    positions = []
+    for i in range(0, total):
+        center_x, center_y = centers[i % clusters]
+        positions.append((rnd.gauss(center_x, radius / 2),
+                          rnd.gauss(center_y, radius / 2)))
+
+    return positions
+
+
+def _create_tree(total, rnd, radio_range, children=4, **options):
+    # Each node has up to children nodes and links are only between parent
+    # and child nodes with distance ranging from 20% to 90% of radio range
+    parents = [0]
+    links = []
+    for index in range(1, total):
+        parent = (index - 1) // children
+        parents.append(parent)
+
+        distance = rnd.uniform(0.2, 0.9) * radio_range
+        links.append([parent, index, get_link_quality(distance, radio_range)])
+
+    return parents, links
+
+
+def create_pan_network(
+        topology, total, pan_number=0, seed=None, radio_range=RADIO_RANGE,
+        **options):
+    """Create ZigBee network structure of a single PAN.
+
+    Node 0000 is the coordinator (COO) and the other nodes are routers
+    (FFD). Links are created between nodes in radio range, with LQI computed
+    from distance (see get_link_quality), and node parent is the node from
+    which it joins the network through a link with PARENT_LQI or more. Nodes
+    of random positions that can not join the network are moved into radio
+    range of their nearest connected node, so every node reaches the
+    coordinator through almost lossless links.
+
+    Args:
+        topology: network topology. Values can be:
+            "grid": nodes in a square grid with distance 1.
+            "geometric": nodes in random positions of a square area.
+            "tree": nodes with up to children nodes linked to parent.
+            "clustered": nodes in random positions around cluster centers.
+        total: amount of nodes (maximum of MAX_PAN_NODES).
+        pan_number: PAN number used to create PAN data and node EUIs.
+        seed: random generator seed (None uses system random seed).
+        radio_range: maximum link distance.
+        options: topology options:
+            degree: average amount of node neighbours of "geometric" and
+                "clustered" topologies (default 8).
+            cluster_size: amount of nodes per cluster of "clustered"
+                topology (default 100).
+            children: amount of child nodes of "tree" topology (default 4).
+
+    Returns:
+        Dictionary with "nodes", "links" and "pan" data, in the format used
+        by ETRX3xSimulator zbnet_list.
+
+    Raises:
+        ValueError for invalid topology or amount of nodes.
+    """
+    if(topology not in TOPOLOGIES):
+        raise ValueError("invalid topology {!r}".format(topology))
+
+    if(total < 1 or total > MAX_PAN_NODES):
+        raise ValueError("invalid amount of PAN nodes {}".format(total))
+
+    rnd = random.Random(seed)
+
+    if(topology == "tree"):
+        parents, links = _create_tree(total, rnd, radio_range, **options)
+    else:
+        if(topology == "grid"):
+            positions = _grid_positions(total, rnd, radio_range, **options)
+        elif(topology == "geometric"):
+            positions = _geometric_positions(
+                total, rnd, radio_range, **options)
+        else:
+            positions = _clustered_positions(
+                total, rnd, radio_range, **options)
+
+        links = _create_links(positions, radio_range)
+        parents = _get_parents(total, links)
+
+        if(_attach_orphans(
+                positions, links, parents, rnd, radio_range) is True):
+            links = _create_links(positions, radio_range)
+            parents = _get_parents(total, links)
+
+    return _create_zbnet(pan_number, parents, links)
+
+
+def create_networks(topology, total, seed=None, **options):
+    """Create ZigBee network structures of any size.
+
+    Networks with more than MAX_PAN_NODES nodes are split in several PANs
+    with the same topology.
+
+    Args:
+        topology: network topology (see create_pan_network).
+        total: amount of nodes of all PANs.
+        seed: random generator seed (None uses system random seed).
+        options: create_pan_network options.
+
+    Returns:
+        List of network dictionaries (zbnet_list of ETRX3xSimulator).
+    """
+    rnd = random.Random(seed)
+
+    zbnet_list = []
+    pan_number = 0
+    while(total > 0):
+        pan_total = min(total, MAX_PAN_NODES)
+
+        zbnet_list.append(create_pan_network(
+            topology, pan_total, pan_number=pan_number,
+            seed=rnd.random(), **options))
+
+        total -= pan_total
+        pan_number += 1
+
+    return zbnet_list
+
+
+def _str_object(pairs):
+    # JSON strings are decoded as unicode and network data is ASCII
+    return dict([(str(key), str(value) if type(value) == unicode else value)
+                 for key, value in pairs])
+
+
+class _JSONStreamReader(object):
+    # Incremental reader of JSON file: values are decoded one by one from a
+    # buffer filled with file chunks, so only the current value and the
+    # current chunk are kept in memory
+
+    def __init__(self, json_file, chunk_size):
+        self.file = json_file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder(object_pairs_hook=_str_object)
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        if(self.eof is True):
+            return False
+
+        chunk = self.file.read(self.chunk_size)
+        if(len(chunk) == 0):
+            self.eof = True
+            return False
+
+        # Discard decoded data
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while(True):
+            while(self.pos < len(self.buffer) and
+                    self.buffer[self.pos] in " \t\r\n"):
+                self.pos += 1
+
+            if(self.pos < len(self.buffer)):
+                return self.buffer[self.pos]
+
+            if(self._fill() is False):
+                raise ValueError("unexpected end of JSON file")
+
+    def expect(self, chars):
+        char = self.peek()
+        if(char not in chars):
+            raise ValueError(
+                "invalid JSON character {!r}, expected {!r}".format(
+                    char, chars))
+
+        self.pos += 1
+        return char
+
+    def read_value(self):
+        self.peek()
+
+        while(True):
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+
+                # A number or literal in buffer end can be incomplete
+                if(end < len(self.buffer) or self.eof is True):
+                    self.pos = end
+                    return value
+            except ValueError:
+                if(self.eof is True):
+                    raise
+
+            self._fill()
+
+
+def read_topology_file(json_file, chunk_size=65536):
+    """Read ZigBee networks from JSON topology file.
+
+    The file contains a list of networks in zbnet_list format. Each network
+    is an object with "pan", "nodes" and "links" keys, in this order. The
+    file is read in chunks and the networks data is returned item by item,
+    so the whole file is never stored in memory.
+
+    Args:
+        json_file: file object opened for reading.
+        chunk_size: size of file chunks in bytes.
+
+    Returns:
+        Iterator of (item_type, data) tuples, where item_type is "pan" (PAN
+        dictionary), "node" (node dictionary), "link" (link dictionary) or
+        "end" (end of network, data is None).
+
+    Raises:
+        ValueError for invalid JSON format or keys order.
+    """
+    reader = _JSONStreamReader(json_file, chunk_size)
+
+    reader.expect("[")
+    if(reader.peek() == "]"):
+        return
+
+    # Keys read before each network key: nodes are created with PAN data
+    # and links with nodes
+    required_keys = {"pan": [], "nodes": ["pan"], "links": ["pan", "nodes"]}
+
+    while(True):
+        reader.expect("{")
+
+        # Keys already read of current network
+        keys = []
+        if(reader.peek() != "}"):
+            while(True):
+                key = reader.read_value()
+                if(isinstance(key, basestring) is False):
+                    raise ValueError("invalid network key {!r}".format(key))
+                reader.expect(":")
+
+                if(key in required_keys):
+                    if(keys != required_keys[key]):
+                        raise ValueError(
+                            "network {!r} must be after {!r}".format(
+                                key, required_keys[key]))
+                    keys.append(key)
+
+                if(key == "pan"):
+                    yield ("pan", reader.read_value())
+
+                elif(key in ("nodes", "links")):
+                    item_type = key[:-1]
+                    reader.expect("[")
+                    if(reader.peek() != "]"):
+                        while(True):
+                            yield (item_type, reader.read_value())
+                            if(reader.expect(",]") == "]"):
+                                break
+                    else:
+                        reader.expect("]")
+
+                else:
+                    # Unknown network data is ignored
+                    reader.read_value()
+
+                if(reader.expect(",}") == "}"):
+                    break
+        else:
+            reader.expect("}")
+
+        yield ("end", None)
+
+        if(reader.expect(",]") == "]"):
+            break
+
+
+def write_topology_file(zbnet_list, json_file):
+    """Write ZigBee networks to JSON topology file.
+
+    The file can be read by read_topology_file.
+
+    Args:
+        zbnet_list: list of networks (see create_networks).
+        json_file: file object opened for writing.
+    """
+    json_file.write("[")
+    for i, zbnet in enumerate(zbnet_list):
+        if(i > 0):
+            json_file.write(",")
+
+        json_file.write("\n{\"pan\": " + json.dumps(zbnet["pan"]))
+        for key in ("nodes", "links"):
+            json_file.write(",\n\"{}\": [".format(key))
+            for j, item in enumerate(zbnet[key]):
+                if(j > 0):
+                    json_file.write(",")
+                json_file.write("\n" + json.dumps(item))
+            json_file.write("]")
+        json_file.write("}")
+
+    json_file.write("]\n")
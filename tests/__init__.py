@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from lib.zigbee import ZigBeeNetwork
+
+
+def create_network(zbnet):
+    """Create ZigBeeNetwork from a network structure.
+
+    Args:
+        zbnet: network dictionary (see zigbee_topology.create_pan_network).
+
+    Returns:
+        ZigBeeNetwork object with nodes and links (in both directions).
+    """
+    net = ZigBeeNetwork()
+    for node in zbnet["nodes"]:
+        net.add_node(node["eui"], node_type=node["type"], node_id=node["id"],
+                     registers=[])
+
+    for link in zbnet["links"]:
+        net.add_link(link["id_src"], link["id_dst"], lqi=link["lqi"])
+        net.add_link(link["id_dst"], link["id_src"], lqi=link["lqi"])
+
+    return net
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import unittest
+
+from lib.etrx3x_event_loop import ETRX3xEventLoop
+from lib.etrx3x_scheduler import ETRX3xVirtualClock
+
+
+class TestVirtualClock(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = ETRX3xEventLoop(clock=ETRX3xVirtualClock())
+        self.calls = []
+
+    def _run(self, total, function):
+        def event():
+            function()
+            self.calls.append(self.loop.time())
+            if(len(self.calls) < total):
+                self.loop.call_later(1, event)
+            else:
+                self.loop.stop()
+
+        start = self.loop.time()
+        self.loop.call_later(1, event)
+        self.loop.run_forever()
+
+        return start
+
+    def test_idle_periods_take_no_real_time(self):
+        wall = time.time()
+        start = self._run(600, lambda: None)
+
+        self.assertLess(time.time() - wall, 1.0)
+        self.assertGreaterEqual(self.calls[-1] - start, 600)
+
+    def test_clock_jumps_after_output(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+
+        def write_ready():
+            os.write(write_fd, "ACK:00\r\n")
+            self.loop.remove_writer(write_fd)
+
+        wall = time.time()
+        self._run(
+            200, lambda: self.loop.add_writer(write_fd, write_ready))
+
+        # Output of last event is pending when loop stops
+        self.assertLess(time.time() - wall, 1.0)
+        self.assertEqual(len(os.read(read_fd, 4096)), 199 * 8)
+
+    def test_clock_waits_for_more_input(self):
+        read_fd, write_fd = os.pipe()
+        self.addCleanup(os.close, read_fd)
+        self.addCleanup(os.close, write_fd)
+
+        def read_ready():
+            data = os.read(read_fd, 4096)
+            self.calls.append((data, self.loop.time() - start))
+            if(data == "AT\r"):
+                # Host sends next command after 2 ms of real time
+                timer = threading.Timer(0.002, os.write, [write_fd, "ATI\r"])
+                timer.start()
+                self.addCleanup(timer.join)
+
+        self.loop.add_reader(read_fd, read_ready)
+        self.loop.call_later(3600, self.loop.stop)
+        os.write(write_fd, "AT\r")
+
+        start = self.loop.time()
+        self.loop.run_forever()
+
+        # Next command is read before the clock jumps to the stop event
+        self.assertEqual([call[0] for call in self.calls], ["AT\r", "ATI\r"])
+        self.assertLess(self.calls[1][1], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import signal
+import socket
+import tempfile
+import time
+import unittest
+
+from lib.etrx3x_forkserver import ETRX3xForkServer
+
+
+class FakeModel(object):
+
+    def __init__(self):
+        self.seed = 1
+
+
+class FakeSimulator(object):
+
+    def __init__(self, error=None):
+        self.latency_model = FakeModel()
+        self.loss_model = FakeModel()
+        self.error = error
+
+    def open_serial(self):
+        return "/dev/null"
+
+    def start(self, event_loop=False, virtual_clock=False):
+        if(self.error is not None):
+            raise self.error
+
+
+class TestETRX3xForkServer(unittest.TestCase):
+
+    def setUp(self):
+        self.reaper = signal.getsignal(signal.SIGCHLD)
+        self.stderr = tempfile.TemporaryFile()
+
+    def tearDown(self):
+        signal.signal(signal.SIGCHLD, self.reaper)
+        self.stderr.close()
+
+    def _start(self, simulator, reap=False):
+        server = ETRX3xForkServer(simulator, None)
+        server.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.addCleanup(server.server.close)
+
+        if(reap is True):
+            # As serve_forever
+            signal.signal(signal.SIGCHLD, server._reap_children)
+
+        conn, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+
+        # Child traceback is written to a file
+        stderr = os.dup(2)
+        os.dup2(self.stderr.fileno(), 2)
+        try:
+            server._start_simulator(conn)
+        finally:
+            os.dup2(stderr, 2)
+            os.close(stderr)
+            conn.close()
+
+        self.assertTrue(peer.recv(256).startswith("OK "))
+        return server
+
+    def _wait(self, server):
+        pid = list(server.children)[0]
+        return os.waitpid(pid, 0)[1]
+
+    def test_child_exit_status(self):
+        server = self._start(FakeSimulator())
+        self.assertEqual(os.WEXITSTATUS(self._wait(server)), 0)
+
+    def test_child_error_is_reported(self):
+        server = self._start(FakeSimulator(error=RuntimeError("failed")))
+        self.assertEqual(os.WEXITSTATUS(self._wait(server)), 1)
+
+        self.stderr.seek(0)
+        self.assertIn("RuntimeError: failed", self.stderr.read())
+
+    def test_exited_child_is_not_kept(self):
+        fork = os.fork
+
+        def slow_fork():
+            # Child exits before fork returns to the server
+            pid = fork()
+            if(pid != 0):
+                time.sleep(0.2)
+            return pid
+
+        os.fork = slow_fork
+        try:
+            server = self._start(FakeSimulator(), reap=True)
+        finally:
+            os.fork = fork
+
+        # SIGCHLD handler reaps the child
+        deadline = time.time() + 5
+        while(len(server.children) > 0 and time.time() < deadline):
+            time.sleep(0.01)
+        self.assertEqual(server.children, set())
+
+    def test_virtual_clock_requires_event_loop(self):
+        self.assertRaises(ValueError, ETRX3xForkServer, FakeSimulator(),
+                          None, virtual_clock=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from lib.etrx3x_output import ETRX3xOutputQueue
+
+
+def get_all(queue):
+    messages = []
+    while(True):
+        message = queue.get_nowait()
+        if(message is None):
+            return messages
+        messages.append(message)
+
+
+class TestBlockPolicy(unittest.TestCase):
+
+    def test_full_queue_is_blocked(self):
+        queue = ETRX3xOutputQueue(max_size=2)
+        queue.put("OK", block=False)
+        self.assertFalse(queue.is_blocked())
+
+        queue.put("N1", block=False, notification=True)
+        self.assertTrue(queue.is_blocked())
+        self.assertTrue(queue.is_blocked(notification=True))
+
+        # Non blocking producer queues over the limit
+        self.assertTrue(queue.put("N2", block=False, notification=True))
+        self.assertEqual(queue.get_stats(),
+                         {"depth": 3, "high_water": 3, "drops": 0})
+
+        queue.get_nowait()
+        queue.get_nowait()
+        self.assertFalse(queue.is_blocked())
+
+    def test_unbounded_queue(self):
+        queue = ETRX3xOutputQueue()
+        for i in range(1000):
+            queue.put(str(i), notification=True)
+        self.assertFalse(queue.is_blocked())
+        self.assertEqual(get_all(queue), [str(i) for i in range(1000)])
+
+
+class TestDropOldestPolicy(unittest.TestCase):
+
+    def test_oldest_notification_is_dropped(self):
+        queue = ETRX3xOutputQueue(max_size=3, policy="drop_oldest")
+        queue.put("OK", block=False)
+        queue.put("N1", block=False, notification=True)
+        queue.put("SEQ:01", block=False)
+        queue.put("N2", block=False, notification=True)
+
+        self.assertEqual(get_all(queue), ["OK", "SEQ:01", "N2"])
+        self.assertEqual(queue.get_total_drops(), 1)
+        self.assertEqual(queue.get_high_water(), 3)
+
+    def test_response_drops_notification(self):
+        queue = ETRX3xOutputQueue(max_size=2, policy="drop_oldest")
+        queue.put("N1", block=False, notification=True)
+        queue.put("N2", block=False, notification=True)
+        self.assertFalse(queue.is_blocked())
+
+        queue.put("ACK:01", block=False)
+        self.assertEqual(get_all(queue), ["N2", "ACK:01"])
+
+    def test_responses_are_never_dropped(self):
+        queue = ETRX3xOutputQueue(max_size=2, policy="drop_oldest")
+        queue.put("OK", block=False)
+        queue.put("SEQ:01", block=False)
+
+        # Only responses are queued: new notification is dropped and new
+        # responses are held
+        self.assertFalse(queue.put("N1", block=False, notification=True))
+        self.assertFalse(queue.is_blocked(notification=True))
+        self.assertTrue(queue.is_blocked())
+
+        queue.put("NACK:01", block=False)
+        self.assertEqual(get_all(queue), ["OK", "SEQ:01", "NACK:01"])
+        self.assertEqual(queue.get_total_drops(), 1)
+
+    def test_dropped_notifications_are_compacted(self):
+        queue = ETRX3xOutputQueue(max_size=10, policy="drop_oldest")
+        queue.put("OK", block=False)
+        for i in range(10000):
+            queue.put(str(i), block=False, notification=True)
+
+        self.assertEqual(queue.get_depth(), 10)
+        self.assertLess(len(queue.messages), 200)
+        self.assertEqual(get_all(queue),
+                         ["OK"] + [str(i) for i in range(9991, 10000)])
+
+
+class TestErrorPolicy(unittest.TestCase):
+
+    def test_overflow_message_is_within_bound(self):
+        queue = ETRX3xOutputQueue(max_size=3, policy="error",
+                                  overflow_message="ERROR:18")
+        for i in range(5):
+            queue.put(str(i), block=False, notification=True)
+
+        self.assertEqual(queue.get_high_water(), 3)
+        self.assertEqual(queue.get_total_drops(), 3)
+        self.assertEqual(get_all(queue), ["0", "1", "ERROR:18"])
+
+    def test_overflow_message_is_sent_once_per_overflow(self):
+        queue = ETRX3xOutputQueue(max_size=2, policy="error",
+                                  overflow_message="ERROR:18")
+        for i in range(3):
+            queue.put(str(i), block=False, notification=True)
+        self.assertEqual(get_all(queue), ["0", "ERROR:18"])
+
+        for i in range(3):
+            queue.put(str(i), block=False, notification=True)
+        self.assertEqual(get_all(queue), ["0", "ERROR:18"])
+
+    def test_responses_are_never_dropped(self):
+        queue = ETRX3xOutputQueue(max_size=2, policy="error",
+                                  overflow_message="ERROR:18")
+        queue.put("OK", block=False)
+        queue.put("SEQ:01", block=False)
+        self.assertTrue(queue.is_blocked())
+        self.assertFalse(queue.is_blocked(notification=True))
+
+        queue.put("ACK:01", block=False)
+        self.assertEqual(get_all(queue), ["OK", "SEQ:01", "ACK:01"])
+
+
+class TestClose(unittest.TestCase):
+
+    def test_close_releases_blocked_producer(self):
+        queue = ETRX3xOutputQueue(max_size=1)
+        queue.put("OK")
+
+        result = []
+        producer = threading.Thread(
+            target=lambda: result.append(queue.put("SEQ:01")))
+        producer.start()
+
+        queue.close()
+        producer.join(5)
+        self.assertFalse(producer.is_alive())
+        self.assertEqual(result, [False])
+
+        # Queued messages are still available
+        self.assertEqual(get_all(queue), ["OK"])
+        self.assertFalse(queue.put("ACK:01"))
+
+    def test_closed_empty_queue_does_not_wait(self):
+        queue = ETRX3xOutputQueue()
+        queue.close()
+        self.assertIsNone(queue.get())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import unittest
+
+from lib.etrx3x_scheduler import ETRX3xScheduler
+from lib.etrx3x_scheduler import ETRX3xVirtualClock
+
+
+class ManualClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class TestETRX3xVirtualClock(unittest.TestCase):
+
+    def test_advance(self):
+        clock = ETRX3xVirtualClock()
+        start = clock.time()
+
+        clock.advance(3600)
+        self.assertGreaterEqual(clock.time() - start, 3600)
+        self.assertLess(clock.time() - start, 3601)
+
+    def test_negative_advance_is_ignored(self):
+        clock = ETRX3xVirtualClock()
+        clock.advance(-10)
+        self.assertEqual(clock.offset, 0)
+
+
+class TestETRX3xScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = ManualClock()
+        self.scheduler = ETRX3xScheduler(clock=self.clock.time)
+        self.calls = []
+
+    def test_events_run_in_deadline_order(self):
+        self.scheduler.call_later(2, self.calls.append, "b")
+        self.scheduler.call_later(1, self.calls.append, "a")
+        self.scheduler.call_later(3, self.calls.append, "c")
+        self.assertEqual(self.scheduler.get_next_deadline(), 1001.0)
+
+        self.clock.now += 2
+        self.assertEqual(self.scheduler.run_pending(), 2)
+        self.assertEqual(self.calls, ["a", "b"])
+        self.assertEqual(self.scheduler.get_next_deadline(), 1003.0)
+
+    def test_same_deadline_is_fifo(self):
+        for i in range(10):
+            self.scheduler.call_later(1, self.calls.append, i)
+
+        self.clock.now += 1
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, range(10))
+
+    def test_cancelled_event_is_not_run(self):
+        event = self.scheduler.call_later(1, self.calls.append, "a")
+        self.scheduler.call_later(2, self.calls.append, "b")
+        self.scheduler.cancel(event)
+
+        self.assertEqual(self.scheduler.get_next_deadline(), 1002.0)
+        self.clock.now += 2
+        self.assertEqual(self.scheduler.run_pending(), 1)
+        self.assertEqual(self.calls, ["b"])
+        self.assertIsNone(self.scheduler.get_next_deadline())
+
+    def test_event_can_schedule_events(self):
+        def event():
+            self.calls.append("a")
+            self.scheduler.call_later(0, self.calls.append, "b")
+
+        self.scheduler.call_later(0, event)
+        self.scheduler.run_pending()
+        self.assertEqual(self.calls, ["a", "b"])
+
+    def test_transfer(self):
+        other = ETRX3xScheduler(clock=self.clock.time)
+        self.scheduler.call_later(2, self.calls.append, "b")
+        event = self.scheduler.call_later(1, self.calls.append, "a")
+        self.scheduler.transfer(other)
+
+        self.assertEqual(self.scheduler.get_total_events(), 0)
+        self.assertEqual(other.get_next_deadline(), 1001.0)
+
+        # Transferred events can still be cancelled
+        other.cancel(event)
+        self.clock.now += 2
+        other.run_pending()
+        self.assertEqual(self.calls, ["b"])
+
+    def test_scheduler_thread(self):
+        scheduler = ETRX3xScheduler()
+        done = threading.Event()
+        scheduler.call_later(0.01, done.set)
+
+        scheduler.start()
+        try:
+            self.assertTrue(done.wait(5))
+        finally:
+            scheduler.stop()
+
+    def test_stop_waits_for_running_event(self):
+        scheduler = ETRX3xScheduler()
+        started = threading.Event()
+
+        def event():
+            started.set()
+            threading.Event().wait(0.2)
+            self.calls.append("done")
+
+        scheduler.call_later(0, event)
+        scheduler.start()
+        self.assertTrue(started.wait(5))
+
+        scheduler.stop()
+        self.assertFalse(scheduler.thread.is_alive())
+        self.assertEqual(self.calls, ["done"])
+
+    def test_event_can_stop_scheduler(self):
+        scheduler = ETRX3xScheduler()
+        scheduler.call_later(0, scheduler.stop)
+        scheduler.start()
+
+        scheduler.thread.join(5)
+        self.assertFalse(scheduler.thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
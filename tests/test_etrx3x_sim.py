@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import StringIO
+import os
+import sys
+import tempfile
+import unittest
+
+from lib.etrx3x_scheduler import ETRX3xScheduler
+from lib.etrx3x_sim import ETRX3xSimulator
+from lib.etrx3x_sim import ETRX3xSimulatorException
+from lib.zigbee_radio import ZigBeeLatencyModel
+from lib.zigbee_radio import ZigBeeLossModel
+from lib.zigbee_topology import write_topology_file
+
+# SRegisters used by the tested commands
+ROUTER_SREGS = {
+    "00": "8000",
+    "01": "-07",
+    "03": "0000000000000000",
+    "0A": "8114",
+    "0F": "01F8",
+    "10": "0008",
+    "3C": "0000000000000;SGFake;1.0;0",
+    "4F": "1770"
+}
+
+COO_SREGS = dict(ROUTER_SREGS, **{"0A": "0114", "10": "2218"})
+
+# Default network of simulator command line
+ZBNET = {
+    "nodes": [
+        {"id": "0000", "eui": "ED00010000000000", "type": "COO",
+         "parent_id": "FFFF", "sregs": {"3C": "5600010000000;SGFake;1.0;0"}},
+        {"id": "0001", "eui": "ED00010000000001", "type": "FFD",
+         "parent_id": "0000", "sregs": {"3C": "5600010000001;SGFake;1.0;0"}}
+    ],
+    "links": [{"id_src": "0000", "id_dst": "0001", "lqi": 255}],
+    "pan": {
+        "channel": 26,
+        "id": "0001",
+        "eid": "E000000000000001",
+        "netkey": "00000000000000000000000000000001",
+        "linkkey": "00000000000000000000000000000001"
+    }
+}
+
+N_RESPONSE = "\r\n+N=COO,26,-07,0001,E000000000000001\r\n\r\nOK\r\n"
+
+NTABLE_RESPONSE = \
+    "\r\nNTable:0001,00\r\nLength:01\r\n" \
+    "No. | Dev |       EUI        |  ID  | LQI\r\n" \
+    "00. | COO | ED00010000000000 | 0000 | FF\r\n"
+
+
+class ManualClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+class TestETRX3xSimulatorCommands(unittest.TestCase):
+    """Responses of each command grammar (as before the command table).
+    """
+
+    def setUp(self):
+        # Simulator prints every command
+        self.stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+
+        self.sim = ETRX3xSimulator(
+            [ZBNET], "ED00010000000000", "E000000000000001",
+            router_etrx3x_sregs=ROUTER_SREGS, coo_etrx3x_sregs=COO_SREGS,
+            latency_model=ZigBeeLatencyModel(seed=1),
+            loss_model=ZigBeeLossModel(seed=1))
+
+        # Delayed responses are run by hand
+        self.clock = ManualClock()
+        self.sim.scheduler = ETRX3xScheduler(clock=self.clock.time)
+
+        self.output = []
+        self.sim.write_serial = \
+            lambda message, notification=False: self.output.append(message)
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def send(self, command):
+        del self.output[:]
+        self.sim.input_buffer += command + "\r"
+        self.sim._process_input()
+
+        self.clock.now += 60
+        self.sim.scheduler.run_pending()
+
+        return "".join(self.output)
+
+    def assertResponses(self, responses):
+        for command, response in responses:
+            self.assertEqual(self.send(command), response, command)
+
+    def test_basic_commands(self):
+        self.assertResponses([
+            ("AT", "\r\nOK\r\n"),
+            ("ATI", "\r\nTelegesis ETRX357-Fake\r\nR309C\r\n"
+             "ED00010000000000\r\n\r\nOK\r\n"),
+            ("ATZ", "\r\nOK\r\n"),
+            ("at", "\r\nOK\r\n"),
+            ("AT+N?", N_RESPONSE),
+            ("AT+PANSCAN",
+             "\r\n+PANSCAN:26,0001,E000000000000001,02,01\r\n\r\nOK\r\n"),
+            ("AT+ATABLE", "\r\nNo. | Active |  ID  | EUI\r\n" + "".join(
+                "{:02}  |   N    | FFFF |FFFFFFFFFFFFFFFF\r\n".format(i)
+                for i in range(7)) + "\r\n")
+        ])
+
+    def test_sregister_commands(self):
+        self.assertResponses([
+            ("ATS", "\r\nERROR:05\r\n"),
+            ("ATS4F?", "\r\n1770\r\n\r\nOK\r\n"),
+            ("ATS03?", "\r\nE000000000000001\r\n\r\nOK\r\n"),
+            ("ATS030?", "\r\nE000000000000001\r\n\r\nOK\r\n"),
+            ("ATS4F=1000", "\r\nOK\r\n"),
+            ("ATS4F?", "\r\n1000\r\n\r\nOK\r\n"),
+            ("ATS4F=ZZZZ", "\r\nERROR:05\r\n"),
+            ("ATSZ", "\r\nERROR:02\r\n"),
+            ("ATS1", "\r\nERROR:05\r\n")
+        ])
+
+    def test_sregister_bit_commands(self):
+        # atsXXP? and atsXXPP? read bit P of SRegister XX (S00 = 8000,
+        # S0A = 0114 and S0F = 01F8)
+        self.assertResponses([
+            ("ATS000F?", "\r\n1\r\n\r\nOK\r\n"),
+            ("ATS0000?", "\r\n0\r\n\r\nOK\r\n"),
+            ("ATS00F?", "\r\n1\r\n\r\nOK\r\n"),
+            ("ATS000?", "\r\n0\r\n\r\nOK\r\n"),
+            ("ATS0A8?", "\r\n1\r\n\r\nOK\r\n"),
+            ("ATS0F0?", "\r\n0\r\n\r\nOK\r\n"),
+            ("ATS0F3?", "\r\n1\r\n\r\nOK\r\n"),
+            ("ATS0F8?", "\r\n1\r\n\r\nOK\r\n"),
+            ("ATS0F9?", "\r\n0\r\n\r\nOK\r\n"),
+            ("ATS0010?", "\r\nERROR:05\r\n"),
+            ("ATS0F000F?", "\r\nERROR:05\r\n"),
+            # SRegisters without bits are read in full
+            ("ATS03F?", "\r\nE000000000000001\r\n\r\nOK\r\n"),
+            ("ATS01F?", "\r\n-07\r\n\r\nOK\r\n")
+        ])
+
+    def test_sregister_bit_commands_after_write(self):
+        self.assertResponses([
+            ("ATS0F=0001", "\r\nOK\r\n"),
+            ("ATS0F?", "\r\n0001\r\n\r\nOK\r\n"),
+            ("ATS0F0?", "\r\n1\r\n\r\nOK\r\n"),
+            ("ATS0F3?", "\r\n0\r\n\r\nOK\r\n"),
+            ("ATS0F=FFFF", "\r\nOK\r\n"),
+            ("ATS0F9?", "\r\n1\r\n\r\nOK\r\n"),
+            ("ATS0F=ZZ", "\r\nERROR:05\r\n"),
+            ("ATS0F?", "\r\nFFFF\r\n\r\nOK\r\n")
+        ])
+
+    def test_ntable_commands(self):
+        self.assertResponses([
+            ("AT+NTABLE:00,FF",
+             "\r\nSEQ:00\r\n\r\nOK\r\n\r\nNTable:0000,00\r\nLength:01\r\n"
+             "No. | Dev |       EUI        |  ID  | LQI\r\n"
+             "00. | FFD | ED00010000000001 | 0001 | FF\r\n\r\nACK:00\r\n"),
+            ("AT+NTABLE:00,0001",
+             "\r\nSEQ:01\r\n\r\nOK\r\n" + NTABLE_RESPONSE +
+             "\r\nACK:01\r\n"),
+            ("AT+NTABLE:00,ED00010000000001",
+             "\r\nSEQ:02\r\n\r\nOK\r\n" + NTABLE_RESPONSE +
+             "\r\nACK:02\r\n"),
+            ("AT+NTABLE:00,00", "\r\nERROR:01\r\n"),
+            ("AT+NTABLE:00,0009", "\r\nSEQ:03\r\n\r\nOK\r\n\r\nNACK:03\r\n")
+        ])
+
+    def test_ucast_commands(self):
+        self.assertResponses([
+            ("AT+UCAST:0001,hi", "\r\nSEQ:00\r\n\r\nOK\r\n\r\nACK:00\r\n"),
+            ("AT+UCAST:0009,hi", "\r\nSEQ:01\r\n\r\nOK\r\n\r\nNACK:01\r\n"),
+            ("AT+UCAST:ED00010000000001,hi",
+             "\r\nSEQ:02\r\n\r\nOK\r\n\r\nACK:02\r\n"),
+            ("AT+UCAST:FF,hi", "\r\nSEQ:03\r\n\r\nOK\r\n\r\nACK:03\r\n"),
+            ("AT+UCAST:01,hi", "\r\nERROR:01\r\n"),
+            ("AT+UCAST:zz", "\r\nERROR:02\r\n"),
+            ("AT+UCASTB:01,0001", "\r\nERROR:05\r\n")
+        ])
+
+    def test_remote_sregister_commands(self):
+        self.assertResponses([
+            ("ATREMS:0001,3C?",
+             "\r\nSEQ:00\r\n\r\nOK\r\n\r\nACK:00\r\n"
+             "\r\nSREAD:0001,ED00010000000001,3C,00="
+             "5600010000001;SGFake;1.0;0\r\n"),
+            ("ATREMS:FF,4F?", "\r\n1770\r\n\r\nOK\r\n"),
+            ("ATREMS:01,4F?", "\r\nERROR:01\r\n"),
+            ("ATREMS:0009,4F?", "\r\nSEQ:01\r\n\r\nOK\r\n\r\nNACK:01\r\n")
+        ])
+
+    def test_prefix_fallback(self):
+        # Unknown names run the longest registered command name prefix
+        self.assertResponses([
+            ("AT+N", N_RESPONSE),
+            ("AT+NNNN", N_RESPONSE),
+            ("AT+NTABLE", N_RESPONSE),
+            ("AT+NTABLE:zz", N_RESPONSE),
+            ("AT+NXYZ:01", N_RESPONSE),
+            ("AT+PANSCANX",
+             "\r\n+PANSCAN:26,0001,E000000000000001,02,01\r\n\r\nOK\r\n")
+        ])
+
+    def test_unknown_commands(self):
+        self.assertResponses([
+            ("AT+FOO", "\r\nERROR:02\r\n"),
+            ("AT+", "\r\nERROR:02\r\n"),
+            ("AT+TOKDUMPX", "\r\nERROR:02\r\n"),
+            ("ATIX", "\r\nERROR:02\r\n"),
+            ("ATZ1", "\r\nERROR:02\r\n"),
+            ("AT+UCASTX:01,hi", "\r\nERROR:02\r\n"),
+            ("AT+UCASTB:01", "\r\nERROR:02\r\n"),
+            ("ATREMSX", "\r\nERROR:02\r\n"),
+            ("ATX", "")
+        ])
+
+    def test_registered_command(self):
+        self.sim.register_command(
+            "at+echo", ":[0-9a-z]+", lambda command: "\r\nECHO\r\n")
+
+        self.assertResponses([
+            ("AT+ECHO:abc", "\r\nECHO\r\n"),
+            ("AT+ECHO", "\r\nERROR:02\r\n"),
+            ("AT+N", N_RESPONSE)
+        ])
+
+
+class TestETRX3xSimulatorClose(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+
+        self.sim = ETRX3xSimulator(
+            [ZBNET], "ED00010000000000", "E000000000000001",
+            router_etrx3x_sregs=ROUTER_SREGS, coo_etrx3x_sregs=COO_SREGS)
+        self.listeners = self.sim.local_zb_network.link_listeners
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+
+    def test_module_of_other_node(self):
+        module = self.sim.add_local_module("ED00010000000001")
+        self.assertIsNot(module.routing_engine, self.sim.routing_engine)
+        self.assertEqual(len(self.listeners), 2)
+
+        module.close()
+        self.assertEqual(
+            self.listeners, [self.sim.routing_engine.link_changed])
+
+    def test_module_of_same_node(self):
+        # Shared engine is detached only by its owner
+        module = self.sim.add_local_module("ED00010000000000")
+        self.assertIs(module.routing_engine, self.sim.routing_engine)
+
+        module.close()
+        self.assertEqual(len(self.listeners), 1)
+
+        self.sim.close()
+        self.assertEqual(self.listeners, [])
+
+
+class TestETRX3xSimulatorTopologyFile(unittest.TestCase):
+
+    def setUp(self):
+        self.stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+
+        fd, self.topology_file = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, "w") as json_file:
+            write_topology_file([ZBNET], json_file)
+
+    def tearDown(self):
+        sys.stdout = self.stdout
+        os.unlink(self.topology_file)
+
+    def create_simulator(self, local_node_eui=None, local_pan_eid=None):
+        return ETRX3xSimulator(
+            None, local_node_eui, local_pan_eid,
+            router_etrx3x_sregs=ROUTER_SREGS, coo_etrx3x_sregs=COO_SREGS,
+            topology_file=self.topology_file)
+
+    def test_default_local_node(self):
+        sim = self.create_simulator()
+        self.assertEqual(sim.local_pan_eid, "E000000000000001")
+        self.assertEqual(sim.local_node.get_node_eui(), "ED00010000000000")
+
+    def test_local_node(self):
+        sim = self.create_simulator("ED00010000000001")
+        self.assertEqual(sim.local_node.get_node_id(), "0001")
+
+    def test_unknown_local_pan(self):
+        sim = self.create_simulator()
+        self.assertRaisesRegexp(
+            ETRX3xSimulatorException, "local PAN 'E000000000000009'",
+            sim._load_topology_file, self.topology_file, None,
+            "E000000000000009")
+
+    def test_unknown_local_node(self):
+        sim = self.create_simulator()
+        self.assertRaisesRegexp(
+            ETRX3xSimulatorException, "local node 'ED00010000000009'",
+            sim._load_topology_file, self.topology_file, "ED00010000000009",
+            None)
+
+    def test_invalid_topology_file(self):
+        with open(self.topology_file, "w") as json_file:
+            json_file.write('[{"pan": {}, "links": []}]')
+
+        sim = self.create_simulator("ED00010000000000", "E000000000000001")
+        self.assertFalse(hasattr(sim, "local_node"))
+        self.assertIn("invalid topology file", sys.stdout.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from lib.etrx3x_snapshot import SNAPSHOT_HEADER
+from lib.etrx3x_snapshot import load_snapshot
+from lib.etrx3x_snapshot import save_snapshot
+from lib.zigbee_routing import ZigBeeRoutingEngine
+from lib.zigbee_topology import create_pan_network
+from tests import create_network
+
+PAN_EID = "E000000000000001"
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "network.snap")
+
+        self.net = create_network(create_pan_network("grid", 200, seed=1))
+        for node in self.net.get_node_list():
+            for i in range(2):
+                node.add_address_entry("N", "FFFF", "FFFFFFFFFFFFFFFF")
+
+        self.engine = ZigBeeRoutingEngine(self.net, "0000")
+        save_snapshot(self.path, {PAN_EID: self.net}, None, PAN_EID,
+                      self.engine.get_state())
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write_payload(self, offset, data):
+        with open(self.path, "r+b") as snapshot:
+            snapshot.seek(offset)
+            snapshot.write(data)
+
+    def test_round_trip(self):
+        zb_networks, local_node_eui, local_pan_eid, routing_state = \
+            load_snapshot(self.path)
+        self.assertIsNone(local_node_eui)
+        self.assertEqual(local_pan_eid, PAN_EID)
+
+        net = zb_networks[PAN_EID]
+        self.assertEqual(len(net.get_node_list()),
+                         len(self.net.get_node_list()))
+
+        for node in self.net.get_node_list():
+            loaded = net.get_node(node.get_node_id())
+            self.assertEqual(loaded.get_node_eui(), node.get_node_eui())
+            self.assertEqual(loaded.get_address_table(),
+                             node.get_address_table())
+            self.assertEqual(
+                [(link.get_node_id_src(), link.get_node_id_dest(),
+                  link.get_quality()) for link in loaded.get_ntable()],
+                [(link.get_node_id_src(), link.get_node_id_dest(),
+                  link.get_quality()) for link in node.get_ntable()])
+
+            for link in loaded.get_ntable():
+                self.assertIs(loaded.get_neighbour(link.get_node_id_dest()),
+                              link)
+
+    def test_address_entries_are_not_shared(self):
+        net = load_snapshot(self.path)[0][PAN_EID]
+        net.get_node("0001").get_address_table()[0][0] = "Y"
+
+        self.assertEqual(net.get_node("0002").get_address_table()[0],
+                         ["N", "FFFF", "FFFFFFFFFFFFFFFF"])
+
+    def test_routing_state_is_restored(self):
+        zb_networks, _, _, routing_state = load_snapshot(self.path)
+        net = zb_networks[PAN_EID]
+
+        engine = ZigBeeRoutingEngine(net, "0000")
+        engine.set_state(routing_state)
+        self.assertTrue(engine.valid)
+
+        for node in net.get_node_list():
+            node_id = node.get_node_id()
+            self.assertEqual(engine.get_path(node_id),
+                             self.engine.get_path(node_id))
+
+            # Restored paths use loaded network links
+            for link in engine.get_path_links(node_id):
+                source = net.get_node(link.get_node_id_src())
+                self.assertIs(
+                    source.get_neighbour(link.get_node_id_dest()), link)
+
+        # Restored paths are repaired by link changes
+        node_id = engine.get_path("0011")[1]
+        net.update_link("0000", node_id, lqi=1)
+        net.update_link(node_id, "0000", lqi=1)
+        self.assertNotEqual(engine.get_path("0011")[1], node_id)
+
+    def test_routing_state_of_other_source(self):
+        routing_state = load_snapshot(self.path)[3]
+        engine = ZigBeeRoutingEngine(self.net, "0001")
+        self.assertRaises(ValueError, engine.set_state, routing_state)
+
+    def test_corrupted_payload_is_rejected(self):
+        self._write_payload(SNAPSHOT_HEADER.size + 100, "\xFF\xFF")
+        self.assertRaises(ValueError, load_snapshot, self.path)
+
+    def test_truncated_snapshot_is_rejected(self):
+        with open(self.path, "r+b") as snapshot:
+            snapshot.truncate(os.path.getsize(self.path) - 1)
+        self.assertRaises(ValueError, load_snapshot, self.path)
+
+        with open(self.path, "r+b") as snapshot:
+            snapshot.truncate(SNAPSHOT_HEADER.size - 1)
+        self.assertRaises(ValueError, load_snapshot, self.path)
+
+    def test_invalid_header_is_rejected(self):
+        self._write_payload(0, "NOTSNAP!")
+        self.assertRaises(ValueError, load_snapshot, self.path)
+
+    def test_other_version_is_rejected(self):
+        self._write_payload(8, "\xFF\xFF")
+        self.assertRaises(ValueError, load_snapshot, self.path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lib.etrx3x_at_cmds import ETRX3xATCommand
+from lib.zigbee import ZigBeeNode
+
+
+def get_pages(node):
+    # AT+NTABLE pages of 3 neighbours by index
+    at = ETRX3xATCommand()
+    neighbours = [
+        {"type": "FFD", "node_id": link.get_node_id_dest(),
+         "node_eui": "0" * 16, "signal": link.get_quality()}
+        for link in node.get_ntable()]
+
+    return [at.at_ntable_response(node.get_node_id(), "00", index, neighbours)
+            for index in range(0, len(neighbours), 3)]
+
+
+class TestZigBeeNodeNeighbours(unittest.TestCase):
+
+    def setUp(self):
+        self.node = ZigBeeNode("000D6F0000000000")
+        self.node.set_node_id("0000")
+        self.ids = ["{:04X}".format(i) for i in range(1, 21)]
+        for node_id in self.ids:
+            self.node.add_neighbour("0000", node_id, lqi=int(node_id, 16))
+
+    def get_ids(self):
+        return [link.get_node_id_dest() for link in self.node.get_ntable()]
+
+    def test_remove_keeps_insertion_order(self):
+        for node_id in ["0002", "000A", "000B", "0014"]:
+            link = self.node.remove_neighbour(node_id)
+            self.assertEqual(link.get_node_id_dest(), node_id)
+            self.ids.remove(node_id)
+
+        self.assertIsNone(self.node.remove_neighbour("0002"))
+        self.assertEqual(self.get_ids(), self.ids)
+
+        # Added neighbour is the last one
+        self.node.add_neighbour("0000", "0002", lqi=2)
+        self.assertEqual(self.get_ids(), self.ids + ["0002"])
+
+    def test_neighbour_lookup_after_removals(self):
+        for node_id in self.ids[:15]:
+            self.node.remove_neighbour(node_id)
+
+        self.assertIsNone(self.node.get_neighbour("0001"))
+        for node_id in self.ids[15:]:
+            link = self.node.get_neighbour(node_id)
+            self.assertEqual(link.get_node_id_dest(), node_id)
+            self.assertEqual(link.get_quality(), int(node_id, 16))
+
+        # Existing link is updated, not added again
+        self.node.add_neighbour("0000", "0014", lqi=200)
+        self.assertEqual(self.get_ids(), self.ids[15:])
+        self.assertEqual(self.node.get_neighbour("0014").get_quality(), 200)
+
+    def test_ntable_pages_after_removals(self):
+        expected = ZigBeeNode("000D6F0000000001")
+        expected.set_node_id("0000")
+
+        for i, node_id in enumerate(self.ids):
+            if(i % 3 == 1):
+                self.node.remove_neighbour(node_id)
+            else:
+                expected.add_neighbour("0000", node_id, lqi=int(node_id, 16))
+
+            # Pages are read between removals too
+            if(i % 4 == 0):
+                self.assertEqual(get_pages(self.node)[0].splitlines()[3],
+                                 get_pages(expected)[0].splitlines()[3])
+
+        self.assertEqual(get_pages(self.node), get_pages(expected))
+        self.assertEqual(len(get_pages(self.node)), 5)
+
+    def test_remove_all(self):
+        for node_id in reversed(self.ids):
+            self.node.remove_neighbour(node_id)
+
+        self.assertEqual(self.node.get_ntable(), [])
+        self.node.add_neighbour("0000", "0001")
+        self.assertEqual(self.get_ids(), ["0001"])
+
+
+if __name__ == "__main__":
+    unittest.main()
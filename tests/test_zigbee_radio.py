@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from lib.zigbee import ZigBeeLink
+from lib.zigbee_radio import ZigBeeLatencyModel
+from lib.zigbee_radio import ZigBeeLossModel
+from lib.zigbee_routing import LINK_DROP_TABLE
+from lib.zigbee_routing import ZigBeeRoutingEngine
+from lib.zigbee_routing import get_link_cost
+from lib.zigbee_topology import create_pan_network
+from tests import create_network
+
+
+def create_path(*lqis):
+    return tuple([ZigBeeLink("{:04X}".format(i), "{:04X}".format(i + 1), lqi)
+                  for i, lqi in enumerate(lqis)])
+
+
+class TestLinkDropTable(unittest.TestCase):
+
+    def test_drop_decreases_with_lqi(self):
+        for lqi in range(1, 256):
+            self.assertLessEqual(
+                LINK_DROP_TABLE[lqi], LINK_DROP_TABLE[lqi - 1])
+
+    def test_good_links_are_almost_lossless(self):
+        self.assertGreater(LINK_DROP_TABLE[30], 0.9)
+        self.assertLess(LINK_DROP_TABLE[100], 0.01)
+        self.assertLess(LINK_DROP_TABLE[150], 0.0001)
+
+    def test_link_drop_probability(self):
+        link = ZigBeeLink("0000", "0001", "8E")
+        self.assertEqual(link.get_drop_probability(), LINK_DROP_TABLE[0x8E])
+
+    def test_link_cost(self):
+        self.assertEqual(get_link_cost(255), 1)
+        self.assertEqual(get_link_cost(142), 1)
+        self.assertEqual(get_link_cost(28), 7)
+        self.assertEqual(get_link_cost(0), 7)
+
+    def test_latency_etx(self):
+        model = ZigBeeLatencyModel(max_attempts=4)
+        self.assertAlmostEqual(model.get_link_etx(255), 1.0)
+        self.assertEqual(model.get_link_etx(0), 4.0)
+
+
+class TestZigBeeLossModel(unittest.TestCase):
+
+    def test_local_node_is_delivered(self):
+        model = ZigBeeLossModel(seed=1)
+        self.assertEqual(model.send(()), [(True, 0)])
+
+    def test_delivery_probability(self):
+        model = ZigBeeLossModel(seed=1, max_attempts=4)
+        links = create_path(70, 200, 90)
+
+        # Message and acknowledgement cross each link
+        expected = 1.0
+        for link in links:
+            expected *= (1 - link.get_drop_probability() ** 4) ** 2
+
+        self.assertAlmostEqual(
+            model.get_delivery_probability(links), expected, places=6)
+
+    def test_pruned_distribution(self):
+        links = create_path(*([65, 80, 120, 255] * 20))
+        pruned = ZigBeeLossModel(seed=1)
+        exact = ZigBeeLossModel(seed=1, min_probability=0)
+
+        self.assertAlmostEqual(
+            pruned.get_delivery_probability(links),
+            exact.get_delivery_probability(links), places=5)
+        self.assertLess(
+            len(pruned._get_path_distribution(links)[1]),
+            len(exact._get_path_distribution(links)[1]))
+
+    def test_send_samples_distribution(self):
+        model = ZigBeeLossModel(seed=1)
+        links = create_path(65, 255)
+
+        outcomes = model.send(links, count=20000)
+        delivered = len([outcome for outcome in outcomes if outcome[0]])
+
+        self.assertAlmostEqual(
+            delivered / 20000.0, model.get_delivery_probability(links),
+            delta=0.02)
+
+        for delivered, transmissions in outcomes:
+            if(delivered is True):
+                self.assertTrue(4 <= transmissions <= 16)
+
+    def test_least_recently_used_path_is_evicted(self):
+        model = ZigBeeLossModel(seed=1, max_paths=2)
+        paths = [create_path(200), create_path(150), create_path(100)]
+
+        model.send(paths[0])
+        model.send(paths[1])
+        model.send(paths[0])
+        model.send(paths[2])
+
+        stored = [distribution[0] for distribution in model.paths.values()]
+        self.assertEqual(stored, [paths[0], paths[2]])
+
+
+class TestGeneratedNetworkDelivery(unittest.TestCase):
+
+    def test_default_grid_delivers_most_unicasts(self):
+        zbnet = create_pan_network("grid", 100, seed=1)
+        engine = ZigBeeRoutingEngine(create_network(zbnet), "0000")
+        model = ZigBeeLossModel(seed=1)
+
+        delivered = 0
+        for node in zbnet["nodes"][1:]:
+            links = engine.get_path_links(node["id"])
+            if(model.send(links)[0][0] is True):
+                delivered += 1
+
+        self.assertGreater(delivered, 0.95 * (len(zbnet["nodes"]) - 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import unittest
+
+from lib.zigbee_routing import ZigBeeRoutingEngine
+from lib.zigbee_routing import get_link_cost
+from lib.zigbee_topology import create_pan_network
+from tests import create_network
+
+
+class TestZigBeeRoutingEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.net = create_network(create_pan_network("grid", 100, seed=1))
+        self.engine = ZigBeeRoutingEngine(self.net, "0000")
+        self.node_ids = [node.get_node_id()
+                         for node in self.net.get_node_list()]
+
+    def _assert_same_paths(self):
+        # Repaired paths have the same costs of a full computation
+        reference = ZigBeeRoutingEngine(self.net, "0000")
+        self.net.remove_link_listener(reference.link_changed)
+
+        for node_id in self.node_ids:
+            cost = self.engine.get_path_cost(node_id)
+            self.assertEqual(cost, reference.get_path_cost(node_id))
+            if(cost is None):
+                self.assertIsNone(self.engine.get_path_links(node_id))
+                continue
+
+            links = self.engine.get_path_links(node_id)
+            self.assertEqual(len(links), self.engine.get_hops(node_id))
+            self.assertEqual(
+                sum([get_link_cost(link.get_quality()) for link in links]),
+                cost)
+
+            path = self.engine.get_path(node_id)
+            self.assertEqual(
+                [link.get_node_id_src() for link in links], path[:-1])
+            self.assertEqual(
+                [link.get_node_id_dest() for link in links], path[1:])
+            if(len(path) > 1):
+                self.assertEqual(self.engine.get_next_hop(node_id), path[1])
+
+    def test_source_path(self):
+        self.assertEqual(self.engine.get_path("0000"), ["0000"])
+        self.assertEqual(self.engine.get_path_links("0000"), ())
+        self.assertEqual(self.engine.get_hops("0000"), 0)
+
+    def test_unknown_node_is_unreachable(self):
+        self.assertFalse(self.engine.is_reachable("FFF0"))
+        self.assertIsNone(self.engine.get_path("FFF0"))
+        self.assertIsNone(self.engine.get_path_links("FFF0"))
+
+    def test_path_links_are_cached(self):
+        links = self.engine.get_path_links("0063")
+        self.assertIs(self.engine.get_path_links("0063"), links)
+
+        # Tree link change invalidates the stored paths
+        link = links[-1]
+        self.net.update_link(link.get_node_id_src(), link.get_node_id_dest(),
+                             lqi=link.get_quality())
+        self.assertIsNot(self.engine.get_path_links("0063"), links)
+
+    def test_repair_after_link_changes(self):
+        rnd = random.Random(1)
+        self._assert_same_paths()
+
+        for i in range(300):
+            src = rnd.choice(self.node_ids)
+            neighbours = self.net.get_node(src).get_ntable()
+            if(len(neighbours) == 0):
+                continue
+            dest = rnd.choice(neighbours).get_node_id_dest()
+
+            action = rnd.random()
+            if(action < 0.6):
+                self.net.update_link(src, dest, lqi=rnd.randint(0, 255))
+            elif(action < 0.8):
+                self.net.remove_link(src, dest)
+            else:
+                self.net.add_link(dest, rnd.choice(self.node_ids),
+                                  lqi=rnd.randint(0, 255))
+
+            if(i % 10 == 0):
+                self._assert_same_paths()
+
+        self._assert_same_paths()
+
+    def test_repair_after_node_removal(self):
+        path = self.engine.get_path("0063")
+        self.net.remove_node(path[1])
+
+        self.assertFalse(self.engine.is_reachable(path[1]))
+        self.assertNotIn(path[1], self.engine.get_path("0063"))
+        self._assert_same_paths()
+
+    def test_disconnected_node(self):
+        for link in list(self.net.get_node("0063").get_ntable()):
+            self.net.remove_link("0063", link.get_node_id_dest())
+            self.net.remove_link(link.get_node_id_dest(), "0063")
+
+        self.assertFalse(self.engine.is_reachable("0063"))
+        self._assert_same_paths()
+
+    def test_close_detaches_engine(self):
+        listeners = len(self.net.link_listeners)
+        engine = ZigBeeRoutingEngine(self.net, "0000")
+        self.assertEqual(len(self.net.link_listeners), listeners + 1)
+
+        engine.close()
+        self.assertEqual(len(self.net.link_listeners), listeners)
+        self.assertIn(self.engine.link_changed, self.net.link_listeners)
+
+        # Closing twice is harmless
+        engine.close()
+        self.assertEqual(len(self.net.link_listeners), listeners)
+
+
+if __name__ == "__main__":
+    unittest.main()
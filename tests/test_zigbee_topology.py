@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import StringIO
+import json
+import unittest
+
+from lib.zigbee_radio import ZigBeeLossModel
+from lib.zigbee_routing import LINK_DROP_LQI
+from lib.zigbee_routing import ZigBeeRoutingEngine
+from lib.zigbee_topology import TOPOLOGIES
+from lib.zigbee_topology import create_pan_network
+from lib.zigbee_topology import create_networks
+from lib.zigbee_topology import get_link_quality
+from lib.zigbee_topology import read_topology_file
+from lib.zigbee_topology import write_topology_file
+from tests import create_network
+
+
+class TestLinkQuality(unittest.TestCase):
+
+    def test_out_of_range(self):
+        self.assertIsNone(get_link_quality(2.0, 1.75))
+
+    def test_quality_falls_near_range_limit(self):
+        self.assertEqual(get_link_quality(0, 1.75), 255)
+        self.assertGreater(get_link_quality(0.8 * 1.75, 1.75), 150)
+        self.assertLess(get_link_quality(0.97 * 1.75, 1.75), 100)
+        self.assertEqual(get_link_quality(1.75, 1.75), LINK_DROP_LQI)
+
+
+class TestCreatePanNetwork(unittest.TestCase):
+
+    def test_grid_links(self):
+        zbnet = create_pan_network("grid", 100, seed=1)
+        lqis = set([link["lqi"] for link in zbnet["links"]])
+
+        # Adjacent and diagonal neighbours only
+        self.assertEqual(len(lqis), 2)
+        self.assertGreaterEqual(min(lqis), 100)
+
+    def test_every_node_has_parent(self):
+        for topology in TOPOLOGIES:
+            zbnet = create_pan_network(topology, 2000, seed=3)
+            orphans = [node for node in zbnet["nodes"][1:]
+                       if node["parent_id"] == "FFFF"]
+            self.assertEqual(orphans, [], topology)
+
+    def test_default_networks_deliver_most_unicasts(self):
+        for topology in TOPOLOGIES:
+            zbnet = create_pan_network(topology, 1000, seed=1)
+            engine = ZigBeeRoutingEngine(create_network(zbnet), "0000")
+            model = ZigBeeLossModel(seed=1)
+
+            delivered = 0
+            for node in zbnet["nodes"][1:]:
+                links = engine.get_path_links(node["id"])
+                self.assertIsNotNone(links, topology)
+                if(model.send(links)[0][0] is True):
+                    delivered += 1
+
+            self.assertGreater(delivered, 950, topology)
+
+    def test_same_seed_same_network(self):
+        self.assertEqual(create_pan_network("geometric", 500, seed=7),
+                         create_pan_network("geometric", 500, seed=7))
+
+
+def read_networks(data, chunk_size=65536):
+    # Rebuild networks from read_topology_file items
+    zbnet_list = []
+    for item_type, item in read_topology_file(
+            StringIO.StringIO(data), chunk_size):
+        if(item_type == "pan"):
+            zbnet_list.append({"pan": item, "nodes": [], "links": []})
+        elif(item_type in ("node", "link")):
+            zbnet_list[-1][item_type + "s"].append(item)
+
+    return zbnet_list
+
+
+class TestReadTopologyFile(unittest.TestCase):
+
+    def setUp(self):
+        self.zbnet_list = create_networks("tree", 200, seed=3)
+        json_file = StringIO.StringIO()
+        write_topology_file(self.zbnet_list, json_file)
+        self.data = json_file.getvalue()
+
+    def test_round_trip(self):
+        self.assertEqual(read_networks(self.data), self.zbnet_list)
+
+    def test_chunk_boundaries(self):
+        for chunk_size in (1, 2, 3, 7, 100, len(self.data) * 2):
+            self.assertEqual(read_networks(self.data, chunk_size),
+                             self.zbnet_list, chunk_size)
+
+    def test_values_split_by_chunks(self):
+        # Numbers and literals at chunk end are completed by next chunk
+        data = '[{"pan": {"channel": 26, "joinable": true, "key": null},' \
+            ' "nodes": [], "links": [{"lqi": 255}, {"lqi": -1.5e2}]}]'
+        for chunk_size in range(1, len(data) + 1):
+            self.assertEqual(
+                read_networks(data, chunk_size),
+                [{"pan": {"channel": 26, "joinable": True, "key": None},
+                  "nodes": [], "links": [{"lqi": 255}, {"lqi": -150.0}]}],
+                chunk_size)
+
+    def test_strings_are_not_unicode(self):
+        zbnet = read_networks(self.data, 5)[0]
+        self.assertIs(type(zbnet["pan"]["eid"]), str)
+        self.assertIs(type(zbnet["nodes"][0]["eui"]), str)
+
+    def test_items_order(self):
+        data = '[{"pan": {"eid": "A"}, "nodes": [{"id": "0000"}], ' \
+            '"links": []}, {"pan": {"eid": "B"}}, {}]'
+        self.assertEqual(
+            list(read_topology_file(StringIO.StringIO(data), 4)),
+            [("pan", {"eid": "A"}), ("node", {"id": "0000"}), ("end", None),
+             ("pan", {"eid": "B"}), ("end", None), ("end", None)])
+
+    def test_unknown_keys_are_ignored(self):
+        data = '[{"name": {"a": [1, 2]}, "pan": {}, "version": 2, ' \
+            '"nodes": [], "links": [], "extra": "x"}]'
+        self.assertEqual(read_networks(data, 3),
+                         [{"pan": {}, "nodes": [], "links": []}])
+
+    def test_empty_file_list(self):
+        self.assertEqual(read_networks(" [ ] "), [])
+
+    def test_keys_order(self):
+        for data in ('[{"nodes": [], "pan": {}}]',
+                     '[{"pan": {}, "links": [], "nodes": []}]',
+                     '[{"links": []}]',
+                     '[{"pan": {}, "pan": {}}]',
+                     '[{"pan": {}, "nodes": [], "links": [], "nodes": []}]'):
+            self.assertRaises(ValueError, read_networks, data)
+
+    def test_malformed_input(self):
+        for data in ("", "{}", "[", "[{", '[{"pan": {}', '[{"pan": {}}',
+                     '[{"pan": {}}}', '[{"pan": {} "nodes": []}]',
+                     '[{"pan": {}, "nodes": [{"id": 1},]}]',
+                     '[{"pan": {}, "nodes": [{"id": 1} {"id": 2}]}]',
+                     '[{"pan": {}, "nodes": {}}]', '[{1: {}}]',
+                     '[{"pan": {"eid": "E0}}]', '[{"pan": tru}]',
+                     self.data[:-10]):
+            for chunk_size in (1, 65536):
+                self.assertRaises(ValueError, read_networks, data,
+                                  chunk_size)
+
+    def test_json_compatible(self):
+        self.assertEqual(json.loads(self.data), self.zbnet_list)
+
+
+if __name__ == "__main__":
+    unittest.main()